@@ -0,0 +1,262 @@
+# backtest.py
+
+import os
+import csv
+import math
+import time
+import heapq
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from spread_stats import rolling_zscore
+from kline_store import KlineStore
+from strategy import is_entry, entry_direction, is_zscore_exit, position_pnl, exit_reason, entry_sides, \
+    closing_sides
+from config import PAIR_CONFIG_CSV, TRADE_CAPITAL_PER_PAIR, KLINE_DATA_DIR, BACKTEST_FEE_RATE, \
+    BACKTEST_BORROW_RATE_HOURLY, MAX_CONCURRENT_TRADES
+
+LOG_COLUMNS = ['timestamp', 'sym1', 'sym2', 'side1', 'side2', 'price1', 'price2', 'qty1', 'qty2', 'action', 'pnl',
+               'fees', 'interest']
+
+
+def load_klines(symbol, data_dir=KLINE_DATA_DIR):
+    """
+    Loads 1-minute klines for a symbol from the KlineStore in `data_dir`, or else from
+    `<data_dir>/<SYMBOL>.parquet` or `.csv`. Accepts files with `open_time`/`close`
+    columns, or headerless Binance kline dumps.
+    Returns (open_time_ms int64 array, close float array), sorted and de-duplicated.
+    """
+    store = KlineStore(data_dir)
+    if symbol in store:
+        data = store.read(symbol)
+        return data['open_time'], data['close']
+
+    parquet_path, csv_path = os.path.join(data_dir, f"{symbol}.parquet"), os.path.join(data_dir, f"{symbol}.csv")
+    if os.path.exists(parquet_path):
+        df = pd.read_parquet(parquet_path, columns=['open_time', 'close'])
+    elif os.path.exists(csv_path):
+        with open(csv_path) as f:
+            has_header = not f.readline()[:1].isdigit()
+        if has_header:
+            df = pd.read_csv(csv_path, usecols=['open_time', 'close'])
+        else:
+            df = pd.read_csv(csv_path, header=None, usecols=[0, 4], names=['open_time', 'close'])
+    else:
+        raise FileNotFoundError(f"No kline data for {symbol} in {data_dir}")
+
+    times = df['open_time'].to_numpy(dtype=np.int64)
+    closes = df['close'].to_numpy(dtype=float)
+    if len(times) and times.max() > 10 ** 14:
+        times = times // 1000  # newer Binance dumps use microseconds
+    times, first = np.unique(times, return_index=True)
+    return times, closes[first]
+
+
+def align(times1, closes1, times2, closes2):
+    """Keeps only the minutes both symbols have a candle for."""
+    times, idx1, idx2 = np.intersect1d(times1, times2, assume_unique=True, return_indices=True)
+    return times, closes1[idx1], closes2[idx2]
+
+
+def _next(indices, after):
+    """First element of the sorted `indices` array that is >= `after`, or None."""
+    k = np.searchsorted(indices, after)
+    return int(indices[k]) if k < len(indices) else None
+
+
+class PairReplay:
+    """
+    One pair's aligned prices and precomputed signal bars. Fills happen at the close of
+    the bar that produced the signal; every fill pays `fee_rate` on its notional and the
+    borrowed leg accrues `borrow_rate_hourly` interest on its entry value while open.
+
+    Instead of stepping bar by bar, it jumps between candidate bars: the bars where an
+    entry or z-score exit can fire are precomputed with vectorized masks, and stop-loss /
+    take-profit are evaluated on the holding period as a whole.
+    """
+
+    def __init__(self, pair, times, p1, p2, z=None, fee_rate=BACKTEST_FEE_RATE,
+                 borrow_rate_hourly=BACKTEST_BORROW_RATE_HOURLY, capital=TRADE_CAPITAL_PER_PAIR):
+        self.pair, self.times, self.p1, self.p2 = pair, times, p1, p2
+        self.key = f"{pair['sym1']}/{pair['sym2']}"
+        self.z_entry, self.z_exit = float(pair['z_entry']), float(pair['z_exit'])
+        self.stop_loss = float(pair.get('stop_loss', 0.05))
+        self.take_profit = float(pair.get('take_profit', 0.05))
+        self.fee_rate, self.borrow_rate_hourly, self.capital = fee_rate, borrow_rate_hourly, capital
+        self.z = z if z is not None else rolling_zscore(p1 / p2, int(pair['window']))
+
+        self.valid = ~np.isnan(self.z)
+        z0 = np.where(self.valid, self.z, 0.0)
+        self.entries = np.flatnonzero(self.valid & is_entry(z0, self.z_entry))
+        self.z_exits = {d: np.flatnonzero(self.valid & is_zscore_exit(d, z0, self.z_exit))
+                        for d in ('SELL SPREAD', 'BUY SPREAD')}
+
+    def next_entry(self, after):
+        """First bar >= `after` whose z-score is past z_entry, or None."""
+        return _next(self.entries, after)
+
+    def excess(self, i):
+        """How far bar i's z-score is past z_entry; the live bot enters the largest first."""
+        return abs(self.z[i]) - self.z_entry
+
+    def trade(self, i, with_log=True):
+        """
+        Replays the position entered on bar i.
+        Returns (exit bar, trade log rows, net PnL); the exit bar and PnL are None when the
+        position is still open at the end of the data.
+        """
+        z, p1, p2, times = self.z, self.p1, self.p2, self.times
+        sym1, sym2 = self.pair['sym1'], self.pair['sym2']
+        direction = entry_direction(z[i])
+        entry_p1, entry_p2 = p1[i], p2[i]
+        qty1, qty2 = self.capital / entry_p1, self.capital / entry_p2
+        entry_fees = self.fee_rate * (qty1 * entry_p1 + qty2 * entry_p2)
+        rows = []
+        if with_log:
+            rows.append([_timestamp(times[i]), sym1, sym2, *entry_sides(direction), entry_p1, entry_p2, qty1, qty2,
+                         "OPEN", None, entry_fees, None])
+
+        # The position is first managed on the bar after the entry.
+        z_exit_bar = _next(self.z_exits[direction], i + 1)
+        end = z_exit_bar if z_exit_bar is not None else len(z) - 1
+        _, pnl_pct = position_pnl(direction, entry_p1, entry_p2, qty1, qty2, p1[i + 1:end + 1], p2[i + 1:end + 1])
+        hits = np.flatnonzero(self.valid[i + 1:end + 1]
+                              & ((pnl_pct <= -self.stop_loss) | (pnl_pct >= self.take_profit)))
+        j = i + 1 + int(hits[0]) if len(hits) else z_exit_bar
+        if j is None:
+            return None, rows, None  # still open at the end of the data
+        zscore_exit = j == z_exit_bar  # the z-score rule wins when both fire on the same bar
+
+        pnl, pnl_pct = position_pnl(direction, entry_p1, entry_p2, qty1, qty2, p1[j], p2[j])
+        exit_fees = self.fee_rate * (qty1 * p1[j] + qty2 * p2[j])
+        borrowed_value = qty1 * entry_p1 if direction == 'SELL SPREAD' else qty2 * entry_p2
+        interest = borrowed_value * self.borrow_rate_hourly * (times[j] - times[i]) / 3_600_000
+        if with_log:
+            reason = exit_reason(zscore_exit, z[j], pnl_pct, self.stop_loss, self.take_profit)
+            rows.append([_timestamp(times[j]), sym1, sym2, *closing_sides(direction), p1[j], p2[j], qty1, qty2,
+                         f"CLOSE: {reason}", pnl, exit_fees, interest])
+        return j, rows, pnl - entry_fees - exit_fees - interest
+
+
+def simulate_pair(pair, times, p1, p2, z=None, fee_rate=BACKTEST_FEE_RATE,
+                  borrow_rate_hourly=BACKTEST_BORROW_RATE_HOURLY, capital=TRADE_CAPITAL_PER_PAIR, with_log=True):
+    """
+    Replays one pair through the live entry/exit rules on its own, with no cap on
+    concurrent trades across pairs (see replay_portfolio for that).
+
+    Returns (trade log rows, net PnL per closed trade); pass `with_log=False` to skip
+    building the rows when only the PnL matters (parameter sweeps).
+    """
+    replay = PairReplay(pair, times, p1, p2, z, fee_rate, borrow_rate_hourly, capital)
+    rows, pnls = [], []
+    i = 0
+    while (i := replay.next_entry(i)) is not None:
+        j, trade_rows, net = replay.trade(i, with_log)
+        rows.extend(trade_rows)
+        if j is None:
+            break
+        pnls.append(net)
+        i = j + 1
+    return rows, pnls
+
+
+def replay_portfolio(replays, max_trades=MAX_CONCURRENT_TRADES):
+    """
+    Replays several pairs together under the live bot's cap of `max_trades` open positions.
+    Candidate entries from every pair are merged in time order; on each minute the
+    strongest ones (largest |z| past z_entry) take the free slots. A position closing on
+    a minute still holds its slot for that minute's entries, as it does live, and a pair
+    that finds no slot tries again on its next entry bar.
+
+    Returns (trade log rows, {pair key: net PnL per closed trade}, entries skipped for lack of a slot).
+    """
+    rows, pnls, skipped = [], {r.key: [] for r in replays}, 0
+    candidates, exits = [], []  # heaps of (time, replay index, bar) and of open positions' exit times
+    for k, replay in enumerate(replays):
+        if (i := replay.next_entry(0)) is not None:
+            heapq.heappush(candidates, (int(replay.times[i]), k, i))
+
+    while candidates:
+        now = candidates[0][0]
+        due = []
+        while candidates and candidates[0][0] == now:
+            due.append(heapq.heappop(candidates))
+        while exits and exits[0] < now:
+            heapq.heappop(exits)
+        due.sort(key=lambda c: -replays[c[1]].excess(c[2]))
+
+        for _, k, i in due:
+            replay = replays[k]
+            if len(exits) >= max_trades:
+                skipped += 1
+                resume = i + 1
+            else:
+                j, trade_rows, net = replay.trade(i)
+                rows.extend(trade_rows)
+                if j is None:
+                    heapq.heappush(exits, math.inf)  # holds its slot to the end of the data
+                    continue
+                heapq.heappush(exits, int(replay.times[j]))
+                pnls[replay.key].append(net)
+                resume = j + 1
+            if (i := replay.next_entry(resume)) is not None:
+                heapq.heappush(candidates, (int(replay.times[i]), k, i))
+    return rows, pnls, skipped
+
+
+def _timestamp(open_time_ms):
+    # Signals act on a closed candle, i.e. one minute after it opened.
+    return pd.Timestamp(int(open_time_ms) + 60_000, unit='ms')
+
+
+def run_backtest(pair_configs, data_dir=KLINE_DATA_DIR, output=None, max_trades=MAX_CONCURRENT_TRADES):
+    """
+    Backtests every pair under the cross-pair cap of `max_trades` open positions and
+    optionally writes the combined trade log to `output`.
+    """
+    cache, replays, total_bars = {}, [], 0
+    start = time.perf_counter()
+    for pair in pair_configs:
+        key = f"{pair['sym1']}/{pair['sym2']}"
+        try:
+            for sym in (pair['sym1'], pair['sym2']):
+                if sym not in cache:
+                    cache[sym] = load_klines(sym, data_dir)
+        except FileNotFoundError as e:
+            logging.error(f"Skipping {key}: {e}")
+            continue
+        times, p1, p2 = align(*cache[pair['sym1']], *cache[pair['sym2']])
+        replays.append(PairReplay(pair, times, p1, p2))
+        total_bars += len(times)
+
+    all_rows, pnls_by_key, skipped = replay_portfolio(replays, max_trades)
+    elapsed = time.perf_counter() - start
+    for key, pnls in pnls_by_key.items():
+        wins = sum(1 for p in pnls if p > 0)
+        logging.info(f"{key}: {len(pnls)} trades, net PnL {sum(pnls):+.4f} USDT"
+                     + (f", win rate {wins / len(pnls):.0%}" if pnls else ""))
+    if skipped:
+        logging.info(f"{skipped} entry signals found all {max_trades} trade slots taken.")
+
+    logging.info(f"Replayed {total_bars:,} bars in {elapsed:.2f}s ({total_bars / max(elapsed, 1e-9):,.0f} bars/sec).")
+    if output:
+        all_rows.sort(key=lambda row: row[0])
+        with open(output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(LOG_COLUMNS)
+            writer.writerows(all_rows)
+        logging.info(f"Wrote {len(all_rows)} trade log rows to {output}.")
+    return all_rows
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Replay stored 1m klines through the live pair strategy.")
+    parser.add_argument("--pairs", default=PAIR_CONFIG_CSV, help="pair config CSV (live_pairs.csv format)")
+    parser.add_argument("--data", default=KLINE_DATA_DIR, help="kline store, or directory with <SYMBOL>.csv/.parquet klines")
+    parser.add_argument("--out", default="backtest_log.csv", help="where to write the simulated trade log")
+    parser.add_argument("--max-trades", type=int, default=MAX_CONCURRENT_TRADES,
+                        help="most positions open at once across all pairs")
+    args = parser.parse_args()
+    run_backtest(pd.read_csv(args.pairs).to_dict(orient='records'), args.data, args.out, args.max_trades)
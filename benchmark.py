@@ -0,0 +1,267 @@
+# benchmark.py
+
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import signal
+import shutil
+import socket
+import logging
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from fake_exchange import FakeExchange, FakeTelegram, CANDLE_MS
+from market_board import MarketBoard
+from kline_store import KlineStore
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trading_bot.py")
+WINDOW = 30
+Z_ENTRY, Z_EXIT = 3.0, 0.5
+# Each step one pair in this many gets its spread knocked out of line, so entries keep happening.
+SHOCK_EVERY = 10
+SHOCK_SIZE = 0.03
+METRIC_LINE = re.compile(r'^pairs_bot_(\w+?)(?:\{(.*)\})? (\S+)$')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def scrape(port):
+    """The bot's /metrics as {(name, labels): value}, with labels as the raw 'k="v",...' string."""
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+        text = response.read().decode()
+    values = {}
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            values[(match.group(1), match.group(2) or "")] = float(match.group(3))
+    return values
+
+
+def histogram(values, name, labels):
+    """(count, sum, ~p95 upper bound) of a scraped histogram."""
+    count = values.get((f"{name}_count", labels), 0.0)
+    total = values.get((f"{name}_sum", labels), 0.0)
+    p95 = None
+    buckets = sorted((float(re.search(r'le="([^"]+)"', l).group(1)), v) for (n, l), v in values.items()
+                     if n == f"{name}_bucket" and l.startswith(labels))
+    for bound, cumulative in buckets:
+        if count and cumulative >= 0.95 * count:
+            p95 = bound
+            break
+    return count, total, p95
+
+
+def peak_rss_mb(pid):
+    """Peak resident memory of a process in MB (Linux /proc), or None elsewhere."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class Market:
+    """
+    Deterministic prices for `n_pairs` pairs: leg 2 is a random walk and leg 1 tracks it
+    at a fixed ratio times a mean-reverting deviation, which now and then gets a shock.
+    """
+
+    def __init__(self, n_pairs, seed):
+        self.rng = random.Random(seed)
+        self.pairs = [(f"L{i:04d}AUSDT", f"L{i:04d}BUSDT") for i in range(n_pairs)]
+        self.ratio = [self.rng.uniform(0.5, 5.0) for _ in self.pairs]
+        self.base = [self.rng.uniform(5.0, 50.0) for _ in self.pairs]
+        self.deviation = [0.0] * n_pairs
+
+    def step(self, shock=False):
+        prices = {}
+        for i, (sym1, sym2) in enumerate(self.pairs):
+            self.base[i] *= math.exp(self.rng.gauss(0, 0.001))
+            self.deviation[i] = 0.6 * self.deviation[i] + self.rng.gauss(0, 0.001)
+            if shock and self.rng.random() < 1 / SHOCK_EVERY:
+                self.deviation[i] += self.rng.choice((-1, 1)) * SHOCK_SIZE
+            prices[sym2] = self.base[i]
+            prices[sym1] = self.base[i] * self.ratio[i] * math.exp(self.deviation[i])
+        return prices
+
+
+def hedge_times(fills, updates_at):
+    """
+    Seconds from the market update (tick or candle close) that triggered each two-leg
+    operation to its second leg filling. Operations are matched on the write-ahead client
+    order ids (pt<id>-1/-2); the trigger is the last update published before the first leg.
+    """
+    legs = {}
+    for t, _, _, qty, client_id in fills:
+        if client_id.startswith("pt") and qty > 0:
+            legs.setdefault(client_id.rsplit("-", 1)[0], []).append(t)
+    times = []
+    for stamps in legs.values():
+        if len(stamps) == 2:
+            triggered_by = max((u for u in updates_at if u <= min(stamps)), default=None)
+            if triggered_by is not None:
+                times.append(max(stamps) - triggered_by)
+    return sorted(times)
+
+
+def run_scenario(n_pairs, steps, interval, seed, exchange_options, keep=False):
+    """Runs the bot against the fake exchange with `n_pairs` pairs for `steps` candles. Returns a result dict."""
+    workdir = tempfile.mkdtemp(prefix=f"bench{n_pairs}_")
+    market = Market(n_pairs, seed)
+    start_prices = market.step()
+    exchange = FakeExchange(start_prices, seed=seed, **exchange_options)
+    telegram = FakeTelegram(chat_id=1)
+    store = KlineStore(os.path.join(workdir, "klines"))
+    board = MarketBoard(capacity=2 * n_pairs + 16)
+    proc = None
+    try:
+        # History for a full window, closed up to the previous minute.
+        t = (int(time.time() * 1000) // CANDLE_MS - WINDOW - 5) * CANDLE_MS
+        for _ in range(WINDOW + 4):
+            exchange.close_candle(t, market.step())
+            t += CANDLE_MS
+        for symbol, klines in exchange.klines.items():
+            store.append(symbol, klines)
+            bid, ask = exchange.book(symbol)
+            board.publish(symbol, last=exchange.prices[symbol], bid=bid, ask=ask, closed=klines[-1][0])
+        board.set_connected(True)
+        with open(os.path.join(workdir, "live_pairs.csv"), "w") as f:
+            f.write("sym1,sym2,z_entry,z_exit,window,stop_loss,take_profit\n")
+            f.writelines(f"{a},{b},{Z_ENTRY},{Z_EXIT},{WINDOW},0.05,0.05\n" for a, b in market.pairs)
+
+        metrics_port = free_port()
+        env = dict(os.environ, BINANCE_API_URL=exchange.start(), BINANCE_API_KEY="bench", BINANCE_API_SECRET="bench",
+                   TELEGRAM_API_URL=telegram.start(), TELEGRAM_TOKEN="bench", TELEGRAM_CHAT_ID="1",
+                   MARKET_FEED=board.name, METRICS_PORT=str(metrics_port), MAX_CONCURRENT_TRADES=str(n_pairs),
+                   PAIR_CONFIG_CSV="live_pairs.csv", STATE_FILE="open_positions.json",
+                   JOURNAL_FILE="trade_journal.db")
+        env.pop('SHARD_NAME', None)
+        with open(os.path.join(workdir, "bot.log"), "w") as log:
+            proc = subprocess.Popen([sys.executable, BOT_SCRIPT], cwd=workdir, env=env, stdout=log,
+                                    stderr=subprocess.STDOUT)
+
+        # Ready once the first loop (scoring every pair) has been recorded.
+        started = time.monotonic()
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"Bot exited during startup; see {workdir}/bot.log")
+            try:
+                before = scrape(metrics_port)
+                if histogram(before, 'stage_seconds', 'stage="loop"')[0] >= 1:
+                    break
+            except OSError:
+                pass
+            if time.monotonic() - started > 120:
+                raise RuntimeError(f"Bot did not start within 120s; see {workdir}/bot.log")
+            time.sleep(0.2)
+        startup = time.monotonic() - started
+        requests_before = exchange.request_count()
+
+        updates_at = []
+        for step in range(steps):
+            # A price tick halfway through the candle exercises the stop-loss/take-profit path.
+            ticks = market.step()
+            exchange.set_prices(ticks)
+            for symbol, price in ticks.items():
+                bid, ask = exchange.book(symbol)
+                board.publish(symbol, last=price, bid=bid, ask=ask)
+            updates_at.append(time.monotonic())
+            board.set_connected(True)
+            time.sleep(interval / 2)
+
+            closes = market.step(shock=True)
+            exchange.close_candle(t, closes)
+            for symbol, close in closes.items():
+                store.append(symbol, [exchange.klines[symbol][-1]])
+            for symbol, close in closes.items():
+                bid, ask = exchange.book(symbol)
+                board.publish(symbol, last=close, bid=bid, ask=ask, closed=t)
+            updates_at.append(time.monotonic())
+            board.set_connected(True)
+            t += CANDLE_MS
+            time.sleep(interval / 2)
+
+        after = scrape(metrics_port)
+        loops_before = histogram(before, 'stage_seconds', 'stage="loop"')
+        loops, loop_sum, loop_p95 = histogram(after, 'stage_seconds', 'stage="loop"')
+        loops -= loops_before[0]
+        loop_sum -= loops_before[1]
+        tasks_sum = histogram(after, 'stage_seconds', 'stage="pair_tasks"')[1] \
+            - histogram(before, 'stage_seconds', 'stage="pair_tasks"')[1]
+        hedges = hedge_times(exchange.fills, updates_at)
+        return {
+            'pairs': n_pairs,
+            'startup_s': round(startup, 2),
+            'loops': int(loops),
+            'loop_ms_avg': round(loop_sum / loops * 1000, 2) if loops else None,
+            'loop_ms_p95': loop_p95 * 1000 if loop_p95 is not None else None,
+            'task_wait_ms_avg': round(tasks_sum / loops * 1000, 2) if loops else None,
+            'requests_per_loop': round((exchange.request_count() - requests_before) / loops, 2) if loops else None,
+            'peak_rss_mb': round(peak_rss_mb(proc.pid) or 0, 1) or None,
+            'hedges': len(hedges),
+            'hedge_ms_median': round(hedges[len(hedges) // 2] * 1000, 1) if hedges else None,
+            'hedge_ms_max': round(hedges[-1] * 1000, 1) if hedges else None,
+            'orders': len(exchange.orders),
+            'telegram_messages': len(telegram.messages),
+        }
+    finally:
+        if proc is not None and proc.poll() is None:
+            proc.send_signal(signal.SIGTERM)
+            try:
+                proc.wait(30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        exchange.stop()
+        telegram.stop()
+        board.close()
+        if keep:
+            logging.info(f"Kept the {n_pairs}-pair run in {workdir}.")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Load-test the bot end to end against the fake exchange.")
+    parser.add_argument("--pairs", type=int, nargs="+", default=[10, 100, 1000], help="universe sizes to run")
+    parser.add_argument("--steps", type=int, default=20, help="candles to close per run")
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds of wall time per simulated candle")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds the exchange adds to every request")
+    parser.add_argument("--jitter", type=float, default=0.01, help="random extra latency, up to this many seconds")
+    parser.add_argument("--partial-fills", type=float, default=0.05, help="fraction of orders only partly filled")
+    parser.add_argument("--rejects", type=float, default=0.01, help="fraction of orders rejected by a filter")
+    parser.add_argument("--rate-limits", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    parser.add_argument("--keep", action="store_true", help="keep each run's directory (bot log, state, journal)")
+    args = parser.parse_args()
+
+    options = {'latency': args.latency, 'jitter': args.jitter, 'partial_fill_rate': args.partial_fills,
+               'reject_rate': args.rejects, 'rate_limit_rate': args.rate_limits}
+    results = []
+    for n in args.pairs:
+        logging.info(f"Running {n} pairs for {args.steps} candles...")
+        result = run_scenario(n, args.steps, args.interval, args.seed, options, keep=args.keep)
+        results.append(result)
+        logging.info(f"{n} pairs: loop avg {result['loop_ms_avg']} ms (p95 <= {result['loop_ms_p95']} ms) "
+                     f"+ {result['task_wait_ms_avg']} ms waiting on pair tasks over "
+                     f"{result['loops']} loops, {result['requests_per_loop']} requests/loop, "
+                     f"peak RSS {result['peak_rss_mb']} MB, {result['hedges']} hedges "
+                     f"(median {result['hedge_ms_median']} ms, max {result['hedge_ms_max']} ms), "
+                     f"startup {result['startup_s']}s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        logging.info(f"Wrote results to {args.json}.")
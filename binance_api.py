@@ -1,14 +1,65 @@
 # binance_api.py
 
 import os
+import math
+import time
 import logging
+import threading
+from typing import NamedTuple, Optional
 from binance.client import Client
+from binance.base_client import BaseClient
 from binance.exceptions import BinanceAPIException
-from config import BINANCE_API_KEY, BINANCE_API_SECRET
+import metrics
+from config import BINANCE_API_KEY, BINANCE_API_SECRET, BINANCE_API_URL, SYMBOL_FILTERS_TTL, PRICE_MAX_AGE
 
-client = Client(BINANCE_API_KEY, BINANCE_API_SECRET)
+if BINANCE_API_URL:
+    # Set on the shared base class so it applies to the async order client too, and before
+    # the first client is created (it pings on construction).
+    BaseClient.API_URL = f"{BINANCE_API_URL}/api"
+    BaseClient.MARGIN_API_URL = f"{BINANCE_API_URL}/sapi"
 
-assert BINANCE_API_SECRET is not None, "BINANCE_API_SECRET is missing!"
+# Public market data needs no keys, so a process that only reads prices (the shard supervisor)
+# runs without them; account and order endpoints go through signed_client().
+client = metrics.instrument_client(Client(BINANCE_API_KEY, BINANCE_API_SECRET))
+
+# Binance error codes meaning the order broke a symbol filter (LOT_SIZE, MIN_NOTIONAL, precision...).
+FILTER_ERROR_CODES = (-1013, -1111)
+
+# symbol -> compact filter record, see _parse_symbol_filters()
+_symbol_filters = {}
+_symbol_filters_lock = threading.Lock()
+_filters_refresh_lock = threading.Lock()
+
+
+class Quote(NamedTuple):
+    """Latest known prices of a symbol and when they were last updated (time.monotonic())."""
+    last: Optional[float]
+    bid: Optional[float]
+    ask: Optional[float]
+    updated_at: float
+
+    @property
+    def price(self):
+        """Last trade price, or the mid price when only the book is known."""
+        if self.last is not None:
+            return self.last
+        return (self.bid + self.ask) / 2 if self.bid and self.ask else None
+
+    @property
+    def age(self):
+        return time.monotonic() - self.updated_at
+
+
+# symbol -> Quote, fed by the market stream (update_quote) or one batched REST call (refresh_quotes)
+_quotes = {}
+_quotes_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+
+
+def signed_client():
+    """The client, for endpoints that need the API keys. Fails here rather than at import when they are missing."""
+    assert BINANCE_API_KEY and BINANCE_API_SECRET, "BINANCE_API_KEY/BINANCE_API_SECRET is missing!"
+    return client
 
 
 def borrow_asset(symbol, amount_to_borrow, isolated=False):
@@ -20,7 +71,7 @@ def borrow_asset(symbol, amount_to_borrow, isolated=False):
 
         logging.info(f"Attempting to BORROW {formatted_amount} {asset}...")
 
-        loan_receipt = client.create_margin_loan(
+        loan_receipt = signed_client().create_margin_loan(
             asset=asset,
             amount=formatted_amount,  # Pass the correctly formatted string
             isIsolated=isolated,
@@ -42,7 +93,7 @@ def repay_asset(symbol, amount_to_repay, isolated=False):
 
         logging.info(f"Attempting to REPAY {formatted_amount} {asset}...")
 
-        repay_receipt = client.repay_margin_loan(
+        repay_receipt = signed_client().repay_margin_loan(
             asset=asset,
             amount=formatted_amount,  # Pass the correctly formatted string
             isIsolated=isolated,
@@ -55,42 +106,162 @@ def repay_asset(symbol, amount_to_repay, isolated=False):
         return None
 
 
-def get_pair_price(symbol):
+def update_quote(symbol, last=None, bid=None, ask=None):
+    """Records a price update (e.g. from the WebSocket stream). Fields left as None keep their previous value."""
+    with _quotes_lock:
+        old = _quotes.get(symbol)
+        if old is not None:
+            last = old.last if last is None else last
+            bid = old.bid if bid is None else bid
+            ask = old.ask if ask is None else ask
+        _quotes[symbol] = Quote(last, bid, ask, time.monotonic())
+
+
+def refresh_quotes():
+    """Refreshes the best bid/ask of every symbol with one all-symbols bookTicker request."""
     try:
-        return float(client.get_symbol_ticker(symbol=symbol)['price'])
+        tickers = client.get_orderbook_tickers()
     except Exception as e:
-        logging.error(f"Error fetching price for {symbol}: {e}");
+        logging.error(f"Error fetching book tickers: {e}");
+        return
+    now = time.monotonic()
+    with _quotes_lock:
+        for t in tickers:
+            bid, ask = float(t['bidPrice']), float(t['askPrice'])
+            old = _quotes.get(t['symbol'])
+            # A trade price older than the book is dropped so Quote.price falls back to the fresh mid.
+            _quotes[t['symbol']] = Quote(None, bid, ask, now) if old is None or old.last is None or \
+                old.age > PRICE_MAX_AGE else Quote(old.last, bid, ask, now)
+
+
+def get_quote(symbol, max_age=PRICE_MAX_AGE):
+    """
+    The symbol's Quote from memory. A REST request is only made when it is missing or
+    older than `max_age` seconds, and one refresh then serves every symbol. None if no
+    quote younger than `max_age` is available, e.g. because the refresh failed.
+    """
+    quote = _quotes.get(symbol)
+    if quote is None or quote.age > max_age:
+        with _refresh_lock:
+            quote = _quotes.get(symbol)
+            if quote is None or quote.age > max_age:  # another thread may have just refreshed
+                refresh_quotes()
+                quote = _quotes.get(symbol)
+    return quote if quote is not None and quote.age <= max_age else None
+
+
+def get_pair_price(symbol, max_age=PRICE_MAX_AGE):
+    quote = get_quote(symbol, max_age)
+    if quote is None or quote.price is None:
+        logging.error(f"Error fetching price for {symbol}: no quote from the last {max_age}s");
         return None
+    return quote.price
 
 
-def get_symbol_filters(symbol):
+def _parse_symbol_filters(symbol_info, loaded_at):
+    """Reduces an exchangeInfo symbol entry to the few filter values the bot actually uses."""
+    filters = {f['filterType']: f for f in symbol_info['filters']}
+    step = float(filters.get('LOT_SIZE', {}).get('stepSize', '0.00000001'))
+    # Spot symbols moved from MIN_NOTIONAL to NOTIONAL; accept whichever one is present.
+    notional = filters.get('MIN_NOTIONAL') or filters.get('NOTIONAL') or {}
+    return {
+        'step_size': step,
+        'precision': abs(str(step).find('.') - len(str(step))) - 1,
+        'min_notional': float(notional.get('minNotional', 5.0)),
+        'tick_size': float(filters.get('PRICE_FILTER', {}).get('tickSize', '0.00000001')),
+        'loaded_at': loaded_at,
+    }
+
+
+def load_symbol_filters(symbols=None):
+    """
+    Bulk-loads the filters of every given symbol (or all symbols) with a single
+    exchangeInfo call and stores them in the in-memory cache.
+    """
     try:
-        info = client.get_symbol_info(symbol)
-        return {f['filterType']: f for f in info['filters']}
+        info = client.get_exchange_info()
     except Exception as e:
-        logging.error(f"Error fetching filters for {symbol}: {e}");
-        return {}
+        logging.error(f"Error loading exchange info: {e}");
+        return 0
+
+    wanted = set(symbols) if symbols else None
+    now = time.time()
+    loaded = {s['symbol']: _parse_symbol_filters(s, now) for s in info.get('symbols', [])
+              if wanted is None or s['symbol'] in wanted}
+    with _symbol_filters_lock:
+        _symbol_filters.update(loaded)
+
+    if wanted and (missing := wanted - loaded.keys()):
+        logging.warning(f"No exchange info returned for: {', '.join(sorted(missing))}")
+    logging.info(f"Cached exchange filters for {len(loaded)} symbols.")
+    return len(loaded)
+
+
+def invalidate_symbol_filters(symbol):
+    """Drops a symbol from the filter cache so the next lookup refetches it."""
+    with _symbol_filters_lock:
+        _symbol_filters.pop(symbol, None)
+
+
+def symbol_filters_fresh(symbol):
+    """True if the symbol's filters are cached and within the TTL, so a lookup makes no request."""
+    filters = _symbol_filters.get(symbol)
+    return filters is not None and time.time() - filters['loaded_at'] < SYMBOL_FILTERS_TTL
+
+
+def get_symbol_filters(symbol):
+    """Returns the cached filters for a symbol, refreshing them when missing or older than the TTL."""
+    if symbol_filters_fresh(symbol):
+        return _symbol_filters[symbol]
+
+    with _filters_refresh_lock:
+        if symbol_filters_fresh(symbol):  # another thread may have just refreshed
+            return _symbol_filters[symbol]
+        if symbol in _symbol_filters:
+            # The whole cache was loaded together, so it expires together: refresh it in one call.
+            load_symbol_filters(list(_symbol_filters))
+        else:
+            try:
+                info = client.get_symbol_info(symbol)
+                with _symbol_filters_lock:
+                    _symbol_filters[symbol] = _parse_symbol_filters(info, time.time())
+            except Exception as e:
+                logging.error(f"Error fetching filters for {symbol}: {e}");
+    return _symbol_filters.get(symbol, {})
 
 
 def round_quantity(symbol, qty):
     try:
         filters = get_symbol_filters(symbol)
-        step = float(filters.get('LOT_SIZE', {}).get('stepSize', '0.00000001'))
-        precision = abs(str(step).find('.') - len(str(step))) - 1
-        return round(qty - (qty % step), precision)
+        step = filters.get('step_size', 0.00000001)
+        precision = filters.get('precision', 8)
+        # Down to a whole number of steps; the epsilon keeps e.g. 1.0 (0.999999... steps of 0.001
+        # in binary) from losing a step.
+        return round(math.floor(qty / step + 1e-9) * step, precision)
     except (ValueError, TypeError):
         return qty
 
 
 def check_notional(symbol, price, qty):
     filters = get_symbol_filters(symbol)
-    min_notional = float(filters.get('MIN_NOTIONAL', {}).get('minNotional', 5.0))
-    return price * qty >= min_notional
+    return price * qty >= filters.get('min_notional', 5.0)
+
+
+def tradeable_quantity(symbol, price, qty):
+    """`qty` rounded to the symbol's step size if an order for it would pass the filters, else 0."""
+    rounded_qty = round_quantity(symbol, qty)
+    return rounded_qty if rounded_qty > 0 and check_notional(symbol, price, rounded_qty) else 0.0
 
 
-def place_order(symbol, side, quantity, isolated=False):
+def place_order(symbol, side, quantity, isolated=False, price=None, client_order_id=None):
+    """
+    Places a MARKET margin order. Filters come from the local cache, so when the caller
+    already knows a recent price the order itself is the only REST call. `client_order_id`
+    lets the caller look the order up later with get_margin_order().
+    """
     try:
-        price = get_pair_price(symbol)
+        if price is None:
+            price = get_pair_price(symbol)
         if price is None: raise Exception("Price unavailable")
 
         rounded_qty = round_quantity(symbol, quantity)
@@ -102,22 +273,73 @@ def place_order(symbol, side, quantity, isolated=False):
             logging.error(f"Order REJECTED (local): Notional value ${notional_value:.2f} is below minimum.")
             return None
 
-        order = client.create_margin_order(symbol=symbol, side=side, type='MARKET', quantity=rounded_qty,
-                                           isIsolated=isolated)
+        params = {'newClientOrderId': client_order_id} if client_order_id else {}
+        order = signed_client().create_margin_order(symbol=symbol, side=side, type='MARKET', quantity=rounded_qty,
+                                           isIsolated=isolated, **params)
         logging.info(f"SUCCESS -> Placed {side} order for {rounded_qty} {symbol}")
         return order
     except BinanceAPIException as e:
         logging.error(f"FAILED -> Binance API Error for {symbol}. Code: {e.code}, Message: {e.message}")
+        if e.code in FILTER_ERROR_CODES:
+            # Our cached filters may be outdated; force a refetch before the next order.
+            invalidate_symbol_filters(symbol)
         return None
     except Exception as e:
         logging.error(f"FAILED -> Unexpected Error for {symbol}: {e}");
         return None
 
 
-def get_historical_prices(symbol, window):
+def get_margin_order(symbol, client_order_id, isolated=False):
+    """Looks up a margin order by the client order id it was sent with. None if the exchange never saw it."""
+    try:
+        return signed_client().get_margin_order(symbol=symbol, origClientOrderId=client_order_id, isIsolated=isolated)
+    except BinanceAPIException as e:
+        if e.code != -2013:  # -2013: order does not exist
+            raise
+        return None
+
+
+def get_margin_trades(symbol, order_id, isolated=False):
+    """The trades (fills, with their commission) a margin order executed as."""
+    return signed_client().get_margin_trades(symbol=symbol, orderId=order_id, isIsolated=isolated)
+
+
+def get_margin_loans(isolated=False):
+    """Outstanding borrowed amount per asset, {asset: amount}, from the cross or isolated margin account."""
+    if isolated:
+        assets = [a['baseAsset'] for a in signed_client().get_isolated_margin_account()['assets']]
+    else:
+        assets = signed_client().get_margin_account()['userAssets']
+    loans = {}
+    for a in assets:
+        if float(a['borrowed']) > 0:
+            loans[a['asset']] = loans.get(a['asset'], 0.0) + float(a['borrowed'])
+    return loans
+
+
+def get_margin_usdt_symbols():
+    """Symbols quoted in USDT that can currently be traded on cross margin."""
+    try:
+        return [p['symbol'] for p in signed_client().get_margin_all_pairs()
+                if p.get('quote') == 'USDT' and p.get('isMarginTrade') and p.get('isBuyAllowed')
+                and p.get('isSellAllowed')]
+    except Exception as e:
+        logging.error(f"Error fetching margin pairs: {e}");
+        return []
+
+
+def get_closed_klines(symbol, limit, start_time=None):
+    """
+    Returns fully closed 1-minute klines in Binance's raw list format, oldest first.
+    The still-forming candle Binance appends at the end is dropped.
+    """
     try:
-        klines = client.get_klines(symbol=symbol, interval=Client.KLINE_INTERVAL_1MINUTE, limit=window)
-        return [float(candle[4]) for candle in klines]
+        params = {'symbol': symbol, 'interval': Client.KLINE_INTERVAL_1MINUTE, 'limit': min(int(limit), 1000)}
+        if start_time is not None:
+            params['startTime'] = int(start_time)
+        klines = client.get_klines(**params)
+        now_ms = int(time.time() * 1000)
+        return [candle for candle in klines if int(candle[6]) < now_ms]
     except Exception as e:
-        logging.error(f"Error fetching historical prices for {symbol}: {e}");
-        return []
\ No newline at end of file
+        logging.error(f"Error fetching closed candles for {symbol}: {e}");
+        return []
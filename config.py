@@ -8,18 +8,59 @@ load_dotenv()
 # === 🔐 Binance API Keys (from .env) ===
 BINANCE_API_KEY = os.getenv("BINANCE_API_KEY")
 BINANCE_API_SECRET = os.getenv("BINANCE_API_SECRET")
+BINANCE_API_URL = os.getenv("BINANCE_API_URL")  # Override to test against another server (e.g. fake_exchange.py)
 
 # === 📲 Telegram Bot Settings (from .env) ===
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")  # Override to test against a stand-in
+TELEGRAM_MIN_INTERVAL = 1.0      # Minimum seconds between two sends (Telegram allows ~1 msg/s per chat)
+TELEGRAM_COALESCE_WINDOW = 2.0   # Messages queued within this many seconds are sent as one digest
+TELEGRAM_TIMEOUT = 10            # Seconds before a Telegram request times out
+TELEGRAM_MAX_RETRIES = 3         # Retries per message before it is dropped
 
 # === ⚙️ Bot Settings ===
 TRADE_CAPITAL_PER_PAIR = 10  # USDT per leg
-UPDATE_INTERVAL = 1         # Time between checks in seconds
+UPDATE_INTERVAL = 1         # Longest the loop waits for market data before checking again, in seconds
+PRICE_CHECK_INTERVAL = 1     # Minimum seconds between stop-loss/take-profit checks on price ticks
+SIGNAL_DEBOUNCE = 0.25       # Seconds to let the other symbols' candles close before scoring pairs
+API_WEIGHT_LIMIT = 6000      # Binance request weight allowed per minute
+API_WEIGHT_BACKOFF = 0.8     # Fraction of the limit above which entries pause and price checks slow down
+ENTRY_WEIGHT = 120           # Request weight reserved for each entry before it is sent (loan, both legs, a rollback)
 USE_ISOLATED_MARGIN = False  # Set to True to use Isolated
-MAX_CONCURRENT_TRADES = 2    # Set the maximum number of simultaneous trades
+MAX_CONCURRENT_TRADES = int(os.getenv("MAX_CONCURRENT_TRADES", 2))  # Set the maximum number of simultaneous trades
+PAIR_WORKERS = 8             # Worker threads that manage/enter pairs in parallel
+PAIR_TASK_TIMEOUT = 10       # Seconds the loop waits for per-pair tasks before moving on
+SYMBOL_FILTERS_TTL = 3600    # Seconds before cached exchange filters (LOT_SIZE, MIN_NOTIONAL...) are refreshed
+JOURNAL_FLUSH_INTERVAL = 1   # Seconds the trade journal writer waits before writing what is queued
+PAIR_CONFIG_SETTLE = 2       # Seconds the pair CSV must go unmodified before an edit is loaded
 
-# === 📁 File Paths ===
-PAIR_CONFIG_CSV = "live_pairs.csv"       # File with live trading pairs + parameters
-LOG_FILE = "trade_log.csv"               # Trade execution log
-STATE_FILE = "open_positions.json"       # Persistent state to track open trades
\ No newline at end of file
+# === 📡 Market Data Stream ===
+BINANCE_WS_URL = "wss://stream.binance.com:9443"  # Base URL for combined kline/bookTicker streams
+WS_RECONNECT_DELAY = 5       # Seconds to wait before reconnecting a dropped stream
+PRICE_MAX_AGE = 5            # Seconds a streamed price stays usable before it is refreshed over REST
+MARKET_FEED = os.getenv("MARKET_FEED")  # Shared-memory market board to read instead of a WebSocket (set by shard_runner)
+MARKET_FEED_POLL_INTERVAL = 0.05        # Seconds between checks of the shared market board for updates
+
+# === 🧪 Backtesting ===
+KLINE_DATA_DIR = "klines"            # Local 1m kline store (live stream, backtester, screener)
+BACKTEST_FEE_RATE = 0.001            # Taker fee per fill (0.1%)
+BACKTEST_BORROW_RATE_HOURLY = 0.000005  # Margin interest on the borrowed leg, per hour
+
+# === 📊 Metrics ===
+METRICS_ENABLED = True       # Set to False to turn all instrumentation into no-ops
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9108))  # Local Prometheus endpoint (http://127.0.0.1:9108/metrics), 0 to disable
+METRICS_LOG_INTERVAL = 300   # Seconds between metric summaries in the log, 0 to disable
+
+# === 🧩 Shards (shard_runner.py) ===
+SHARD_NAME = os.getenv("SHARD_NAME")     # Set by shard_runner in each worker process
+SHARD_CONFIG_CSV = "shards.csv"          # One row per shard: name, pair config, API key/secret env var names
+SHARD_DIR = "shards"                     # Each shard's state file, journal and log go in <SHARD_DIR>/<name>/
+SHARD_RELAY_PORT = 9190                  # Local port workers send Telegram messages to (0 = any free port)
+SHARD_RESTART_DELAY = 30                 # Seconds before a crashed worker is restarted
+EXPOSURE_LOG_INTERVAL = 300              # Seconds between aggregated exposure reports in the log
+
+# === 📁 File Paths (overridable per shard from the environment) ===
+PAIR_CONFIG_CSV = os.getenv("PAIR_CONFIG_CSV", "live_pairs.csv")     # File with live trading pairs + parameters
+JOURNAL_FILE = os.getenv("JOURNAL_FILE", "trade_journal.db")         # Trade journal (SQLite)
+STATE_FILE = os.getenv("STATE_FILE", "open_positions.json")          # Persistent state to track open trades
\ No newline at end of file
@@ -0,0 +1,568 @@
+# fake_exchange.py
+
+import json
+import time
+import base64
+import random
+import socket
+import struct
+import hashlib
+import logging
+import argparse
+import threading
+import socketserver
+from urllib.parse import urlsplit, parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANDLE_MS = 60_000
+
+# Request weight of each endpoint, roughly Binance's. Anything not listed weighs 1.
+WEIGHTS = {
+    '/api/v3/exchangeInfo': 20, '/api/v3/klines': 2, '/api/v3/ticker/price': 4, '/api/v3/ticker/bookTicker': 4,
+    '/sapi/v1/margin/order': 6, '/sapi/v1/margin/myTrades': 10, '/sapi/v1/margin/loan': 100,
+    '/sapi/v1/margin/repay': 100, '/sapi/v1/margin/account': 10, '/sapi/v1/margin/isolated/account': 10,
+    '/sapi/v1/margin/allPairs': 1,
+}
+STEP_SIZE = 0.001
+MIN_NOTIONAL = 5.0
+# Appended to a client's Sec-WebSocket-Key to compute the handshake answer (RFC 6455).
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class ExchangeError(Exception):
+    """A Binance-style error response: HTTP status plus {'code', 'msg'} body."""
+
+    def __init__(self, status, code, msg, headers=None):
+        super().__init__(msg)
+        self.status, self.code, self.msg, self.headers = status, code, msg, headers or {}
+
+
+class FakeExchange:
+    """
+    A local stand-in for the Binance REST endpoints the bot uses: ping, time, exchangeInfo,
+    klines, ticker/price, ticker/bookTicker and the cross/isolated margin loan, repay,
+    order, myTrades and account endpoints. Point the bot at it with BINANCE_API_URL.
+
+    The market only moves when the caller says so: close_candle() appends one closed
+    1m candle per symbol and sets the new prices. Injected faults (latency, partial
+    fills, filter rejections, rate limiting) are drawn from a random generator seeded
+    per symbol and request count, so a run replays identically whatever the thread
+    interleaving. Signatures are not checked.
+    """
+
+    def __init__(self, prices, seed=0, latency=0.0, jitter=0.0, spread=0.0005, partial_fill_rate=0.0,
+                 reject_rate=0.0, rate_limit_rate=0.0, weight_limit=6000):
+        """`prices` maps each listed symbol to its starting price. Rates are probabilities per request."""
+        self.seed = seed
+        self.latency, self.jitter, self.spread = latency, jitter, spread
+        self.partial_fill_rate, self.reject_rate, self.rate_limit_rate = partial_fill_rate, reject_rate, rate_limit_rate
+        self.weight_limit = weight_limit
+        self.prices = dict(prices)
+        self.klines = {s: [] for s in prices}
+        self.balances = {}       # asset -> {'free', 'borrowed'}
+        self.orders = {}         # (symbol, client order id) -> order response
+        self.fills = []          # (monotonic time, symbol, side, executed qty, client order id)
+        self.requests = {}       # path -> count
+        self._draws = {}
+        self._weight = (0, -1)   # (used weight, minute)
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self.server = None
+
+    # --- market simulation ---
+
+    def close_candle(self, open_time, closes):
+        """Closes the candle opening at `open_time` (ms) with the given {symbol: close}; also sets the prices."""
+        with self._lock:
+            for symbol, close in closes.items():
+                prev = self.prices[symbol]
+                self.klines[symbol].append([open_time, f"{prev:.8f}", f"{max(prev, close):.8f}",
+                                            f"{min(prev, close):.8f}", f"{close:.8f}", "1000.0",
+                                            open_time + CANDLE_MS - 1, "0", 1, "0", "0", "0"])
+                self.prices[symbol] = close
+
+    def set_prices(self, prices):
+        """Moves prices within the current candle (a tick)."""
+        with self._lock:
+            self.prices.update(prices)
+
+    def book(self, symbol):
+        price = self.prices[symbol]
+        return price * (1 - self.spread / 2), price * (1 + self.spread / 2)
+
+    def request_count(self):
+        with self._lock:
+            return sum(self.requests.values())
+
+    # --- fault injection ---
+
+    def _rng(self, *key):
+        """A generator for the n-th draw with this key (e.g. endpoint and symbol)."""
+        with self._lock:
+            n = self._draws[key] = self._draws.get(key, 0) + 1
+        return random.Random(f"{self.seed}:{':'.join(map(str, key))}:{n}")
+
+    def _admit(self, path, params):
+        """Applies latency and rate limiting to one request. Returns the response headers."""
+        rng = self._rng(path, params.get('symbol', ''))
+        if self.latency or self.jitter:
+            time.sleep(self.latency + rng.random() * self.jitter)
+        minute = int(time.time() // 60)
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+            used = (self._weight[0] if self._weight[1] == minute else 0) + WEIGHTS.get(path, 1)
+            self._weight = (used, minute)
+        headers = {'x-mbx-used-weight-1m': str(used)}
+        if used > self.weight_limit or rng.random() < self.rate_limit_rate:
+            raise ExchangeError(429, -1003, "Too many requests; current limit is exceeded.",
+                                {**headers, 'Retry-After': str(60 - int(time.time()) % 60)})
+        return headers
+
+    # --- endpoints ---
+
+    def handle(self, method, path, params):
+        """Dispatches one request. Returns (status, headers, body)."""
+        try:
+            headers = self._admit(path, params)
+            handler = ROUTES.get((method, path))
+            if handler is None:
+                raise ExchangeError(404, -1000, f"Unknown endpoint {method} {path}")
+            return 200, headers, handler(self, params)
+        except ExchangeError as e:
+            return e.status, e.headers, {'code': e.code, 'msg': e.msg}
+
+    def _symbol(self, params):
+        symbol = params.get('symbol')
+        if symbol not in self.prices:
+            raise ExchangeError(400, -1121, "Invalid symbol.")
+        return symbol
+
+    def _balance(self, asset):
+        return self.balances.setdefault(asset, {'free': 0.0, 'borrowed': 0.0})
+
+    def ping(self, params):
+        return {}
+
+    def server_time(self, params):
+        return {'serverTime': int(time.time() * 1000)}
+
+    def exchange_info(self, params):
+        filters = [{'filterType': 'PRICE_FILTER', 'minPrice': '0.00000001', 'maxPrice': '1000000.00000000',
+                    'tickSize': '0.00000001'},
+                   {'filterType': 'LOT_SIZE', 'minQty': f"{STEP_SIZE:.8f}", 'maxQty': '90000000.00000000',
+                    'stepSize': f"{STEP_SIZE:.8f}"},
+                   {'filterType': 'NOTIONAL', 'minNotional': f"{MIN_NOTIONAL:.8f}"}]
+        symbols = [params['symbol']] if 'symbol' in params else list(self.prices)
+        return {'timezone': 'UTC', 'serverTime': int(time.time() * 1000), 'rateLimits': [],
+                'symbols': [{'symbol': s, 'status': 'TRADING', 'baseAsset': s.replace("USDT", ""),
+                             'quoteAsset': 'USDT', 'isMarginTradingAllowed': True, 'filters': filters}
+                            for s in symbols]}
+
+    def get_klines(self, params):
+        klines = self.klines[self._symbol(params)]
+        start = int(params.get('startTime', 0))
+        limit = min(int(params.get('limit', 500)), 1000)
+        out = [k for k in klines if k[0] >= start]
+        return out[:limit] if 'startTime' in params else out[-limit:]
+
+    def ticker_price(self, params):
+        if 'symbol' in params:
+            return {'symbol': self._symbol(params), 'price': f"{self.prices[params['symbol']]:.8f}"}
+        return [{'symbol': s, 'price': f"{p:.8f}"} for s, p in self.prices.items()]
+
+    def book_ticker(self, params):
+        symbols = [self._symbol(params)] if 'symbol' in params else list(self.prices)
+        out = []
+        for s in symbols:
+            bid, ask = self.book(s)
+            out.append({'symbol': s, 'bidPrice': f"{bid:.8f}", 'bidQty': "1000.0", 'askPrice': f"{ask:.8f}",
+                        'askQty': "1000.0"})
+        return out[0] if 'symbol' in params else out
+
+    def margin_all_pairs(self, params):
+        return [{'symbol': s, 'base': s.replace("USDT", ""), 'quote': 'USDT', 'isMarginTrade': True,
+                 'isBuyAllowed': True, 'isSellAllowed': True} for s in self.prices]
+
+    def margin_loan(self, params):
+        amount = float(params['amount'])
+        with self._lock:
+            balance = self._balance(params['asset'])
+            balance['free'] += amount
+            balance['borrowed'] += amount
+            self._next_id += 1
+            return {'tranId': self._next_id}
+
+    def margin_repay(self, params):
+        amount = float(params['amount'])
+        with self._lock:
+            balance = self._balance(params['asset'])
+            repaid = min(amount, balance['borrowed'], max(balance['free'], 0.0))
+            balance['free'] -= repaid
+            balance['borrowed'] -= repaid
+            self._next_id += 1
+            return {'tranId': self._next_id}
+
+    def margin_account(self, params):
+        with self._lock:
+            return {'userAssets': [{'asset': a, 'free': f"{b['free']:.8f}", 'locked': "0", 'interest': "0",
+                                    'borrowed': f"{b['borrowed']:.8f}",
+                                    'netAsset': f"{b['free'] - b['borrowed']:.8f}"}
+                                   for a, b in self.balances.items()]}
+
+    def isolated_margin_account(self, params):
+        with self._lock:
+            return {'assets': [{'symbol': f"{a}USDT", 'baseAsset': {'asset': a, 'free': f"{b['free']:.8f}",
+                                                                    'borrowed': f"{b['borrowed']:.8f}"}}
+                               for a, b in self.balances.items() if a != 'USDT']}
+
+    def create_margin_order(self, params):
+        symbol = self._symbol(params)
+        side, qty = params['side'], float(params['quantity'])
+        client_id = params.get('newClientOrderId') or f"fake{self._next_id}"
+        rng = self._rng('order', symbol)
+        bid, ask = self.book(symbol)
+        price = ask if side == 'BUY' else bid
+        if abs(qty / STEP_SIZE - round(qty / STEP_SIZE)) > 1e-6:
+            raise ExchangeError(400, -1013, "Filter failure: LOT_SIZE")
+        if qty * price < MIN_NOTIONAL:
+            raise ExchangeError(400, -1013, "Filter failure: NOTIONAL")
+        if rng.random() < self.reject_rate:
+            raise ExchangeError(400, -1013, "Filter failure: LOT_SIZE")
+        executed = qty
+        if rng.random() < self.partial_fill_rate:
+            executed = round(qty * rng.uniform(0.3, 0.9) / STEP_SIZE) * STEP_SIZE
+        with self._lock:
+            if (symbol, client_id) in self.orders:
+                raise ExchangeError(400, -2010, "Duplicate order sent.")
+            self._next_id += 1
+            base, quote = self._balance(symbol.replace("USDT", "")), self._balance('USDT')
+            sign = 1 if side == 'BUY' else -1
+            base['free'] += sign * executed
+            quote['free'] -= sign * executed * price
+            order = {'symbol': symbol, 'orderId': self._next_id, 'clientOrderId': client_id,
+                     'transactTime': int(time.time() * 1000), 'price': "0", 'origQty': f"{qty:.8f}",
+                     'executedQty': f"{executed:.8f}", 'cummulativeQuoteQty': f"{executed * price:.8f}",
+                     'status': 'FILLED' if executed == qty else 'EXPIRED', 'type': 'MARKET', 'side': side,
+                     'isIsolated': params.get('isIsolated') == 'TRUE',
+                     'fills': [{'price': f"{price:.8f}", 'qty': f"{executed:.8f}",
+                                'commission': f"{executed * price * 0.001:.8f}", 'commissionAsset': 'USDT',
+                                'tradeId': self._next_id}]}
+            self.orders[(symbol, client_id)] = order
+            self.fills.append((time.monotonic(), symbol, side, executed, client_id))
+        return order
+
+    def get_margin_order(self, params):
+        order = self.orders.get((self._symbol(params), params.get('origClientOrderId')))
+        if order is None:
+            raise ExchangeError(400, -2013, "Order does not exist.")
+        return {k: v for k, v in order.items() if k != 'fills'}
+
+    def margin_trades(self, params):
+        symbol, order_id = self._symbol(params), int(params['orderId'])
+        with self._lock:
+            orders = [o for (s, _), o in self.orders.items() if s == symbol and o['orderId'] == order_id]
+        return [{'symbol': symbol, 'id': f['tradeId'], 'orderId': order_id, 'price': f['price'], 'qty': f['qty'],
+                 'commission': f['commission'], 'commissionAsset': f['commissionAsset'],
+                 'isBuyer': o['side'] == 'BUY', 'time': o['transactTime']} for o in orders for f in o['fills']]
+
+    # --- HTTP ---
+
+    def start(self, port=0):
+        """Serves the exchange on 127.0.0.1:`port` (0 = any free port) from a background thread. Returns its URL."""
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), _ExchangeHandler)
+        self.server.daemon_threads = True
+        self.server.exchange = self
+        threading.Thread(target=self.server.serve_forever, name="fake-exchange", daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+ROUTES = {
+    ('GET', '/api/v3/ping'): FakeExchange.ping,
+    ('GET', '/api/v3/time'): FakeExchange.server_time,
+    ('GET', '/api/v3/exchangeInfo'): FakeExchange.exchange_info,
+    ('GET', '/api/v3/klines'): FakeExchange.get_klines,
+    ('GET', '/api/v3/ticker/price'): FakeExchange.ticker_price,
+    ('GET', '/api/v3/ticker/bookTicker'): FakeExchange.book_ticker,
+    ('GET', '/sapi/v1/margin/allPairs'): FakeExchange.margin_all_pairs,
+    ('POST', '/sapi/v1/margin/loan'): FakeExchange.margin_loan,
+    ('POST', '/sapi/v1/margin/repay'): FakeExchange.margin_repay,
+    ('GET', '/sapi/v1/margin/account'): FakeExchange.margin_account,
+    ('GET', '/sapi/v1/margin/isolated/account'): FakeExchange.isolated_margin_account,
+    ('POST', '/sapi/v1/margin/order'): FakeExchange.create_margin_order,
+    ('GET', '/sapi/v1/margin/order'): FakeExchange.get_margin_order,
+    ('GET', '/sapi/v1/margin/myTrades'): FakeExchange.margin_trades,
+}
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real APIs
+
+    def _params(self):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        length = int(self.headers.get('Content-Length', 0))
+        if length:
+            body = self.rfile.read(length)
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                params.update(json.loads(body))
+            else:
+                params.update(parse_qsl(body.decode()))
+        return url.path, params
+
+    def _reply(self, status, headers, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ExchangeHandler(_JSONHandler):
+    def _handle(self):
+        path, params = self._params()
+        self._reply(*self.server.exchange.handle(self.command, path, params))
+
+    do_GET = do_POST = do_DELETE = _handle
+
+
+class FakeTelegram:
+    """
+    A local Telegram Bot API stand-in for sendMessage and getUpdates. Sent messages are
+    kept in `messages`; push_command() queues an incoming chat message for the bot.
+    Point TELEGRAM_API_URL at it. With `min_interval`, sends closer together than that
+    get a 429 with retry_after, like Telegram's per-chat limit. Markdown with an odd
+    number of "_", "*" or "`" gets a 400, as Telegram rejects entities it cannot parse.
+    """
+
+    def __init__(self, chat_id=1, min_interval=0.0):
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.messages = []
+        self.rate_limited = 0
+        self.bad_requests = 0
+        self._updates = []
+        self._last_sent = 0.0
+        self._cond = threading.Condition()
+        self.server = None
+
+    def push_command(self, text):
+        with self._cond:
+            update_id = len(self._updates) + 1
+            self._updates.append({'update_id': update_id,
+                                  'message': {'chat': {'id': self.chat_id}, 'text': text, 'date': int(time.time())}})
+            self._cond.notify_all()
+
+    def handle(self, method, path, params):
+        name = path.rsplit('/', 1)[-1]
+        if name == 'sendMessage':
+            text = params.get('text', '')
+            with self._cond:
+                now = time.monotonic()
+                if now - self._last_sent < self.min_interval:
+                    self.rate_limited += 1
+                    return 429, {}, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+                                     'parameters': {'retry_after': 1}}
+                self._last_sent = now
+                if params.get('parse_mode') == 'Markdown' and any(text.count(c) % 2 for c in '_*`'):
+                    self.bad_requests += 1
+                    return 400, {}, {'ok': False, 'error_code': 400,
+                                     'description': "Bad Request: can't parse entities"}
+                self.messages.append(text)
+            return 200, {}, {'ok': True, 'result': {'message_id': len(self.messages)}}
+        if name == 'getUpdates':
+            offset = int(params.get('offset') or 0)
+            # Long poll, capped so shutting the stand-in down never waits on a parked request.
+            deadline = time.monotonic() + min(float(params.get('timeout') or 0), 1.0)
+            with self._cond:
+                while True:
+                    if offset < 0:
+                        updates = self._updates[offset:]
+                    else:
+                        updates = [u for u in self._updates if u['update_id'] >= offset]
+                    remaining = deadline - time.monotonic()
+                    if updates or remaining <= 0:
+                        return 200, {}, {'ok': True, 'result': updates}
+                    self._cond.wait(remaining)
+        return 404, {}, {'ok': False, 'error_code': 404, 'description': 'Not Found'}
+
+    def start(self, port=0):
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), _TelegramHandler)
+        self.server.daemon_threads = True
+        self.server.telegram = self
+        threading.Thread(target=self.server.serve_forever, name="fake-telegram", daemon=True).start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class _TelegramHandler(_JSONHandler):
+    def _handle(self):
+        path, params = self._params()
+        self._reply(*self.server.telegram.handle(self.command, path, params))
+
+    do_GET = do_POST = _handle
+
+
+class FakeMarketStream:
+    """
+    A local stand-in for Binance's combined-stream WebSocket (/stream?streams=...). Point
+    MarketStream's `url` at start(). send_kline() and send_book() push an event to every
+    connected client; drop() closes all connections, like the exchange dropping the stream.
+    Only what the bot needs of the protocol is implemented: unfragmented text frames
+    out, close and ping frames in.
+    """
+
+    def __init__(self):
+        self.paths = []          # request path of every connection accepted, in order
+        self._clients = []
+        self._cond = threading.Condition()
+        self.server = None
+
+    def wait_for_connections(self, n, timeout=10):
+        """Blocks until `n` connections have been accepted in total. Returns whether they were."""
+        with self._cond:
+            return self._cond.wait_for(lambda: len(self.paths) >= n, timeout)
+
+    def send(self, stream, data):
+        payload = json.dumps({'stream': stream, 'data': data}).encode()
+        header = bytes([0x81])  # FIN + text frame
+        if len(payload) < 126:
+            header += bytes([len(payload)])
+        elif len(payload) < 1 << 16:
+            header += bytes([126]) + struct.pack('>H', len(payload))
+        else:
+            header += bytes([127]) + struct.pack('>Q', len(payload))
+        with self._cond:
+            clients = list(self._clients)
+        for sock in clients:
+            try:
+                sock.sendall(header + payload)
+            except OSError:
+                pass
+
+    def send_kline(self, symbol, kline, closed=True):
+        """Pushes a kline event for a candle in Binance's REST list format (see FakeExchange.klines)."""
+        self.send(f"{symbol.lower()}@kline_1m",
+                  {'e': 'kline', 'E': int(time.time() * 1000), 's': symbol,
+                   'k': {'t': kline[0], 'T': kline[6], 's': symbol, 'i': '1m', 'o': kline[1], 'h': kline[2],
+                         'l': kline[3], 'c': kline[4], 'v': kline[5], 'x': closed}})
+
+    def send_book(self, symbol, bid, ask):
+        self.send(f"{symbol.lower()}@bookTicker", {'u': 1, 's': symbol, 'b': f"{bid:.8f}", 'B': "1000.0",
+                                                    'a': f"{ask:.8f}", 'A': "1000.0"})
+
+    def drop(self):
+        """Closes every open connection without a close handshake."""
+        with self._cond:
+            clients, self._clients = self._clients, []
+        for sock in clients:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+    def start(self, port=0):
+        """Serves on 127.0.0.1:`port` (0 = any free port) from a background thread. Returns its ws:// URL."""
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', port), _StreamHandler)
+        self.server.daemon_threads = True
+        self.server.stream = self
+        threading.Thread(target=self.server.serve_forever, name="fake-stream", daemon=True).start()
+        return f"ws://127.0.0.1:{self.server.server_address[1]}"
+
+    def stop(self):
+        self.drop()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class _StreamHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        stream = self.server.stream
+        request_line = self.rfile.readline().decode()
+        headers = {}
+        while (line := self.rfile.readline().decode().strip()):
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        accept = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + WS_GUID).encode()).digest())
+        # Registered in the same critical section as the handshake answer, so an event sent
+        # once the client sees the connection open always reaches it, and never before the answer.
+        with stream._cond:
+            self.wfile.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                             b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+            stream._clients.append(self.request)
+            stream.paths.append(request_line.split()[1])
+            stream._cond.notify_all()
+        try:
+            while (frame := self._read_frame()) is not None:
+                opcode, payload = frame
+                if opcode == 0x8:  # close: echo it and hang up
+                    self.request.sendall(bytes([0x88, len(payload)]) + payload)
+                    break
+                if opcode == 0x9:  # ping
+                    self.request.sendall(bytes([0x8A, len(payload)]) + payload)
+        except OSError:
+            pass
+        finally:
+            with stream._cond:
+                if self.request in stream._clients:
+                    stream._clients.remove(self.request)
+
+    def _read_frame(self):
+        """(opcode, unmasked payload) of the next client frame, or None when the connection closed."""
+        head = self.rfile.read(2)
+        if len(head) < 2:
+            return None
+        length = head[1] & 0x7F
+        if length == 126:
+            length = struct.unpack('>H', self.rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack('>Q', self.rfile.read(8))[0]
+        mask = self.rfile.read(4) if head[1] & 0x80 else bytes(4)
+        payload = self.rfile.read(length)
+        return head[0] & 0x0F, bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Run the fake exchange and Telegram stand-in on local ports.")
+    parser.add_argument("symbols", nargs="+", help="symbols to list, e.g. BTCUSDT ETHUSDT")
+    parser.add_argument("--port", type=int, default=8900, help="exchange port (Telegram uses port + 1)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--partial-fills", type=float, default=0.0, help="fraction of orders only partly filled")
+    parser.add_argument("--rejects", type=float, default=0.0, help="fraction of orders rejected by a filter")
+    parser.add_argument("--rate-limits", type=float, default=0.0, help="fraction of requests answered with 429")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    exchange = FakeExchange({s: rng.uniform(1, 100) for s in args.symbols}, seed=args.seed, latency=args.latency,
+                            partial_fill_rate=args.partial_fills, reject_rate=args.rejects,
+                            rate_limit_rate=args.rate_limits)
+    telegram = FakeTelegram()
+    logging.info(f"Exchange on {exchange.start(args.port)} (set BINANCE_API_URL), "
+                 f"Telegram on {telegram.start(args.port + 1)} (set TELEGRAM_API_URL).")
+    # Close a candle every minute with a small random walk until interrupted.
+    try:
+        while True:
+            time.sleep(60 - time.time() % 60)
+            open_time = int(time.time() // 60) * 60_000 - 60_000
+            exchange.close_candle(open_time, {s: p * (1 + rng.gauss(0, 0.001)) for s, p in exchange.prices.items()})
+    except KeyboardInterrupt:
+        exchange.stop()
+        telegram.stop()
@@ -0,0 +1,163 @@
+# kline_store.py
+
+import os
+import time
+import logging
+import argparse
+import threading
+import numpy as np
+import metrics
+from config import KLINE_DATA_DIR, PAIR_CONFIG_CSV
+
+CANDLE_MS = 60_000
+# Column name -> dtype. Each column is one append-only raw binary file per symbol.
+COLUMNS = {'open_time': np.int64, 'open': np.float64, 'high': np.float64, 'low': np.float64,
+           'close': np.float64, 'volume': np.float64}
+# Position of each column in Binance's raw kline list.
+KLINE_FIELDS = {'open_time': 0, 'open': 1, 'high': 2, 'low': 3, 'close': 4, 'volume': 5}
+
+
+class KlineStore:
+    """
+    On-disk store of closed 1-minute klines: `<root>/<SYMBOL>/<column>.bin`, one
+    append-only file of fixed-width values per column.
+
+    open_time is always written last, so its length is the committed row count. If a
+    crash leaves the columns at different lengths, they are cut back to the shortest
+    one before the next append; anything lost is simply fetched again by sync().
+    Reads memory-map the files and return NumPy views, so nothing is copied.
+    """
+
+    def __init__(self, root=KLINE_DATA_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._last = {}
+
+    def _path(self, symbol, column):
+        return os.path.join(self.root, symbol, f"{column}.bin")
+
+    def symbols(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(s for s in os.listdir(self.root) if os.path.exists(self._path(s, 'open_time')))
+
+    def __contains__(self, symbol):
+        return os.path.exists(self._path(symbol, 'open_time'))
+
+    def rows(self, symbol):
+        path = self._path(symbol, 'open_time')
+        return os.path.getsize(path) // 8 if os.path.exists(path) else 0
+
+    def last_open_time(self, symbol):
+        """Open time of the newest stored candle, or None for an empty symbol."""
+        if symbol not in self._last:
+            n = self.rows(symbol)
+            if n == 0:
+                self._last[symbol] = None
+            else:
+                with open(self._path(symbol, 'open_time'), 'rb') as f:
+                    f.seek((n - 1) * 8)
+                    self._last[symbol] = int(np.frombuffer(f.read(8), dtype=np.int64)[0])
+        return self._last[symbol]
+
+    def _repair(self, symbol):
+        paths = [self._path(symbol, column) for column in COLUMNS]
+        sizes = [os.path.getsize(p) if os.path.exists(p) else 0 for p in paths]
+        n = min(sizes) // 8
+        for path, size in zip(paths, sizes):
+            if size > n * 8:
+                logging.warning(f"Truncating partially written {os.path.basename(path)} for {symbol} to {n} rows.")
+                with open(path, 'r+b') as f:
+                    f.truncate(n * 8)
+        if n * 8 < sizes[0]:
+            self._last.pop(symbol, None)
+
+    def append(self, symbol, klines):
+        """
+        Appends raw Binance klines. Candles not newer than the last stored one are
+        ignored. Returns the number of rows written.
+        """
+        with self._lock:
+            os.makedirs(os.path.join(self.root, symbol), exist_ok=True)
+            self._repair(symbol)
+            last = self.last_open_time(symbol)
+            klines = [k for k in klines if last is None or int(k[0]) > last]
+            if not klines:
+                return 0
+            # Values columns first, open_time last: it is what commits the rows.
+            for column in sorted(COLUMNS, key=lambda c: c == 'open_time'):
+                values = np.array([k[KLINE_FIELDS[column]] for k in klines], dtype=COLUMNS[column])
+                with open(self._path(symbol, column), 'ab') as f:
+                    f.write(values.tobytes())
+            self._last[symbol] = int(klines[-1][0])
+            return len(klines)
+
+    def read(self, symbol, start=None, end=None, columns=('open_time', 'close')):
+        """
+        Zero-copy read: {column: array} for candles with start <= open_time < end
+        (either bound optional). Arrays are read-only views of the memory-mapped files.
+        """
+        n = self.rows(symbol)
+        if n == 0:
+            return {c: np.empty(0, dtype=COLUMNS[c]) for c in columns}
+        times = np.memmap(self._path(symbol, 'open_time'), dtype=np.int64, mode='r', shape=(n,))
+        lo = int(np.searchsorted(times, start)) if start is not None else 0
+        hi = int(np.searchsorted(times, end)) if end is not None else n
+        out = {}
+        for column in columns:
+            data = times if column == 'open_time' else \
+                np.memmap(self._path(symbol, column), dtype=COLUMNS[column], mode='r', shape=(n,))
+            out[column] = data[lo:hi]
+        return out
+
+    def tail(self, symbol, count, since=None):
+        """The latest `count` candles newer than `since` as [(open_time, close), ...]."""
+        data = self.read(symbol, start=None if since is None else since + 1)
+        return list(zip(data['open_time'][-count:].tolist(), data['close'][-count:].tolist()))
+
+    def sync(self, symbol, min_candles=0):
+        """
+        Incrementally downloads the closed candles newer than the last stored one. An
+        empty symbol starts `min_candles` back. Returns the number of candles added.
+        """
+        # Imported here so reading the store (backtests, research) needs no API client.
+        from binance_api import get_closed_klines
+
+        with metrics.timer('kline_sync_seconds'):
+            added = self._sync(symbol, get_closed_klines, min_candles)
+        if added:
+            logging.info(f"Synced {added} new candles for {symbol}.")
+        return added
+
+    def _sync(self, symbol, get_closed_klines, min_candles):
+        last = self.last_open_time(symbol)
+        now_ms = int(time.time() * 1000)
+        start = last + CANDLE_MS if last is not None else now_ms - (int(min_candles) + 1) * CANDLE_MS
+        added = 0
+        while start < now_ms - CANDLE_MS:
+            klines = get_closed_klines(symbol, 1000, start_time=start)
+            if not klines:
+                break
+            added += self.append(symbol, klines)
+            start = int(klines[-1][0]) + CANDLE_MS
+            if len(klines) < 999:
+                break
+        return added
+
+
+if __name__ == "__main__":
+    import csv
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Sync 1m klines from Binance into the local store.")
+    parser.add_argument("symbols", nargs="*", help="symbols to sync (default: all in the pair config)")
+    parser.add_argument("--days", type=float, default=30, help="history to fetch for symbols not stored yet")
+    parser.add_argument("--store", default=KLINE_DATA_DIR, help="store directory")
+    args = parser.parse_args()
+
+    symbols = args.symbols
+    if not symbols:
+        with open(PAIR_CONFIG_CSV) as f:
+            symbols = sorted({row[k] for row in csv.DictReader(f) for k in ('sym1', 'sym2')})
+    store = KlineStore(args.store)
+    for symbol in symbols:
+        store.sync(symbol, min_candles=args.days * 24 * 60)
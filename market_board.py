@@ -0,0 +1,217 @@
+# market_board.py
+
+import time
+import threading
+from collections import deque
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+from market_stream import MarketStream
+from config import MARKET_FEED_POLL_INTERVAL
+
+# One row per symbol. `seq` is odd while the row is being written (a seqlock), so readers
+# in other processes can detect a torn read and retry without a cross-process lock.
+SLOT = np.dtype([('symbol', 'S16'), ('seq', np.uint64), ('last', np.float64), ('bid', np.float64),
+                 ('ask', np.float64), ('closed', np.int64)])
+# Header fields (int64): change counter, symbol count, capacity, stream connected, heartbeat (ms).
+CHANGES, COUNT, CAPACITY, CONNECTED, HEARTBEAT = range(5)
+HEADER_SIZE = 5 * 8
+# Readers treat the board as disconnected when the supervisor has not written for this long.
+HEARTBEAT_TIMEOUT_MS = 10_000
+
+
+class MarketBoard:
+    """
+    Latest prices and closed-candle times of many symbols in one shared-memory block,
+    written by the shard supervisor and read by every worker process.
+
+    Candles themselves are not copied here: the supervisor appends them to the
+    KlineStore, whose memory-mapped files the workers read directly. The board only
+    tells them when a symbol has a new one (`closed`, the newest stored open time).
+    """
+
+    def __init__(self, name=None, capacity=4096):
+        """Creates a new board (`name` None) or attaches to the existing board `name`."""
+        self.owner = name is None
+        if self.owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + capacity * SLOT.itemsize)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            # Attaching registers the block with this process's resource tracker, which would
+            # unlink it when the worker exits. Only the supervisor that created it may.
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+        self.name = self._shm.name
+        self.header = np.ndarray((5,), dtype=np.int64, buffer=self._shm.buf)
+        if self.owner:
+            self.header[:] = 0
+            self.header[CAPACITY] = capacity
+        self.slots = np.ndarray((int(self.header[CAPACITY]),), dtype=SLOT, buffer=self._shm.buf,
+                                offset=HEADER_SIZE)
+        self._seq, self._last, self._bid, self._ask, self._closed = \
+            (self.slots[f] for f in ('seq', 'last', 'bid', 'ask', 'closed'))
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        # The NumPy views must go before the buffer they point into can be released.
+        self.header = self.slots = self._seq = self._last = self._bid = self._ask = self._closed = None
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+    # --- writing (supervisor) ---
+
+    def _add(self, symbol):
+        i = int(self.header[COUNT])
+        if i >= len(self.slots):
+            raise ValueError(f"Market board is full ({len(self.slots)} symbols).")
+        self.slots[i] = (symbol.encode(), 0, np.nan, np.nan, np.nan, 0)
+        self.header[COUNT] = i + 1  # the row is visible to readers only once it is filled in
+        self._index[symbol] = i
+        return i
+
+    def publish(self, symbol, last=None, bid=None, ask=None, closed=None):
+        """Updates a symbol's row, adding it if needed. Fields left as None keep their value."""
+        with self._lock:
+            i = self._index.get(symbol)
+            if i is None:
+                i = self._add(symbol)
+            self._seq[i] += 1
+            if last is not None:
+                self._last[i] = last
+            if bid is not None:
+                self._bid[i] = bid
+            if ask is not None:
+                self._ask[i] = ask
+            if closed is not None:
+                self._closed[i] = closed
+            self._seq[i] += 1
+            self.header[CHANGES] += 1
+
+    def set_connected(self, connected):
+        """Publishes the supervisor's stream status; also serves as its heartbeat."""
+        self.header[CONNECTED] = int(connected)
+        self.header[HEARTBEAT] = int(time.time() * 1000)
+
+    # --- reading (workers) ---
+
+    @property
+    def changes(self):
+        """Counter bumped on every publish(); unchanged means nothing needs to be read."""
+        return int(self.header[CHANGES])
+
+    def connected(self):
+        return bool(self.header[CONNECTED]) and time.time() * 1000 - self.header[HEARTBEAT] < HEARTBEAT_TIMEOUT_MS
+
+    def slot(self, symbol):
+        """Row of a symbol, or None if the supervisor has not published it (yet)."""
+        i = self._index.get(symbol)
+        if i is None:
+            hits = np.flatnonzero(self.slots['symbol'][:int(self.header[COUNT])] == symbol.encode())
+            if len(hits):
+                i = self._index[symbol] = int(hits[0])
+        return i
+
+    def seqs(self, rows):
+        return self._seq[rows]
+
+    def read(self, i):
+        """(seq, last, bid, ask, closed) of row `i`. Prices are NaN until first published."""
+        while True:
+            seq = int(self._seq[i])
+            if not seq & 1:
+                row = (seq, float(self._last[i]), float(self._bid[i]), float(self._ask[i]), int(self._closed[i]))
+                if int(self._seq[i]) == seq:
+                    return row
+            time.sleep(0)  # mid-write: let the writer finish
+
+
+class _BoardConnected:
+    """Stands in for MarketStream.connected (a threading.Event) on a SharedMarketFeed."""
+
+    def __init__(self, board):
+        self.board = board
+
+    def is_set(self):
+        return self.board.connected()
+
+
+class SharedMarketFeed(MarketStream):
+    """
+    MarketStream's read API served from a supervisor's MarketBoard instead of a
+    WebSocket. Buffers are refilled from the shared KlineStore whenever the board
+    shows a newer closed candle; the supervisor alone syncs and appends to the store.
+    """
+
+    def __init__(self, board_name, windows, store=None, on_quote=None, poll_interval=MARKET_FEED_POLL_INTERVAL):
+        super().__init__(windows, store=store, on_quote=on_quote)
+        self.board = MarketBoard(board_name)
+        self.poll_interval = poll_interval
+        self.connected = _BoardConnected(self.board)
+        self._seen = -1
+        self._map_slots()
+
+    def _map_slots(self):
+        """Caches the board row of every buffered symbol so a poll reads only the rows that changed."""
+        symbols = list(self._candles)
+        slots = [self.board.slot(s) for s in symbols]
+        self._mapped = [(s, i) for s, i in zip(symbols, slots) if i is not None]
+        self._rows = np.array([i for _, i in self._mapped], dtype=np.intp)
+        self._row_seqs = np.zeros(len(self._rows), dtype=np.uint64)
+        self._unmapped = len(self._mapped) < len(symbols)
+
+    def start(self):
+        self.backfill()
+
+    def stop(self):
+        self.board.close()
+
+    def backfill(self):
+        for symbol in list(self._candles):
+            self._refresh(symbol)
+
+    def set_windows(self, windows):
+        """Applies new per-symbol buffer sizes; the supervisor subscribes to new symbols on its own."""
+        with self._lock:
+            for symbol in [s for s in self._candles if s not in windows]:
+                del self._candles[symbol]
+            refill = [s for s, w in windows.items() if s not in self._candles or self._candles[s].maxlen != int(w)]
+            for symbol in refill:
+                self._candles[symbol] = deque(maxlen=int(windows[symbol]))
+        for symbol in refill:
+            self._refresh(symbol)
+        self._map_slots()
+
+    def _poll(self):
+        if self._unmapped:
+            self._map_slots()
+        changes = self.board.changes
+        if changes == self._seen:
+            return
+        self._seen = changes
+        seqs = self.board.seqs(self._rows)
+        for n in np.flatnonzero(seqs != self._row_seqs):
+            symbol, i = self._mapped[n]
+            seq, last, bid, ask, closed = self.board.read(i)
+            self._row_seqs[n] = seq
+            last, bid, ask = (None if p != p else p for p in (last, bid, ask))  # NaN: not published yet
+            if self.on_quote:
+                self.on_quote(symbol, last=last, bid=bid, ask=ask)
+            with self._lock:
+                if last is not None and self._last_price.get(symbol) != last:
+                    self._last_price[symbol] = last
+                    self._ticked.add(symbol)
+                buf = self._candles.get(symbol)
+                stale = buf is not None and closed and (not buf or closed > buf[-1][0])
+            if stale:
+                self._refresh(symbol)
+
+    def wait_for_update(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            self._poll()
+            with self._lock:
+                if self._closed or self._ticked or time.monotonic() >= deadline:
+                    closed, ticked = self._closed, self._ticked
+                    self._closed, self._ticked = set(), set()
+                    return closed, ticked
+            time.sleep(self.poll_interval)
@@ -0,0 +1,206 @@
+# market_stream.py
+
+import json
+import time
+import logging
+import threading
+from collections import deque
+import websocket
+from kline_store import KlineStore
+from config import BINANCE_WS_URL, WS_RECONNECT_DELAY
+
+CANDLE_MS = 60_000
+
+
+class MarketStream:
+    """
+    Keeps live market data for a set of symbols in memory, fed by one combined
+    Binance WebSocket connection (1m klines + bookTicker).
+
+    Every symbol has a rolling buffer of closed candles [(open_time_ms, close), ...].
+    Closed candles are also appended to the on-disk KlineStore, and the buffers are
+    filled from it. REST is only used through KlineStore.sync(): to catch up on
+    (re)connect and to fill a gap when a closed candle does not follow the previous one.
+    """
+
+    def __init__(self, windows, url=BINANCE_WS_URL, store=None, on_quote=None):
+        """
+        `windows` maps each symbol to the number of closed candles to keep for it.
+        `on_quote(symbol, last=..., bid=..., ask=...)` is called with every price update
+        (e.g. binance_api.update_quote, to keep its price snapshot current).
+        """
+        self.url = url
+        self.store = store if store is not None else KlineStore()
+        self.on_quote = on_quote
+        self._candles = {s: deque(maxlen=int(w)) for s, w in windows.items()}
+        self._last_price = {}
+        self._lock = threading.Lock()
+        # Signalled on every closed candle and price tick; see wait_for_update().
+        self._updated = threading.Condition(self._lock)
+        self._closed = set()
+        self._ticked = set()
+        self._stop = threading.Event()
+        self._ws = None
+        self._thread = None
+        self.connected = threading.Event()
+
+    @property
+    def symbols(self):
+        return list(self._candles)
+
+    def stream_url(self):
+        streams = [f"{s.lower()}@{kind}" for s in list(self._candles) for kind in ("kline_1m", "bookTicker")]
+        return f"{self.url}/stream?streams={'/'.join(streams)}"
+
+    # --- lifecycle ---
+
+    def start(self):
+        self.backfill()
+        self._thread = threading.Thread(target=self._run, name="market-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._ws:
+            self._ws.close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._ws = websocket.WebSocketApp(self.stream_url(), on_open=self._on_open,
+                                              on_message=self._on_message, on_error=self._on_error,
+                                              on_close=self._on_close)
+            self._ws.run_forever(ping_interval=60, ping_timeout=10)
+            self.connected.clear()
+            if not self._stop.is_set():
+                logging.warning(f"Market stream disconnected. Reconnecting in {WS_RECONNECT_DELAY}s...")
+                self._stop.wait(WS_RECONNECT_DELAY)
+
+    def _on_open(self, ws):
+        # Anything that closed while we were disconnected is fetched before signals resume.
+        self.backfill()
+        self.connected.set()
+        logging.info(f"Market stream connected ({len(self._candles)} symbols).")
+
+    def _on_error(self, ws, error):
+        logging.error(f"Market stream error: {error}")
+
+    def _on_close(self, ws, status_code, message):
+        self.connected.clear()
+
+    def set_windows(self, windows):
+        """
+        Applies new per-symbol buffer sizes while running. Resized buffers are refilled
+        from the store; new symbols are synced and subscribed to by reconnecting the stream.
+        """
+        added = [s for s in windows if s not in self._candles]
+        with self._lock:
+            for symbol in [s for s in self._candles if s not in windows]:
+                del self._candles[symbol]
+            resized = [s for s, w in windows.items() if s in self._candles and self._candles[s].maxlen != int(w)]
+            for symbol in resized:
+                self._candles[symbol] = deque(self.store.tail(symbol, int(windows[symbol])), maxlen=int(windows[symbol]))
+            for symbol in added:
+                self._candles[symbol] = deque(maxlen=int(windows[symbol]))
+        for symbol in added:
+            self.store.sync(symbol, min_candles=int(windows[symbol]))
+            self._refresh(symbol)
+        if added and self._ws:
+            logging.info(f"Subscribing to {len(added)} new symbols. Reconnecting the market stream.")
+            self._ws.close()  # _run() reconnects with the new stream URL
+
+    # --- message handling ---
+
+    def _on_message(self, ws, raw):
+        try:
+            msg = json.loads(raw)
+            data = msg.get('data', msg)
+            if data.get('e') == 'kline':
+                self._handle_kline(data['s'], data['k'])
+            elif 'b' in data and 'a' in data:
+                if self.on_quote:
+                    self.on_quote(data['s'], bid=float(data['b']), ask=float(data['a']))
+        except Exception as e:
+            logging.error(f"Bad market stream message: {e}")
+
+    def _handle_kline(self, symbol, k):
+        close = float(k['c'])
+        if self.on_quote:
+            self.on_quote(symbol, last=close)
+        with self._lock:
+            if self._last_price.get(symbol) != close:
+                self._last_price[symbol] = close
+                self._ticked.add(symbol)
+                self._updated.notify_all()
+        if k.get('x'):
+            self._append_closed(symbol, k)
+
+    def _append_closed(self, symbol, k):
+        if symbol not in self._candles:
+            return
+        open_time = int(k['t'])
+        last = self.store.last_open_time(symbol)
+        if last is not None and open_time <= last:
+            return  # duplicate delivery, already stored
+        if last is not None and open_time - last > CANDLE_MS:
+            missing = (open_time - last) // CANDLE_MS - 1
+            logging.warning(f"Gap of {missing} candles in {symbol} stream. Recovering over REST.")
+            self.store.sync(symbol)
+        self.store.append(symbol, [[open_time, k['o'], k['h'], k['l'], k['c'], k['v']]])
+        self._refresh(symbol)
+
+    def _refresh(self, symbol):
+        """Extends a symbol's buffer with the candles the store has beyond it."""
+        with self._lock:
+            buf = self._candles[symbol]
+            newer = self.store.tail(symbol, buf.maxlen, since=buf[-1][0] if buf else None)
+            if buf and newer and newer[0][0] - buf[-1][0] > CANDLE_MS:
+                buf.clear()  # too far behind to stitch together, start over
+                newer = self.store.tail(symbol, buf.maxlen)
+            buf.extend(newer)
+            if buf and symbol not in self._last_price:
+                self._last_price[symbol] = buf[-1][1]
+            if newer:
+                self._closed.add(symbol)
+                self._updated.notify_all()
+
+    def backfill(self):
+        """Syncs the store with every closed candle it is missing and refills the buffers."""
+        for symbol, buf in list(self._candles.items()):
+            if buf and len(buf) == buf.maxlen and time.time() * 1000 - buf[-1][0] < 2 * CANDLE_MS:
+                continue  # full and current
+            self.store.sync(symbol, min_candles=buf.maxlen)
+            self._refresh(symbol)
+
+    # --- read API ---
+
+    def wait_for_update(self, timeout):
+        """
+        Blocks until a candle closes or a price changes, or `timeout` seconds pass.
+        Returns (symbols with a newly closed candle, symbols with a new price) since the last call.
+        """
+        with self._updated:
+            if not (self._closed or self._ticked):
+                self._updated.wait(timeout)
+            closed, ticked = self._closed, self._ticked
+            self._closed, self._ticked = set(), set()
+        return closed, ticked
+
+    def _tail(self, symbol, n, since):
+        out = []
+        for t, c in reversed(self._candles.get(symbol, ())):
+            if len(out) >= n or (since is not None and t <= since):
+                break
+            out.append((t, c))
+        out.reverse()
+        return out
+
+    def get_candles(self, symbol, n, since=None):
+        """The latest `n` closed candles [(open_time, close), ...] of a symbol, optionally only those newer than `since`."""
+        with self._lock:
+            return self._tail(symbol, n, since)
+
+    def get_last_price(self, symbol):
+        """Latest traded price (close of the forming candle), or None if nothing was received yet."""
+        return self._last_price.get(symbol)
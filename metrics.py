@@ -0,0 +1,223 @@
+# metrics.py
+
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import nullcontext
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import METRICS_ENABLED, METRICS_PORT, METRICS_LOG_INTERVAL
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is +Inf.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Binance reports the request weight used in the current minute in this response header.
+USED_WEIGHT_HEADER = 'x-mbx-used-weight-1m'
+
+# When False every recording function returns immediately and timer() hands out one
+# shared no-op context manager, so instrumented code pays one attribute check.
+enabled = METRICS_ENABLED
+
+_NULL_TIMER = nullcontext()
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_gauges = {}      # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., count, sum, max]
+# (used weight, minute it was reported in). Tracked even when metrics are disabled: the scheduler backs off on it.
+_weight = (0, -1)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    if not enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    if not enabled:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, seconds, **labels):
+    """Adds one observation (in seconds) to a histogram."""
+    if not enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(BUCKETS) + 1) + [0, 0.0, 0.0]
+        h[bisect_left(BUCKETS, seconds)] += 1
+        h[-3] += 1
+        h[-2] += seconds
+        h[-1] = max(h[-1], seconds)
+
+
+class _Timer:
+    __slots__ = ('name', 'labels', 'start')
+
+    def __init__(self, name, labels):
+        self.name, self.labels = name, labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+
+
+def timer(name, **labels):
+    """Context manager that records how long its block took into the `name` histogram."""
+    return _Timer(name, labels) if enabled else _NULL_TIMER
+
+
+def stage(name):
+    """Times one stage of the trading loop (the `stage_seconds` histogram)."""
+    return _Timer('stage_seconds', {'stage': name}) if enabled else _NULL_TIMER
+
+
+# --- Binance client instrumentation ---
+
+def _record_response(client, endpoint, started):
+    global _weight
+    observe('rest_request_seconds', time.perf_counter() - started, endpoint=endpoint)
+    inc('rest_requests_total', endpoint=endpoint)
+    response = getattr(client, 'response', None)
+    weight = response.headers.get(USED_WEIGHT_HEADER) if response is not None else None
+    if weight is not None:
+        _weight = (int(weight), int(time.time() // 60))
+        set_gauge('binance_used_weight_1m', int(weight))
+
+
+def instrument_client(client):
+    """Wraps a python-binance Client so every REST call is counted and timed and the used weight tracked."""
+    request = client._request
+
+    def _request(method, uri, signed, force_params=False, **kwargs):
+        started = time.perf_counter()
+        try:
+            return request(method, uri, signed, force_params, **kwargs)
+        finally:
+            _record_response(client, urlsplit(uri).path, started)
+
+    client._request = _request
+    return client
+
+
+def instrument_async_client(client):
+    """Same as instrument_client() for an AsyncClient."""
+    request = client._request
+
+    async def _request(method, uri, signed, force_params=False, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await request(method, uri, signed, force_params, **kwargs)
+        finally:
+            _record_response(client, urlsplit(uri).path, started)
+
+    client._request = _request
+    return client
+
+
+def used_weight():
+    """Request weight used in the current minute, as last reported by Binance (0 if nothing was reported)."""
+    weight, minute = _weight
+    # Binance resets the counter every minute, so a value from an earlier minute is stale.
+    return weight if minute == int(time.time() // 60) else 0
+
+
+# --- exposition ---
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        counters, gauges = dict(_counters), dict(_gauges)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+    for (name, labels), value in sorted(counters.items()):
+        lines.append(f"pairs_bot_{name}{_labels(labels)} {value}")
+    for (name, labels), value in sorted(gauges.items()):
+        lines.append(f"pairs_bot_{name}{_labels(labels)} {value}")
+    for (name, labels), h in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), h):
+            cumulative += count
+            lines.append(f"pairs_bot_{name}_bucket{_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"pairs_bot_{name}_count{_labels(labels)} {h[-3]}")
+        lines.append(f"pairs_bot_{name}_sum{_labels(labels)} {h[-2]:.6f}")
+    return "\n".join(lines) + "\n"
+
+
+def _quantile(h, q):
+    """Upper bucket bound below which a fraction `q` of the observations fall."""
+    target, cumulative = q * h[-3], 0
+    for bound, count in zip(BUCKETS, h):
+        cumulative += count
+        if cumulative >= target:
+            return bound
+    return h[-1]
+
+
+def summary():
+    """One line per histogram (count, mean, ~p95, max) plus the counters, for the log."""
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters, gauges = dict(_counters), dict(_gauges)
+    lines = []
+    for (name, labels), h in sorted(histograms.items()):
+        if h[-3]:
+            lines.append(f"{name}{_labels(labels)}: n={h[-3]} avg={h[-2] / h[-3] * 1000:.1f}ms "
+                         f"p95<={_quantile(h, 0.95) * 1000:.0f}ms max={h[-1] * 1000:.1f}ms")
+    lines += [f"{name}{_labels(labels)}: {value}" for (name, labels), value in sorted(counters.items())]
+    lines += [f"{name}{_labels(labels)}: {value}" for (name, labels), value in sorted(gauges.items())]
+    return "\n".join(lines)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _log_summaries(interval):
+    while True:
+        time.sleep(interval)
+        logging.info("📊 Metrics summary:\n" + summary())
+
+
+def start(port=METRICS_PORT, log_interval=METRICS_LOG_INTERVAL):
+    """Serves /metrics on localhost:`port` (0 = no endpoint) and logs a summary every `log_interval` seconds."""
+    if not enabled:
+        return None
+    server = None
+    if port:
+        server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logging.info(f"Metrics endpoint on http://127.0.0.1:{port}/metrics")
+    if log_interval:
+        threading.Thread(target=_log_summaries, args=(log_interval,), name="metrics-log", daemon=True).start()
+    return server
@@ -0,0 +1,231 @@
+# order_executor.py
+
+import time
+import asyncio
+import logging
+import threading
+from binance import AsyncClient
+from binance.exceptions import BinanceAPIException
+import metrics
+from binance_api import round_quantity, check_notional, tradeable_quantity, get_symbol_filters, \
+    symbol_filters_fresh, invalidate_symbol_filters, FILTER_ERROR_CODES
+from config import BINANCE_API_KEY, BINANCE_API_SECRET
+from strategy import entry_sides, closing_sides
+from state_store import unwind_client_id, remainder_client_id, merge_orders
+
+OPPOSITE_SIDE = {"BUY": "SELL", "SELL": "BUY"}
+
+
+def unfilled_quantity(leg, order):
+    """
+    What a leg (symbol, side, qty, price, ...) still has to trade after `order`, if enough to
+    place an order for. A MARKET order can fill only partly (status EXPIRED); a remainder too
+    small for the filters counts as filled.
+    """
+    symbol, _, quantity, price = leg[:4]
+    if order is None:
+        return quantity
+    ordered = float(order.get('origQty') or round_quantity(symbol, quantity))
+    return tradeable_quantity(symbol, price, ordered - float(order['executedQty']))
+
+
+class OrderExecutor:
+    """
+    Sends margin orders from a background asyncio loop over one pooled HTTP session,
+    so both legs of a pair go out at the same time instead of one after another.
+
+    The public methods are blocking and safe to call from the trading thread. Pass
+    `client` to run against anything with AsyncClient's margin methods (e.g. a mock).
+    """
+
+    def __init__(self, client=None):
+        assert client or BINANCE_API_KEY and BINANCE_API_SECRET, "BINANCE_API_KEY/BINANCE_API_SECRET is missing!"
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="order-executor", daemon=True)
+        self._thread.start()
+        self.client = client or metrics.instrument_async_client(
+            self._run(AsyncClient.create(BINANCE_API_KEY, BINANCE_API_SECRET)))
+
+    def _run(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def close(self):
+        if hasattr(self.client, 'close_connection'):
+            self._run(self.client.close_connection())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    # --- single exchange calls ---
+
+    async def _borrow(self, symbol, amount, isolated):
+        asset = symbol.replace("USDT", "")
+        formatted_amount = f"{amount:.8f}"
+        logging.info(f"Attempting to BORROW {formatted_amount} {asset}...")
+        try:
+            receipt = await self.client.create_margin_loan(asset=asset, amount=formatted_amount,
+                                                           isIsolated=isolated, symbol=symbol)
+            logging.info(f"SUCCESS -> Borrow successful. Transaction ID: {receipt.get('tranId')}")
+            return receipt
+        except BinanceAPIException as e:
+            logging.error(f"FAILED to BORROW {asset}. Code: {e.code}, Message: {e.message}")
+            return None
+
+    async def _repay(self, symbol, amount, isolated):
+        asset = symbol.replace("USDT", "")
+        formatted_amount = f"{amount:.8f}"
+        logging.info(f"Attempting to REPAY {formatted_amount} {asset}...")
+        try:
+            receipt = await self.client.repay_margin_loan(asset=asset, amount=formatted_amount,
+                                                          isIsolated=isolated, symbol=symbol)
+            logging.info(f"SUCCESS -> Repay successful. Transaction ID: {receipt.get('tranId')}")
+            return receipt
+        except BinanceAPIException as e:
+            logging.error(f"FAILED to REPAY {asset}. Code: {e.code}, Message: {e.message}")
+            return None
+
+    async def _order(self, symbol, side, quantity, price, isolated, client_order_id=None):
+        """Same checks as binance_api.place_order. Returns (order or None, monotonic time it completed)."""
+        try:
+            if not symbol_filters_fresh(symbol):
+                # Refetching filters is a blocking exchangeInfo download; keep it off the loop
+                # so it does not hold up the other leg.
+                await asyncio.to_thread(get_symbol_filters, symbol)
+            rounded_qty = round_quantity(symbol, quantity)
+            notional_value = price * rounded_qty
+            logging.info(f"ATTEMPTING TRADE -> {side} {rounded_qty} {symbol} (Value: ~${notional_value:.2f})")
+            if not check_notional(symbol, price, rounded_qty):
+                logging.error(f"Order REJECTED (local): Notional value ${notional_value:.2f} is below minimum.")
+                return None, time.monotonic()
+
+            params = {'newClientOrderId': client_order_id} if client_order_id else {}
+            order = await self.client.create_margin_order(symbol=symbol, side=side, type='MARKET',
+                                                          quantity=rounded_qty, isIsolated=isolated, **params)
+            logging.info(f"SUCCESS -> Placed {side} order for {rounded_qty} {symbol}")
+            return order, time.monotonic()
+        except BinanceAPIException as e:
+            logging.error(f"FAILED -> Binance API Error for {symbol}. Code: {e.code}, Message: {e.message}")
+            if e.code in FILTER_ERROR_CODES:
+                invalidate_symbol_filters(symbol)
+        except Exception as e:
+            logging.error(f"FAILED -> Unexpected Error for {symbol}: {e}");
+        return None, time.monotonic()
+
+    # --- two-leg operations ---
+
+    async def _leg(self, name, leg, on_step):
+        """
+        Sends one leg; if it fills only partly, sends the rest once more as
+        remainder_client_id() and reports both as one order. `on_step` gets the total fill.
+        """
+        res, done = await self._order(*leg)
+        if res and (missing := unfilled_quantity(leg, res)):
+            symbol, side, _, price, isolated, client_id = leg
+            logging.warning(f"{side} {symbol} filled {res['executedQty']} of {res.get('origQty')}. "
+                            f"Sending the remaining {missing}.")
+            rest, done = await self._order(symbol, side, missing, price, isolated,
+                                           client_id and remainder_client_id(client_id))
+            if rest:
+                res = merge_orders(res, rest)
+        if res and float(res['executedQty']) > 0 and on_step:
+            qty = float(res['executedQty'])
+            on_step(name, qty=qty, price=float(res['cummulativeQuoteQty']) / qty)
+        return res, done
+
+    async def _both_legs(self, key, leg1, leg2, on_step=None):
+        """
+        Sends both legs concurrently and logs how far apart their fills landed.
+        `on_step(name, **data)` is called with 'leg1'/'leg2' as soon as each leg fills.
+        """
+        sent = time.monotonic()
+        (res1, done1), (res2, done2) = await asyncio.gather(self._leg('leg1', leg1, on_step),
+                                                            self._leg('leg2', leg2, on_step))
+        latency = {'sent_at': sent, 'leg1_ms': (done1 - sent) * 1000, 'leg2_ms': (done2 - sent) * 1000,
+                   'between_legs_ms': abs(done2 - done1) * 1000}
+        metrics.observe('leg_fill_seconds', done1 - sent, leg='leg1')
+        metrics.observe('leg_fill_seconds', done2 - sent, leg='leg2')
+        metrics.observe('leg_gap_seconds', abs(done2 - done1))
+        if res1 and res2 and 'transactTime' in res1 and 'transactTime' in res2:
+            latency['exchange_gap_ms'] = abs(int(res2['transactTime']) - int(res1['transactTime']))
+        logging.info(f"⏱️ {key} legs: leg1 {latency['leg1_ms']:.0f} ms, leg2 {latency['leg2_ms']:.0f} ms, "
+                     f"gap {latency['between_legs_ms']:.0f} ms"
+                     + (f" (exchange {latency['exchange_gap_ms']} ms)" if 'exchange_gap_ms' in latency else ""))
+        return res1, res2, latency
+
+    async def _open_pair(self, sym1, sym2, direction, qty1, qty2, price1, price2, isolated, client_ids, on_step):
+        key = f"{sym1}/{sym2}"
+        # SELL SPREAD shorts leg 1, BUY SPREAD shorts leg 2; the short leg is borrowed first.
+        side1, side2 = entry_sides(direction)
+        borrow_sym, borrow_qty = (sym1, qty1) if direction == 'SELL SPREAD' else (sym2, qty2)
+
+        if not await self._borrow(borrow_sym, borrow_qty, isolated):
+            return None
+        if on_step:
+            on_step('borrowed', qty=borrow_qty)
+
+        res1, res2, latency = await self._both_legs(key, (sym1, side1, qty1, price1, isolated, client_ids[0]),
+                                                    (sym2, side2, qty2, price2, isolated, client_ids[1]), on_step)
+        legs = ((sym1, side1, qty1, price1), (sym2, side2, qty2, price2))
+        complete = [not unfilled_quantity(leg, res) for leg, res in zip(legs, (res1, res2))]
+        if all(complete):
+            return {'leg1': res1, 'leg2': res2, 'latency': latency}
+
+        # One or both legs failed: flatten whatever filled, then give the loan back. Each unwind
+        # has its own client id and step ('unwound1'/'unwound2'), so reconcile() never repeats one.
+        # A leg that filled only partly is unwound too: keeping it would leave the hedge unbalanced.
+        logging.error(f"Entry for {key} failed (leg1 {'ok' if complete[0] else 'failed'}, "
+                      f"leg2 {'ok' if complete[1] else 'failed'}). Rolling back.")
+        unwinds = {}
+        for n, res, (sym, side, _, price), cid in zip((1, 2), (res1, res2), legs, client_ids):
+            if res and float(res['executedQty']) > 0:
+                unwinds[n] = (sym, OPPOSITE_SIDE[side], float(res['executedQty']), price, isolated,
+                              cid and unwind_client_id(cid))
+        unwound = await asyncio.gather(*(self._leg(f"unwound{n}", leg, on_step) for n, leg in unwinds.items()))
+        if not all(order and not unfilled_quantity(leg, order) for leg, (order, _) in zip(unwinds.values(), unwound)):
+            logging.error(f"Rollback of {key} is incomplete. Keeping the loan until it is unwound.")
+            return None
+        if not await self._repay(borrow_sym, borrow_qty, isolated):
+            logging.error(f"Rollback of {key} unwound its legs but the loan could not be repaid.")
+            return None
+        if on_step:
+            on_step('repaid')
+            on_step('unwound')
+        return None
+
+    async def _close_pair(self, sym1, sym2, direction, qty1, qty2, price1, price2, isolated, client_ids, on_step):
+        key = f"{sym1}/{sym2}"
+        side1, side2 = closing_sides(direction)
+        res1, res2, latency = await self._both_legs(key, (sym1, side1, qty1, price1, isolated, client_ids[0]),
+                                                    (sym2, side2, qty2, price2, isolated, client_ids[1]), on_step)
+        # A leg that is still partly open counts as failed; reconcile() closes the rest.
+        legs = ((sym1, side1, qty1, price1), (sym2, side2, qty2, price2))
+        res1, res2 = (res if not unfilled_quantity(leg, res) else None for leg, res in zip(legs, (res1, res2)))
+        # Repay the borrowed leg with what was actually bought back, once all of it is.
+        borrow_sym, bought_back = (sym1, res1) if direction == 'SELL SPREAD' else (sym2, res2)
+        if bought_back and await self._repay(borrow_sym, float(bought_back['executedQty']), isolated) and on_step:
+            on_step('repaid')
+        return {'leg1': res1, 'leg2': res2, 'latency': latency}
+
+    def open_pair(self, sym1, sym2, direction, qty1, qty2, price1, price2, isolated=False,
+                  client_ids=(None, None), on_step=None):
+        """
+        Borrows the short leg, then sends both legs concurrently. Returns
+        {'leg1', 'leg2', 'latency'} once both legs filled completely; otherwise everything
+        that filled is unwound, the loan repaid, and None returned.
+
+        Legs are sent with `client_ids` as their client order ids, and `on_step(name, **data)`
+        is called after each step ('borrowed', 'leg1', 'leg2', and on a rollback 'unwound1',
+        'unwound2', 'repaid', 'unwound') for write-ahead records. 'unwound' means the entry was
+        fully undone, loan included; without it a failed entry still holds a loan or a leg.
+        """
+        return self._run(self._open_pair(sym1, sym2, direction, qty1, qty2, price1, price2, isolated,
+                                         client_ids, on_step))
+
+    def close_pair(self, sym1, sym2, direction, qty1, qty2, price1, price2, isolated=False,
+                   client_ids=(None, None), on_step=None):
+        """
+        Sends both closing legs concurrently and repays the loan. Legs that failed, or are
+        still partly open, are None. `client_ids` and `on_step` work as in open_pair(); the
+        steps are 'leg1', 'leg2', 'repaid'.
+        """
+        return self._run(self._close_pair(sym1, sym2, direction, qty1, qty2, price1, price2, isolated,
+                                          client_ids, on_step))
@@ -0,0 +1,156 @@
+# pair_config.py
+
+import os
+import csv
+import time
+import hashlib
+import logging
+from dataclasses import dataclass, fields, MISSING
+from config import PAIR_CONFIG_CSV, PAIR_CONFIG_SETTLE
+
+
+@dataclass(frozen=True)
+class PairConfig:
+    """
+    One row of live_pairs.csv, typed and validated. Supports `pair['window']` and
+    `pair.get('stop_loss')` so code written against the CSV's dict rows keeps working.
+    """
+    sym1: str
+    sym2: str
+    z_entry: float
+    z_exit: float
+    window: int
+    stop_loss: float = 0.05
+    take_profit: float = 0.05
+
+    @property
+    def key(self):
+        return f"{self.sym1}/{self.sym2}"
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    @classmethod
+    def from_row(cls, row):
+        """Builds a config from a CSV row (strings). Raises ValueError on anything unusable."""
+        values = {}
+        for f in fields(cls):
+            raw = (row.get(f.name) or '').strip()
+            if not raw:
+                if f.default is MISSING:
+                    raise ValueError(f"missing {f.name}")
+                continue
+            if f.type is str:
+                values[f.name] = raw.upper()
+            elif f.type is int:
+                if not float(raw).is_integer():
+                    raise ValueError(f"{f.name} must be a whole number, got {raw}")
+                values[f.name] = int(float(raw))
+            else:
+                values[f.name] = float(raw)
+        pair = cls(**values)
+        if pair.sym1 == pair.sym2:
+            raise ValueError("sym1 and sym2 are the same symbol")
+        if pair.window < 2:
+            raise ValueError(f"window must be at least 2, got {pair.window}")
+        if not 0 <= pair.z_exit < pair.z_entry:
+            raise ValueError(f"need 0 <= z_exit < z_entry, got z_exit={pair.z_exit}, z_entry={pair.z_entry}")
+        if pair.stop_loss <= 0 or pair.take_profit <= 0:
+            raise ValueError("stop_loss and take_profit must be positive")
+        return pair
+
+
+def load_pair_configs(path=PAIR_CONFIG_CSV):
+    """Parses a pair CSV into {key: PairConfig}, in file order. Invalid rows are logged and skipped."""
+    with open(path, newline='') as f:
+        return parse_pair_configs(f.read(), path)
+
+
+def parse_pair_configs(text, source=PAIR_CONFIG_CSV):
+    configs = {}
+    for line_no, row in enumerate(csv.DictReader(text.splitlines()), start=2):
+        try:
+            pair = PairConfig.from_row(row)
+        except (ValueError, TypeError) as e:
+            logging.error(f"{source} line {line_no}: invalid pair config ({e}). Skipping it.")
+            continue
+        if pair.key in configs:
+            logging.warning(f"{source} line {line_no}: duplicate pair {pair.key}. The later row wins.")
+        configs[pair.key] = pair
+    return configs
+
+
+class PairConfigSource:
+    """
+    live_pairs.csv, parsed once and re-read only when it changes.
+
+    reload() checks the file's mtime and size first and only hashes the contents when
+    they moved, so an unchanged file costs one stat() call. Once configs are loaded, an
+    edit is only read after the file has gone `settle` seconds without changing, so a
+    save in progress does not replace them half-written. A new config set replaces
+    `configs` in a single assignment, so readers always see one complete version.
+    """
+
+    def __init__(self, path=PAIR_CONFIG_CSV, settle=PAIR_CONFIG_SETTLE):
+        self.path = path
+        self.settle = settle
+        self.configs = {}
+        self._stat = None
+        self._digest = None
+
+    def reload(self):
+        """
+        Re-reads the file if it changed. Returns (added, removed, changed) lists of pair
+        keys when the config set changed, else None. A file that is still being written,
+        or that cannot be used, is tried again on the next call.
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if self._stat is not None or not self.configs:
+                logging.error(f"{self.path} not found.")
+            self._stat = None
+            return None
+        stat = (st.st_mtime_ns, st.st_size)
+        if stat == self._stat:
+            return None
+        if self.configs and time.time() - st.st_mtime < self.settle:
+            return None  # modified moments ago: possibly mid-save (the first load does not wait)
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        st = os.stat(self.path)
+        if (st.st_mtime_ns, st.st_size) != stat or len(data) != st.st_size:
+            return None  # changed while it was being read
+        digest = hashlib.sha1(data).hexdigest()
+        if digest == self._digest:
+            self._stat = stat
+            return None  # touched but not edited
+
+        try:
+            new = parse_pair_configs(data.decode('utf-8-sig'), self.path)
+        except (UnicodeDecodeError, csv.Error) as e:
+            logging.error(f"Could not parse {self.path} ({e}). Keeping the previous pair configs.")
+            return None
+        old = self.configs
+        if old and not new:
+            # Most likely a broken header; an empty universe is never intended.
+            logging.error(f"{self.path} has no valid pairs. Keeping the previous pair configs.")
+            return None
+        added = [k for k in new if k not in old]
+        removed = [k for k in old if k not in new]
+        changed = [k for k in new if k in old and new[k] != old[k]]
+        # Only a version that was actually loaded counts as seen.
+        self.configs, self._stat, self._digest = new, stat, digest
+        if old or new:
+            logging.info(f"Loaded {len(new)} pair configs from {self.path} "
+                         f"({len(added)} added, {len(removed)} removed, {len(changed)} changed).")
+        return added, removed, changed
+
+    def __iter__(self):
+        return iter(self.configs.values())
+
+    def __len__(self):
+        return len(self.configs)
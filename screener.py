@@ -0,0 +1,193 @@
+# screener.py
+
+import os
+import csv
+import time
+import logging
+import argparse
+import numpy as np
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from backtest import load_klines
+from sweep import CONFIG_COLUMNS
+from kline_store import KlineStore
+from config import KLINE_DATA_DIR
+
+# MacKinnon 5% critical value of the ADF t-statistic for a spread with a constant.
+ADF_CRITICAL_5PCT = -2.86
+CANDLE_MS = 60_000
+
+# Worker-side view of the shared log-price matrix, set by _attach().
+_shm = None
+_log_prices = None
+
+
+def local_symbols(data_dir=KLINE_DATA_DIR):
+    """USDT symbols that have klines in the local data directory, stored or as files."""
+    names = {os.path.splitext(f)[0] for f in os.listdir(data_dir) if f.endswith(('.csv', '.parquet'))}
+    names.update(KlineStore(data_dir).symbols())
+    return sorted(s for s in names if s.endswith("USDT"))
+
+
+def price_matrix(symbols, days, data_dir=KLINE_DATA_DIR, min_coverage=0.95):
+    """
+    Loads the last `days` of closes for every symbol onto one common minute grid.
+    Symbols with less than `min_coverage` of the grid are dropped; short gaps in the
+    rest are forward-filled. Returns (kept symbols, (n_symbols, n_minutes) array).
+    Raises ValueError when no symbol has data, or none has enough of it.
+    """
+    series = {s: load_klines(s, data_dir) for s in symbols}
+    if not any(len(times) for times, _ in series.values()):
+        raise ValueError(f"No klines for any of the {len(symbols)} symbols in {data_dir}.")
+    end = max(times[-1] for times, _ in series.values() if len(times))
+    start = end - days * 24 * 60 * CANDLE_MS
+    n = (end - start) // CANDLE_MS + 1
+
+    kept, rows = [], []
+    for sym, (times, closes) in series.items():
+        inside = times >= start
+        if inside.sum() < min_coverage * n:
+            continue
+        row = np.full(n, np.nan)
+        row[(times[inside] - start) // CANDLE_MS] = closes[inside]
+        # Forward-fill gaps: carry the index of the last seen value forward.
+        idx = np.where(np.isnan(row), 0, np.arange(n))
+        np.maximum.accumulate(idx, out=idx)
+        row = row[idx]
+        kept.append(sym)
+        rows.append(row)
+
+    if not rows:
+        raise ValueError(f"None of the {len(symbols)} symbols has klines for {min_coverage:.0%} of the last "
+                         f"{days} days. Sync more history or lower --days.")
+    matrix = np.array(rows)
+    first_complete = int(np.argmax(~np.isnan(matrix).any(axis=0)))
+    return kept, matrix[:, first_complete:]
+
+
+def correlated_pairs(log_prices, min_corr, max_candidates):
+    """
+    Correlation of 1-minute log returns for every symbol pair in one matrix product,
+    pruned to the `max_candidates` most correlated pairs above `min_corr`.
+    Returns [(i, j, corr), ...] with i < j.
+    """
+    returns = np.diff(log_prices, axis=1)
+    returns -= returns.mean(axis=1, keepdims=True)
+    returns /= returns.std(axis=1, keepdims=True) + 1e-18
+    corr = returns @ returns.T / returns.shape[1]
+
+    i, j = np.triu_indices(len(corr), k=1)
+    values = corr[i, j]
+    keep = np.flatnonzero(values >= min_corr)
+    keep = keep[np.argsort(-values[keep])][:max_candidates]
+    return [(int(i[k]), int(j[k]), float(values[k])) for k in keep]
+
+
+def spread_tests(spread):
+    """
+    Engle-Granger style checks on a log-ratio spread: the ADF t-statistic of
+    Δs_t = a + b·s_{t-1} and the mean-reversion half-life -ln(2)/ln(1+b) in minutes.
+    """
+    x = spread[:-1] - spread[:-1].mean()
+    dy = np.diff(spread)
+    b = (x @ (dy - dy.mean())) / (x @ x)
+    residuals = dy - dy.mean() - b * x
+    se = np.sqrt((residuals @ residuals) / (len(x) - 2) / (x @ x))
+    half_life = -np.log(2) / np.log1p(b) if -1 < b < 0 else np.inf
+    return b / se, half_life
+
+
+def _attach(shm_name, shape):
+    global _shm, _log_prices
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    _log_prices = np.ndarray(shape, dtype=np.float64, buffer=_shm.buf)
+
+
+def _test_chunk(candidates):
+    results = []
+    for i, j, corr in candidates:
+        adf_t, half_life = spread_tests(_log_prices[i] - _log_prices[j])
+        results.append((i, j, corr, float(adf_t), float(half_life)))
+    return results
+
+
+def screen(symbols, days=30, data_dir=KLINE_DATA_DIR, min_corr=0.8, max_candidates=5000,
+           min_half_life=5, max_half_life=500, workers=None):
+    """
+    Ranks candidate pairs: correlation over the whole universe first (cheap, vectorized),
+    then ADF and half-life tests on the survivors across a process pool.
+    Returns dicts sorted from most to least stationary spread.
+    """
+    start = time.perf_counter()
+    symbols, prices = price_matrix(symbols, days, data_dir)
+    log_prices = np.log(prices)
+    logging.info(f"Loaded {len(symbols)} symbols x {prices.shape[1]:,} minutes.")
+
+    candidates = correlated_pairs(log_prices, min_corr, max_candidates)
+    total = len(symbols) * (len(symbols) - 1) // 2
+    logging.info(f"{len(candidates):,} of {total:,} pairs pass correlation >= {min_corr}.")
+
+    shm = shared_memory.SharedMemory(create=True, size=max(log_prices.nbytes, 1))
+    try:
+        np.ndarray(log_prices.shape, dtype=np.float64, buffer=shm.buf)[:] = log_prices
+        chunks = [candidates[k:k + 200] for k in range(0, len(candidates), 200)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=(shm.name, log_prices.shape)) as pool:
+            tested = [r for chunk in pool.map(_test_chunk, chunks) for r in chunk]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    ranked = [{'sym1': symbols[i], 'sym2': symbols[j], 'corr': corr, 'adf_t': adf_t, 'half_life': half_life}
+              for i, j, corr, adf_t, half_life in tested
+              if adf_t < ADF_CRITICAL_5PCT and min_half_life <= half_life <= max_half_life]
+    ranked.sort(key=lambda r: r['adf_t'])
+    logging.info(f"{len(ranked)} pairs have a stationary spread. Screen took {time.perf_counter() - start:.1f}s.")
+    return ranked
+
+
+def suggested_window(half_life, multiple=3, lowest=20, highest=1000):
+    """Z-score lookback sized to a few half-lives of the spread."""
+    return int(min(max(round(multiple * half_life), lowest), highest))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Find cointegrated pairs and write a live_pairs.csv.")
+    parser.add_argument("--data", default=KLINE_DATA_DIR, help="kline store, or directory with <SYMBOL>.csv/.parquet klines")
+    parser.add_argument("--margin-only", action="store_true",
+                        help="restrict to symbols Binance currently lists as USDT cross-margin tradable")
+    parser.add_argument("--days", type=int, default=30, help="history to test, in days")
+    parser.add_argument("--min-corr", type=float, default=0.8)
+    parser.add_argument("--max-candidates", type=int, default=5000, help="pairs kept after correlation pruning")
+    parser.add_argument("--top", type=int, default=20, help="pairs to write out")
+    parser.add_argument("--z-entry", type=float, default=2.5)
+    parser.add_argument("--z-exit", type=float, default=0.5)
+    parser.add_argument("--stop-loss", type=float, default=0.05)
+    parser.add_argument("--take-profit", type=float, default=0.1)
+    parser.add_argument("--workers", type=int, default=None, help="processes to use (default: all cores)")
+    parser.add_argument("--out", default="screened_pairs.csv", help="output in live_pairs.csv format")
+    args = parser.parse_args()
+
+    universe = local_symbols(args.data)
+    if args.margin_only:
+        from binance_api import get_margin_usdt_symbols
+        universe = sorted(set(universe) & set(get_margin_usdt_symbols()))
+
+    try:
+        ranked = screen(universe, args.days, args.data, args.min_corr, args.max_candidates, workers=args.workers)
+    except ValueError as e:
+        logging.error(f"Nothing to screen: {e}")
+        raise SystemExit(1)
+    chosen = ranked[:args.top]
+    for r in chosen:
+        logging.info(f"{r['sym1']}/{r['sym2']}: corr {r['corr']:.3f}, ADF t {r['adf_t']:.2f}, "
+                     f"half-life {r['half_life']:.0f} min")
+
+    with open(args.out, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CONFIG_COLUMNS)
+        for r in chosen:
+            writer.writerow([r['sym1'], r['sym2'], args.z_entry, args.z_exit, suggested_window(r['half_life']),
+                             args.stop_loss, args.take_profit])
+    logging.info(f"Wrote {len(chosen)} pairs to {args.out}.")
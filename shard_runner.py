@@ -0,0 +1,336 @@
+# shard_runner.py
+
+import os
+import csv
+import sys
+import json
+import time
+import signal
+import logging
+import argparse
+import threading
+import subprocess
+from dataclasses import dataclass
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import metrics
+from binance_api import get_pair_price, update_quote
+from market_stream import MarketStream
+from market_board import MarketBoard
+from pair_config import PairConfigSource
+from strategy import entry_sides
+from telegram_notify import send_telegram_message, get_updates
+from config import SHARD_CONFIG_CSV, SHARD_DIR, SHARD_RELAY_PORT, SHARD_RESTART_DELAY, EXPOSURE_LOG_INTERVAL, \
+    METRICS_PORT, UPDATE_INTERVAL, TELEGRAM_TOKEN, TELEGRAM_CHAT_ID
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "trading_bot.py")
+# Seconds between re-reading the shards' pair configs and checking on the workers.
+CHECK_INTERVAL = 5
+# Seconds a worker gets to shut down after SIGTERM before it is killed.
+STOP_TIMEOUT = 30
+
+
+@dataclass(frozen=True)
+class Shard:
+    """
+    One row of shards.csv: a pair universe traded on one account by its own worker
+    process. The account's keys are read from the named environment variables (.env).
+    """
+    name: str
+    pair_config: str
+    api_key_env: str = "BINANCE_API_KEY"
+    api_secret_env: str = "BINANCE_API_SECRET"
+
+    @property
+    def directory(self):
+        return os.path.join(SHARD_DIR, self.name)
+
+    @property
+    def state_file(self):
+        return os.path.join(self.directory, "open_positions.json")
+
+    def environment(self, board_name, relay_url, metrics_port):
+        """The worker's environment: config.py picks up its own files, keys and market feed from it."""
+        env = dict(os.environ)
+        env.update({
+            'SHARD_NAME': self.name,
+            'PAIR_CONFIG_CSV': os.path.abspath(self.pair_config),
+            'STATE_FILE': os.path.abspath(self.state_file),
+            'JOURNAL_FILE': os.path.abspath(os.path.join(self.directory, "trade_journal.db")),
+            'BINANCE_API_KEY': os.environ[self.api_key_env],
+            'BINANCE_API_SECRET': os.environ[self.api_secret_env],
+            'MARKET_FEED': board_name,
+            # Workers "send Telegram messages" to the supervisor's relay; the bot token slot carries the shard name.
+            'TELEGRAM_API_URL': relay_url,
+            'TELEGRAM_TOKEN': self.name,
+            'TELEGRAM_CHAT_ID': TELEGRAM_CHAT_ID or "0",
+            'METRICS_PORT': str(metrics_port),
+        })
+        return env
+
+
+def load_shards(path=SHARD_CONFIG_CSV):
+    """Parses shards.csv (name, pair_config[, api_key_env, api_secret_env]). Raises ValueError if it is unusable."""
+    shards = []
+    with open(path, newline='') as f:
+        for line_no, row in enumerate(csv.DictReader(f), start=2):
+            values = {k: v.strip() for k, v in row.items() if k and v and v.strip()}
+            try:
+                shard = Shard(**values)
+            except TypeError as e:
+                raise ValueError(f"{path} line {line_no}: {e}")
+            if any(s.name == shard.name for s in shards):
+                raise ValueError(f"{path} line {line_no}: duplicate shard name {shard.name}")
+            for var in (shard.api_key_env, shard.api_secret_env):
+                if not os.environ.get(var):
+                    raise ValueError(f"{path} line {line_no}: environment variable {var} is not set")
+            shards.append(shard)
+    if not shards:
+        raise ValueError(f"{path} defines no shards")
+    return shards
+
+
+def read_positions(shard):
+    """A shard's open positions from its state file (written atomically, so safe to read while it runs)."""
+    try:
+        with open(shard.state_file) as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return data.get('positions', {}) if 'positions' in data else data
+
+
+def exposure(positions_by_shard):
+    """
+    Aggregates open positions across shards: ({asset: net quantity}, {asset: net USDT},
+    {shard: gross USDT}). Short legs count negative; values use the latest snapshot prices.
+    """
+    net_qty, net_usdt, gross = {}, {}, {}
+    for name, positions in positions_by_shard.items():
+        gross[name] = 0.0
+        for pos in positions.values():
+            for sym, side, qty in zip((pos['sym1'], pos['sym2']), entry_sides(pos['direction']),
+                                      (float(pos['qty1']), float(pos['qty2']))):
+                asset = sym.replace("USDT", "")
+                signed = qty if side == "BUY" else -qty
+                price = get_pair_price(sym) or 0.0
+                net_qty[asset] = net_qty.get(asset, 0.0) + signed
+                net_usdt[asset] = net_usdt.get(asset, 0.0) + signed * price
+                gross[name] += qty * price
+    return net_qty, net_usdt, gross
+
+
+class _RelayHandler(BaseHTTPRequestHandler):
+    """Answers the workers' Telegram API calls: sendMessage is forwarded through the supervisor's notifier."""
+
+    def do_POST(self):
+        parts = urlsplit(self.path).path.strip('/').split('/')
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if len(parts) != 2 or not parts[0].startswith('bot') or parts[1] != 'sendMessage':
+            self._reply(404, {'ok': False, 'description': 'Not Found'})
+            return
+        text = json.loads(body or b'{}').get('text', '')
+        send_telegram_message(f"`[{parts[0][3:]}]` {text}")
+        self._reply(200, {'ok': True, 'result': {}})
+
+    def do_GET(self):
+        # getUpdates: commands are handled by the supervisor, never by a worker.
+        self._reply(200, {'ok': True, 'result': []})
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ShardSupervisor:
+    """
+    Runs one trading_bot worker process per shard on this host.
+
+    The supervisor owns the only market data connection: its MarketStream keeps the
+    shared KlineStore synced for the union of every shard's symbols and publishes
+    prices and candle closes on a MarketBoard in shared memory, which the workers read
+    (config.MARKET_FEED). Workers' Telegram messages come back through a local relay
+    and go out through one rate-limited notifier; exposure is aggregated from the
+    shards' state files. Crashed workers are restarted after SHARD_RESTART_DELAY.
+    """
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.sources = {s.name: PairConfigSource(s.pair_config) for s in shards}
+        self.workers = {}
+        self.restart_at = {}
+        self.stop_event = threading.Event()
+        self.board = None
+        self.market = None
+        self.relay = None
+
+    # --- market data ---
+
+    def _on_quote(self, symbol, **prices):
+        self.board.publish(symbol, **prices)
+        update_quote(symbol, **prices)
+
+    def _windows(self):
+        """Longest window each symbol needs across all shards, plus the legs of their open positions."""
+        windows = {}
+        for shard in self.shards:
+            source = self.sources[shard.name]
+            source.reload()
+            for p in source:
+                for sym in (p.sym1, p.sym2):
+                    windows[sym] = max(windows.get(sym, 0), p.window)
+        for shard in self.shards:
+            for pos in read_positions(shard).values():
+                for sym in (pos['sym1'], pos['sym2']):
+                    windows.setdefault(sym, max(windows.values(), default=1))
+        return windows
+
+    def _publish_closed(self, symbols):
+        for symbol in symbols:
+            last = self.market.store.last_open_time(symbol)
+            if last is not None:
+                self.board.publish(symbol, closed=last)
+
+    # --- workers ---
+
+    def _launch(self, n, shard):
+        os.makedirs(shard.directory, exist_ok=True)
+        relay_url = f"http://127.0.0.1:{self.relay.server_address[1]}"
+        metrics_port = METRICS_PORT + 1 + n if METRICS_PORT else 0
+        with open(os.path.join(shard.directory, "bot.log"), 'a') as log:
+            # A new session keeps Ctrl-C away from the workers; the supervisor stops them with SIGTERM.
+            self.workers[shard.name] = subprocess.Popen(
+                [sys.executable, BOT_SCRIPT], env=shard.environment(self.board.name, relay_url, metrics_port),
+                stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+        self.restart_at.pop(shard.name, None)
+        metrics.set_gauge('shard_up', 1, shard=shard.name)
+        logging.info(f"Started shard {shard.name} (pid {self.workers[shard.name].pid}).")
+
+    def _check_workers(self):
+        for n, shard in enumerate(self.shards):
+            proc = self.workers.get(shard.name)
+            if proc is not None and proc.poll() is not None:
+                del self.workers[shard.name]
+                self.restart_at[shard.name] = time.monotonic() + SHARD_RESTART_DELAY
+                metrics.set_gauge('shard_up', 0, shard=shard.name)
+                metrics.inc('shard_restarts_total', shard=shard.name)
+                logging.error(f"Shard {shard.name} exited with code {proc.returncode}. "
+                              f"Restarting it in {SHARD_RESTART_DELAY}s.")
+                send_telegram_message(f"🚨 Shard `{shard.name}` exited (code {proc.returncode}). "
+                                      f"Restarting it in {SHARD_RESTART_DELAY}s.")
+            elif proc is None and time.monotonic() >= self.restart_at.get(shard.name, 0):
+                self._launch(n, shard)
+
+    # --- reporting ---
+
+    def exposure_report(self):
+        positions = {s.name: read_positions(s) for s in self.shards}
+        net_qty, net_usdt, gross = exposure(positions)
+        for asset, value in net_usdt.items():
+            metrics.set_gauge('net_exposure_usdt', round(value, 4), asset=asset)
+        for name, value in gross.items():
+            metrics.set_gauge('shard_gross_exposure_usdt', round(value, 4), shard=name)
+            metrics.set_gauge('shard_open_positions', len(positions[name]), shard=name)
+        lines = [f"`{name}`: {len(positions[name])} positions, {gross[name]:.2f} USDT gross"
+                 + ("" if name in self.workers else " (down)") for name in gross]
+        lines += [f"{asset}: {net_qty[asset]:+.4f} ({value:+.2f} USDT)"
+                  for asset, value in sorted(net_usdt.items(), key=lambda kv: -abs(kv[1])) if abs(net_qty[asset]) > 1e-12]
+        return "📊 *Exposure*\n\n" + "\n".join(lines)
+
+    def handle_telegram_commands(self):
+        """/status replies with the aggregated exposure; /abort stops every shard."""
+        try:
+            authorized_chat_id = int(TELEGRAM_CHAT_ID) if TELEGRAM_TOKEN else None
+        except (ValueError, TypeError):
+            authorized_chat_id = None
+        if authorized_chat_id is None:
+            logging.error("TELEGRAM_CHAT_ID is not set or invalid in config.py. Command handler will not start.")
+            return
+        updates = get_updates(offset=-1, timeout=1)
+        offset = updates[-1]['update_id'] + 1 if updates else None
+        while not self.stop_event.is_set():
+            for update in get_updates(offset=offset, timeout=5):
+                offset = update['update_id'] + 1
+                message = update.get('message') or {}
+                if message.get('chat', {}).get('id') != authorized_chat_id:
+                    continue
+                text = (message.get('text') or '').strip()
+                if text == '/status':
+                    send_telegram_message(self.exposure_report())
+                elif text == '/abort':
+                    send_telegram_message("🛑 Abort command received. Stopping all shards...")
+                    self.stop_event.set()
+
+    # --- lifecycle ---
+
+    def start(self):
+        self.board = MarketBoard()
+        self.market = MarketStream(self._windows(), on_quote=self._on_quote)
+        self.market.start()
+        self._publish_closed(self.market.symbols)
+        self.board.set_connected(False)
+        self.relay = ThreadingHTTPServer(('127.0.0.1', SHARD_RELAY_PORT), _RelayHandler)
+        threading.Thread(target=self.relay.serve_forever, name="telegram-relay", daemon=True).start()
+        metrics.start()
+        threading.Thread(target=self.handle_telegram_commands, name="shard-commands", daemon=True).start()
+        for n, shard in enumerate(self.shards):
+            self._launch(n, shard)
+        send_telegram_message(f"🚀 *Shard supervisor started* ({len(self.shards)} shards, "
+                              f"{len(self.market.symbols)} symbols).")
+
+    def run(self):
+        self.start()
+        next_check = next_report = time.monotonic() + CHECK_INTERVAL
+        try:
+            while not self.stop_event.is_set():
+                closed, _ = self.market.wait_for_update(timeout=UPDATE_INTERVAL)
+                self._publish_closed(closed)
+                self.board.set_connected(self.market.connected.is_set())
+                now = time.monotonic()
+                if now >= next_check:
+                    self.market.set_windows(self._windows())
+                    self._check_workers()
+                    next_check = now + CHECK_INTERVAL
+                if EXPOSURE_LOG_INTERVAL and now >= next_report:
+                    logging.info(self.exposure_report())
+                    next_report = now + EXPOSURE_LOG_INTERVAL
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        logging.info("Stopping all shards...")
+        for proc in self.workers.values():
+            proc.terminate()
+        for name, proc in self.workers.items():
+            try:
+                proc.wait(STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                logging.error(f"Shard {name} did not stop within {STOP_TIMEOUT}s. Killing it.")
+                proc.kill()
+        self.workers.clear()
+        self.market.stop()
+        self.relay.shutdown()
+        self.board.close()
+        send_telegram_message("😴 *All shards have been shut down.*")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logging.getLogger("binance").setLevel(logging.WARNING)
+    parser = argparse.ArgumentParser(description="Run one trading bot process per shard with shared market data.")
+    parser.add_argument("--shards", default=SHARD_CONFIG_CSV, help="shard definitions CSV")
+    args = parser.parse_args()
+
+    supervisor = ShardSupervisor(load_shards(args.shards))
+    signal.signal(signal.SIGTERM, lambda *_: supervisor.stop_event.set())
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        pass
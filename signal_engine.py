@@ -0,0 +1,150 @@
+# signal_engine.py
+
+import numpy as np
+from market_stream import CANDLE_MS
+from spread_stats import RollingZScore
+from strategy import is_entry, entry_direction, is_zscore_exit
+
+
+class SignalEngine:
+    """
+    Evaluates every configured pair in one vectorized pass.
+
+    Closed-candle closes of all symbols are held in a single (n_symbols, depth)
+    matrix used as a ring buffer (minute m in column m % depth), so a symbol
+    shared by several pairs is stored once and a new minute moves no data. Each pair keeps a RollingZScore of its spread,
+    fed once per minute both legs have closed, so a new candle costs O(1) per pair
+    whatever its window.
+    """
+
+    def __init__(self, pair_configs):
+        self.pair_configs = pair_configs
+        self.keys = [f"{p['sym1']}/{p['sym2']}" for p in pair_configs]
+        self._pair_index = {key: i for i, key in enumerate(self.keys)}
+        self.symbols = sorted({p[k] for p in pair_configs for k in ('sym1', 'sym2')})
+        self._row = {sym: i for i, sym in enumerate(self.symbols)}
+
+        self.sym1 = np.array([self._row[p['sym1']] for p in pair_configs], dtype=np.intp)
+        self.sym2 = np.array([self._row[p['sym2']] for p in pair_configs], dtype=np.intp)
+        self.windows = np.array([int(p['window']) for p in pair_configs], dtype=np.int64)
+        self.z_entry = np.array([float(p['z_entry']) for p in pair_configs])
+        self.z_exit = np.array([float(p['z_exit']) for p in pair_configs])
+
+        self.depth = int(self.windows.max()) if len(self.windows) else 1
+        self.closes = np.full((len(self.symbols), self.depth), np.nan)
+        self.last_time = None
+        self._synced = {}
+        self._stats = [RollingZScore(w) for w in self.windows]
+        self._pairs_of = {}  # symbol -> indices of the pairs it is a leg of
+        for i, p in enumerate(pair_configs):
+            for sym in {p['sym1'], p['sym2']}:
+                self._pairs_of.setdefault(sym, []).append(i)
+        self._zscores = None
+
+    def sync(self, market):
+        """Copies the candles closed since the last sync from the market stream into the matrix."""
+        updates = {sym: market.get_candles(sym, self.depth, since=self._synced.get(sym)) for sym in self.symbols}
+        newest = max((c[-1][0] for c in updates.values() if c), default=None)
+        if newest is None:
+            return False
+
+        if self.last_time is None:
+            self.last_time = newest
+        elif newest > self.last_time:
+            # Columns are reused in turn; only those the new minutes take over are cleared.
+            last = self.last_time // CANDLE_MS
+            shift = int((newest - self.last_time) // CANDLE_MS)
+            self.closes[:, np.arange(last + 1, last + 1 + min(shift, self.depth)) % self.depth] = np.nan
+            self.last_time = newest
+
+        oldest = self.last_time // CANDLE_MS - self.depth + 1
+        for sym, candles in updates.items():
+            if not candles:
+                continue
+            if len(candles) == 1:
+                # The usual case, one new candle: scalar writes skip building arrays for it.
+                (t, close), = candles
+                if t // CANDLE_MS >= oldest:
+                    self.closes[self._row[sym], t // CANDLE_MS % self.depth] = close
+                self._synced[sym] = t
+                continue
+            minutes = np.fromiter((t for t, _ in candles), dtype=np.int64, count=len(candles)) // CANDLE_MS
+            keep = minutes >= oldest
+            self.closes[self._row[sym], minutes[keep] % self.depth] = np.fromiter(
+                (c for _, c in candles), dtype=float, count=len(candles))[keep]
+            self._synced[sym] = candles[-1][0]
+        for i in sorted({i for sym, candles in updates.items() if candles for i in self._pairs_of[sym]}):
+            self._advance(i)
+        self._zscores = None
+        return True
+
+    def _advance(self, i):
+        """Feeds pair i's spread stats the minutes both legs have closed since they were last fed."""
+        s1, s2 = self.sym1[i], self.sym2[i]
+        t1, t2 = self._synced.get(self.symbols[s1]), self._synced.get(self.symbols[s2])
+        stats = self._stats[i]
+        if t1 is None or t2 is None or (stats.last_time is not None and min(t1, t2) <= stats.last_time):
+            return
+        frontier = min(t1, t2)
+        last = frontier // CANDLE_MS
+        new = (frontier - stats.last_time) // CANDLE_MS if stats.last_time is not None else stats.window
+        if new == 1:
+            # The usual case, one candle closed since: skip building an array for it.
+            col = last % self.depth
+            value = float(self.closes[s1, col]) / float(self.closes[s2, col])
+            if value == value:
+                stats.update(value, frontier)
+                return
+        first = max(last - min(new, stats.window) + 1, self.last_time // CANDLE_MS - self.depth + 1)
+        # Further behind than a window, never fed or behind the matrix: start over from the matrix.
+        restart = new >= stats.window or first > last - new + 1
+        cols = np.arange(first, last + 1) % self.depth
+        with np.errstate(invalid='ignore'):
+            spread = self.closes[s1, cols] / self.closes[s2, cols]
+        gaps = np.flatnonzero(np.isnan(spread))
+        if len(gaps):
+            # A leg missed a minute: the window has to fill again from the one after it.
+            restart, spread = True, spread[gaps[-1] + 1:]
+        if restart:
+            stats.fill(spread, frontier)
+        else:
+            for value in spread:
+                stats.update(value)
+            stats.last_time = frontier
+
+    def zscores(self):
+        """
+        Spread z-score of every pair (RollingZScore: sample std, 0 when the window is flat).
+        NaN when a leg is missing a candle inside the pair's window.
+        """
+        if self._zscores is None:
+            z = np.full(len(self._stats), np.nan)
+            for i, stats in enumerate(self._stats):
+                if stats.ready and stats.last_time == self.last_time:
+                    z[i] = stats.zscore()
+            self._zscores = z
+        return self._zscores
+
+    def evaluate(self, positions):
+        """
+        Scores the whole universe in one call.
+
+        `positions` maps the key of each open position to its direction. Returns a dict with
+        `zscores` (key -> z for every pair with a full window), `entries` (key, z, direction)
+        for pairs past their z_entry, strongest first, and `exits`, the open keys whose
+        z-score crossed back through z_exit.
+        """
+        z = self.zscores()
+        valid = ~np.isnan(z)
+        zscores = {self.keys[i]: float(z[i]) for i in np.flatnonzero(valid)}
+
+        candidates = np.flatnonzero(valid & is_entry(z, self.z_entry))
+        excess = np.abs(z[candidates]) - self.z_entry[candidates]
+        entries = [(self.keys[i], float(z[i]), entry_direction(z[i])) for i in candidates[np.argsort(-excess)]]
+
+        exits = set()
+        for key, direction in positions.items():
+            i = self._pair_index.get(key)
+            if i is not None and valid[i] and is_zscore_exit(direction, z[i], self.z_exit[i]):
+                exits.add(key)
+        return {'zscores': zscores, 'entries': entries, 'exits': exits}
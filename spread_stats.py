@@ -0,0 +1,172 @@
+# spread_stats.py
+
+import math
+import numpy as np
+
+
+class RollingZScore:
+    """
+    Z-score of the last `window` spread values, updated in O(1) per new value.
+
+    Values live in a fixed-size ring buffer; the mean and the sum of squared
+    deviations (M2) are maintained with Welford's sliding-window update. Every
+    `window` updates they are recomputed exactly from the buffer so rounding
+    errors cannot accumulate (amortised O(1)).
+
+    The result matches the previous pandas implementation: sample standard
+    deviation (ddof=1) and a z-score of 0 when the deviation is 0 or undefined.
+    """
+
+    def __init__(self, window):
+        self.window = int(window)
+        self.last_time = None  # open time of the last candle fed in, if provided
+        self._buf = [0.0] * self.window
+        self._pos = 0
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._since_rebuild = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def ready(self):
+        return self._count == self.window
+
+    @property
+    def last(self):
+        return self._buf[self._pos - 1] if self._count else None
+
+    def update(self, value, open_time=None):
+        value = float(value)
+        if self._count < self.window:
+            self._count += 1
+            delta = value - self._mean
+            self._mean += delta / self._count
+            self._m2 += delta * (value - self._mean)
+        else:
+            old = self._buf[self._pos]
+            delta = value - old
+            new_mean = self._mean + delta / self.window
+            self._m2 += delta * (value - new_mean + old - self._mean)
+            self._mean = new_mean
+
+        self._buf[self._pos] = value
+        self._pos = (self._pos + 1) % self.window
+        if open_time is not None:
+            self.last_time = open_time
+
+        self._since_rebuild += 1
+        if self._since_rebuild >= self.window:
+            self._rebuild()
+
+    def fill(self, values, open_time=None):
+        """Starts over from `values`, oldest first; only the last `window` of them are kept."""
+        values = [float(v) for v in values][-self.window:]
+        self._buf = values + [0.0] * (self.window - len(values))
+        self._count = len(values)
+        self._pos = self._count % self.window
+        self._rebuild()
+        self.last_time = open_time
+
+    def _rebuild(self):
+        values = self.values()
+        self._mean = math.fsum(values) / len(values) if values else 0.0
+        self._m2 = math.fsum((v - self._mean) ** 2 for v in values)
+        self._since_rebuild = 0
+
+    def values(self):
+        """Buffered values, oldest first."""
+        if self._count < self.window:
+            return self._buf[:self._count]
+        return self._buf[self._pos:] + self._buf[:self._pos]
+
+    @property
+    def mean(self):
+        return self._mean
+
+    def std(self):
+        if self._count < 2:
+            return float('nan')
+        return math.sqrt(max(self._m2, 0.0) / (self._count - 1))
+
+    def zscore(self):
+        std = self.std()
+        # A window that is flat up to rounding counts as flat.
+        if std <= 1e-9 * abs(self._mean) or math.isnan(std): return 0
+        return (self.last - self._mean) / std
+
+
+def rolling_zscore(values, window, block=8192):
+    """
+    Vectorized equivalent of feeding `values` through RollingZScore one by one:
+    element i is the z-score of values[i] against values[i - window + 1:i + 1],
+    NaN while the first window fills.
+
+    Windowed sums come from cumulative sums computed per block of `block` outputs,
+    each re-centred on its own mean, so a long series never accumulates enough
+    rounding error to matter.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    z = np.full(n, np.nan)
+    if window < 2:
+        return z
+    for start in range(window - 1, n, block):
+        stop = min(start + block, n)
+        chunk = values[start - window + 1:stop]
+        centre = chunk.mean()
+        d = chunk - centre
+        c1 = np.concatenate(([0.0], np.cumsum(d)))
+        c2 = np.concatenate(([0.0], np.cumsum(d * d)))
+        s1, s2 = c1[window:] - c1[:-window], c2[window:] - c2[:-window]
+        mean = s1 / window
+        std = np.sqrt(np.maximum(s2 - s1 * mean, 0.0) / (window - 1))
+        # Treat a window that is flat up to rounding as flat, like RollingZScore does.
+        flat = std <= 1e-9 * np.abs(mean + centre)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z[start:stop] = np.where(flat, 0.0, (d[window - 1:] - mean) / std)
+    return z
+
+
+if __name__ == "__main__":
+    # Microbenchmark: per-tick cost of the incremental z-score vs. rebuilding a pandas Series.
+    import random
+    import time
+    import pandas as pd
+
+    def pandas_zscore(values):
+        series = pd.Series(values)
+        std = series.std()
+        if std == 0 or pd.isna(std): return 0
+        return (series.iloc[-1] - series.mean()) / std
+
+    random.seed(7)
+    for window in (50, 500, 5000):
+        spread = [1.0]
+        for _ in range(window + 2000):
+            spread.append(spread[-1] * (1 + random.gauss(0, 0.001)))
+
+        stats = RollingZScore(window)
+        max_diff = 0.0
+        for i, value in enumerate(spread):
+            stats.update(value)
+            if stats.ready and i % 97 == 0:
+                max_diff = max(max_diff, abs(stats.zscore() - pandas_zscore(spread[i - window + 1:i + 1])))
+
+        ticks = spread[window:]
+        start = time.perf_counter()
+        for value in ticks:
+            stats.update(value)
+            stats.zscore()
+        incremental_us = (time.perf_counter() - start) / len(ticks) * 1e6
+
+        sample = range(window, window + 200)
+        start = time.perf_counter()
+        for i in sample:
+            pandas_zscore(spread[i - window + 1:i + 1])
+        pandas_us = (time.perf_counter() - start) / len(sample) * 1e6
+
+        print(f"window={window:>5}: incremental {incremental_us:7.2f} us/tick | "
+              f"pandas {pandas_us:9.2f} us/tick | max |dz| {max_diff:.2e}")
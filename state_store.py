@@ -0,0 +1,360 @@
+# state_store.py
+
+import os
+import json
+import uuid
+import logging
+import threading
+import metrics
+from strategy import position_pnl
+from config import STATE_FILE
+
+OPPOSITE_SIDE = {"BUY": "SELL", "SELL": "BUY"}
+
+
+def atomic_write_json(path, data):
+    """Writes `data` to a temp file, fsyncs it and renames it over `path`: readers see the old or the new file, never half of one."""
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(directory, os.O_DIRECTORY)
+        try:
+            os.fsync(fd)  # make the rename itself durable
+        finally:
+            os.close(fd)
+
+
+def unwind_client_id(client_id):
+    """Client order id of the order that unwinds the leg sent as `client_id` (Binance allows 36 characters)."""
+    return f"{client_id}u"
+
+
+def remainder_client_id(client_id):
+    """Client order id of the order that sends what the order sent as `client_id` left unfilled."""
+    return f"{client_id}r"
+
+
+def merge_orders(first, rest):
+    """Combines an order and the order sent for its unfilled remainder into one response."""
+    executed = float(first['executedQty']) + float(rest['executedQty'])
+    quote = float(first['cummulativeQuoteQty']) + float(rest['cummulativeQuoteQty'])
+    return {**first, 'executedQty': f"{executed:.8f}", 'cummulativeQuoteQty': f"{quote:.8f}",
+            'status': rest.get('status', first.get('status')),
+            'fills': (first.get('fills') or []) + (rest.get('fills') or [])}
+
+
+def borrowed_leg(direction):
+    """Index (1 or 2) of the leg that is shorted with borrowed coins."""
+    return 1 if direction == 'SELL SPREAD' else 2
+
+
+class StateStore:
+    """
+    Durable open-position state.
+
+    `positions` holds the open positions. `pending` holds write-ahead records for
+    entries and exits in progress: each is written before the first exchange call
+    and updated after every step (loan taken, leg filled, loan repaid), so after a
+    crash reconcile() knows exactly what reached the exchange. Every change is
+    written with atomic_write_json().
+    """
+
+    def __init__(self, path=STATE_FILE):
+        self.path = path
+        self.positions = {}
+        self.pending = {}
+        self._lock = threading.RLock()
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            logging.info("No state file found, starting fresh.")
+            return
+        except json.JSONDecodeError as e:
+            # Never overwrite state we could not read; reconcile() reports the loans it leaves behind.
+            corrupt_path = f"{self.path}.corrupt"
+            os.replace(self.path, corrupt_path)
+            logging.error(f"State file is unreadable ({e}). Moved it to {corrupt_path}.")
+            return
+        if 'positions' not in data:
+            data = {'positions': data, 'pending': {}}  # plain {key: position} files from older versions
+        with self._lock:
+            self.positions.clear()
+            self.positions.update(data['positions'])
+            self.pending.clear()
+            self.pending.update(data.get('pending', {}))
+        logging.info(f"Loaded {len(self.positions)} positions and {len(self.pending)} unfinished operations "
+                     f"from state.")
+
+    def save(self):
+        with self._lock, metrics.timer('state_save_seconds'):
+            atomic_write_json(self.path, {'positions': self.positions, 'pending': self.pending})
+
+    # --- write-ahead records ---
+
+    def begin(self, key, kind, **intent):
+        """
+        Records an entry or exit (`kind`) before anything is sent. Generates the client
+        order ids both legs are sent with, so they can be looked up after a crash; a leg's
+        unwind is sent as unwind_client_id() of it.
+        """
+        op_id = uuid.uuid4().hex[:24]
+        record = {'kind': kind, 'client_ids': [f"pt{op_id}-1", f"pt{op_id}-2"], 'steps': {}, **intent}
+        with self._lock:
+            self.pending[key] = record
+            self.save()
+        return record
+
+    def step(self, key, name, **data):
+        with self._lock:
+            if key in self.pending:
+                self.pending[key]['steps'][name] = data
+                self.save()
+
+    def finish(self, key):
+        """Drops the write-ahead record of an operation that fully completed or was fully undone."""
+        with self._lock:
+            if self.pending.pop(key, None) is not None:
+                self.save()
+
+    def commit_entry(self, key, position):
+        with self._lock:
+            self.pending.pop(key, None)
+            self.positions[key] = position
+            self.save()
+
+    def commit_exit(self, key):
+        with self._lock:
+            self.pending.pop(key, None)
+            self.positions.pop(key, None)
+            self.save()
+
+
+def _exchange_fill(symbol, client_id, isolated):
+    """
+    Total fill of a leg on the exchange: the order sent as `client_id` plus its remainder
+    orders (remainder_client_id() of it, and so on). Returns (fill or None, first unused id).
+    """
+    from binance_api import get_margin_order
+
+    qty = quote = 0.0
+    while (order := get_margin_order(symbol, client_id, isolated)) is not None:
+        qty += float(order['executedQty'])
+        quote += float(order['cummulativeQuoteQty'])
+        client_id = remainder_client_id(client_id)
+    return ({'qty': qty, 'price': quote / qty} if qty > 0 else None), client_id
+
+
+def _filled(symbol, client_id, step, isolated):
+    """{'qty', 'price'} of a leg from its recorded step, or else from the exchange. None if nothing filled."""
+    return step or _exchange_fill(symbol, client_id, isolated)[0]
+
+
+def _unfilled(symbol, qty, price, fill):
+    """How much of an intended `qty` is still to trade after `fill`, if enough to place an order for."""
+    from binance_api import tradeable_quantity
+
+    return tradeable_quantity(symbol, float(price), float(qty) - (fill['qty'] if fill else 0.0))
+
+
+def _finish_leg(symbol, side, qty, price, client_id, isolated):
+    """
+    Makes sure `qty` of a leg sent as `client_id` is traded: looks up what its orders
+    filled and sends what is missing as the next remainder order. Returns the total fill.
+    """
+    from binance_api import place_order
+
+    fill, next_id = _exchange_fill(symbol, client_id, isolated)
+    if missing := _unfilled(symbol, qty, price, fill):
+        order = place_order(symbol, side, missing, isolated, price=price, client_order_id=next_id)
+        if order and float(order['executedQty']) > 0:
+            executed, quote = float(order['executedQty']), float(order['cummulativeQuoteQty'])
+            filled = fill['qty'] if fill else 0.0
+            fill = {'qty': filled + executed,
+                    'price': ((fill['price'] * filled if fill else 0.0) + quote) / (filled + executed)}
+    return fill
+
+
+def _leg_order(symbol, client_id, isolated):
+    """
+    Every order sent for a leg as `client_id` (the order and its remainder orders) as one
+    order response, with the trades the exchange reports for them as its fills. None if
+    no order reached the exchange.
+    """
+    from binance_api import get_margin_order, get_margin_trades
+
+    merged = None
+    while (order := get_margin_order(symbol, client_id, isolated)) is not None:
+        fills = [{'price': t['price'], 'qty': t['qty'], 'commission': t['commission'],
+                  'commissionAsset': t['commissionAsset'], 'tradeId': t['id']}
+                 for t in get_margin_trades(symbol, order['orderId'], isolated)]
+        order = {**order, 'fills': fills}
+        merged = order if merged is None else merge_orders(merged, order)
+        client_id = remainder_client_id(client_id)
+    return merged
+
+
+def _trade(r, action, fills, isolated, pnl=None):
+    """
+    The trade journal row of a committed entry/exit record, as TradeJournal.record()
+    keyword arguments: both legs' sides, filled quantities and average prices, with the
+    order ids and fees looked up on the exchange.
+    """
+    try:
+        result = {f"leg{n}": _leg_order(r[f"sym{n}"], cid, isolated) for n, cid in enumerate(r['client_ids'], 1)}
+    except Exception as e:
+        logging.warning(f"Could not look up the orders of {r['sym1']}/{r['sym2']} for the journal: {e}")
+        result = None
+    return {'sym1': r['sym1'], 'sym2': r['sym2'], 'action': action, 'side1': r['side1'], 'side2': r['side2'],
+            'price1': fills[0]['price'], 'price2': fills[1]['price'], 'qty1': fills[0]['qty'],
+            'qty2': fills[1]['qty'], 'pnl': pnl, 'result': result}
+
+
+def _expected_loans(store):
+    expected = {}
+    for pos in store.positions.values():
+        sym, qty = (pos['sym1'], pos['qty1']) if borrowed_leg(pos['direction']) == 1 else (pos['sym2'], pos['qty2'])
+        asset = sym.replace("USDT", "")
+        expected[asset] = expected.get(asset, 0.0) + float(qty)
+    return expected
+
+
+def _reconcile_entry(store, key, r, loans, isolated):
+    from binance_api import repay_asset
+
+    steps = r['steps']
+    fills = [_filled(sym, cid, steps.get(f"leg{n}"), isolated)
+             for n, sym, cid in ((1, r['sym1'], r['client_ids'][0]), (2, r['sym2'], r['client_ids'][1]))]
+    # Records from older versions do not have the intended quantities; any fill then counts as complete.
+    complete = [fill and ('qty1' not in r or not _unfilled(r[f"sym{n}"], r[f"qty{n}"], r[f"price{n}"], fill))
+                for n, fill in enumerate(fills, start=1)]
+    if all(complete):
+        store.commit_entry(key, {'sym1': r['sym1'], 'sym2': r['sym2'], 'qty1': fills[0]['qty'],
+                                 'price1': fills[0]['price'], 'qty2': fills[1]['qty'], 'price2': fills[1]['price'],
+                                 'direction': r['direction'], 'stop_loss': r['stop_loss'],
+                                 'take_profit': r['take_profit']})
+        return f"Resumed entry {key}: both legs had filled.", _trade(r, "OPEN", fills, isolated)
+
+    # Half an entry (or one with a partly filled leg) is an unbalanced position: flatten what
+    # filled, then give the loan back.
+    # An unwind sent before the crash is found by its client id, so it is never sent twice.
+    for n, (fill, sym, side, cid) in enumerate(zip(fills, (r['sym1'], r['sym2']), (r['side1'], r['side2']),
+                                                   r['client_ids']), start=1):
+        unwound = steps.get(f"unwound{n}")  # {} from versions that did not record the quantity
+        if fill and (unwound is None or unwound and _unfilled(sym, fill['qty'], fill['price'], unwound)):
+            unwind = _finish_leg(sym, OPPOSITE_SIDE[side], fill['qty'], fill['price'], unwind_client_id(cid),
+                                 isolated)
+            if _unfilled(sym, fill['qty'], fill['price'], unwind):
+                return f"⚠️ Could not unwind leg {n} of {key}. Unwind it manually.", None
+            store.step(key, f"unwound{n}", **unwind)
+    borrow_sym, borrow_qty = r['borrow_sym'], float(r['borrow_qty'])
+    asset = borrow_sym.replace("USDT", "")
+    unexplained = loans.get(asset, 0.0) - _expected_loans(store).get(asset, 0.0)
+    if 'repaid' not in steps and ('borrowed' in steps or unexplained >= 0.5 * borrow_qty):
+        if not repay_asset(borrow_sym, borrow_qty, isolated):
+            return f"⚠️ Unwound {key} but could not repay {borrow_qty} {asset}. Repay it manually.", None
+        store.step(key, 'repaid')
+    store.finish(key)
+    return f"Unwound unfinished entry {key}.", None
+
+
+def _reconcile_exit(store, key, r, loans, isolated):
+    from binance_api import repay_asset
+
+    steps = r['steps']
+    fills = {}
+    for n, sym, side, qty, price, cid in ((1, r['sym1'], r['side1'], r['qty1'], r['price1'], r['client_ids'][0]),
+                                          (2, r['sym2'], r['side2'], r['qty2'], r['price2'], r['client_ids'][1])):
+        # Finish the exit: the bot had already decided to close.
+        fill = _filled(sym, cid, steps.get(f"leg{n}"), isolated)
+        if _unfilled(sym, qty, price, fill):
+            fill = _finish_leg(sym, side, float(qty), float(price), cid, isolated)
+        if fill and steps.get(f"leg{n}") != fill:
+            store.step(key, f"leg{n}", **fill)
+        if _unfilled(sym, qty, price, fill):
+            return f"⚠️ Could not finish closing leg {n} of {key}. It stays open; check it manually.", None
+        fills[n] = fill
+    n = borrowed_leg(r['direction'])
+    sym, qty = r[f"sym{n}"], float(r[f"qty{n}"])
+    asset = sym.replace("USDT", "")
+    # This position's loan is still counted in the expected loans; anything beyond the others' is ours.
+    own_loan = loans.get(asset, 0.0) - (_expected_loans(store).get(asset, 0.0) - qty)
+    if 'repaid' not in steps and own_loan >= 0.5 * qty:
+        amount = fills[n]['qty'] if fills[n] else qty
+        if not repay_asset(sym, amount, isolated):
+            return (f"⚠️ Closed {key} but could not repay {amount} {asset}. It is retried; or repay it manually.",
+                    None)
+        store.step(key, 'repaid')
+    trade = None
+    if 'journaled' not in steps and fills[1] and fills[2]:  # the bot journals the exits it closed itself
+        pos = store.positions.get(key)
+        pnl = position_pnl(r['direction'], float(pos['price1']), float(pos['price2']), float(pos['qty1']),
+                           float(pos['qty2']), fills[1]['price'], fills[2]['price'])[0] if pos else None
+        trade = _trade(r, f"CLOSE: {r.get('reason', 'Reconciled')}", [fills[1], fills[2]], isolated, pnl)
+    store.commit_exit(key)
+    return f"Finished unfinished exit {key}.", trade
+
+
+def reconcile_pending(store, key, isolated=False, loans=None):
+    """
+    Settles one unfinished entry/exit against the exchange (see reconcile()). Also used
+    while running, to retry an operation that failed part-way. Returns (finding, trade):
+    `trade` is the journal row (TradeJournal.record() keyword arguments) of an entry
+    resumed or an exit finished here, else None. (None, None) if `key` has no record.
+    """
+    from binance_api import get_margin_loans
+
+    r = store.pending.get(key)
+    if r is None:
+        return None, None
+    try:
+        if loans is None:
+            loans = get_margin_loans(isolated)
+        if r['kind'] == 'entry':
+            return _reconcile_entry(store, key, r, loans, isolated)
+        return _reconcile_exit(store, key, r, loans, isolated)
+    except Exception as e:
+        return f"⚠️ Could not reconcile {key}: {e}", None
+
+
+def reconcile(store, isolated=False):
+    """
+    Settles every unfinished entry/exit left by a crash against what the exchange
+    actually did, then checks the open positions against the outstanding margin loans.
+    Entries with both legs completely filled are resumed, half (or partly filled) entries
+    are unwound and their loan repaid; interrupted exits are completed. Returns
+    (human-readable findings, journal rows of the entries resumed and exits finished).
+    """
+    # Imported here so the store itself can be used without an API client.
+    from binance_api import get_margin_loans
+
+    findings, trades = [], []
+    loans = get_margin_loans(isolated)
+    for key in list(store.pending):
+        finding, trade = reconcile_pending(store, key, isolated, loans)
+        findings.append(finding)
+        if trade:
+            trades.append(trade)
+        loans = get_margin_loans(isolated)
+
+    expected = _expected_loans(store)
+    for asset, qty in expected.items():
+        if loans.get(asset, 0.0) < 0.5 * qty:
+            findings.append(f"⚠️ Open positions expect {qty} {asset} borrowed, the exchange has "
+                            f"{loans.get(asset, 0.0)}. Was a position closed manually?")
+    for asset, qty in loans.items():
+        if asset not in expected and asset != "USDT":
+            findings.append(f"⚠️ {qty} {asset} is borrowed but no open position uses it.")
+    for finding in findings:
+        if finding.startswith("⚠️"):
+            logging.warning(finding)
+        else:
+            logging.info(finding)
+    return findings, trades
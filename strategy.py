@@ -0,0 +1,45 @@
+# strategy.py
+
+# Entry and exit rules shared by the live bot and the backtester. The comparison
+# helpers work on plain floats as well as element-wise on NumPy arrays.
+
+
+def is_entry(z, z_entry):
+    return abs(z) > z_entry
+
+
+def entry_direction(z):
+    return 'SELL SPREAD' if z > 0 else 'BUY SPREAD'
+
+
+def is_zscore_exit(direction, z, z_exit):
+    return ((direction == 'SELL SPREAD') & (z < z_exit)) | ((direction == 'BUY SPREAD') & (z > -z_exit))
+
+
+def position_pnl(direction, entry_p1, entry_p2, qty1, qty2, price1, price2):
+    """Mark-to-market PnL of a pair position in USDT and as a fraction of the entry value."""
+    pnl1 = (price1 - entry_p1) * qty1 if direction == 'BUY SPREAD' else (entry_p1 - price1) * qty1
+    pnl2 = (entry_p2 - price2) * qty2 if direction == 'BUY SPREAD' else (price2 - entry_p2) * qty2
+    current_pnl = pnl1 + pnl2
+    entry_value = (entry_p1 * qty1) + (entry_p2 * qty2)
+    pnl_pct = current_pnl / entry_value if entry_value != 0 else 0
+    return current_pnl, pnl_pct
+
+
+def exit_reason(zscore_exit, z, pnl_pct, stop_loss, take_profit):
+    """The reason to close a position, in priority order, or None to keep it open."""
+    if zscore_exit:
+        return f"Z-Score Exit ({z:.2f})"
+    if pnl_pct <= -stop_loss:
+        return f"Stop Loss ({-stop_loss:.2%})"
+    if pnl_pct >= take_profit:
+        return f"Take Profit ({take_profit:.2%})"
+    return None
+
+
+def entry_sides(direction):
+    return ("SELL", "BUY") if direction == "SELL SPREAD" else ("BUY", "SELL")
+
+
+def closing_sides(direction):
+    return ("BUY", "SELL") if direction == "SELL SPREAD" else ("SELL", "BUY")
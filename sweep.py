@@ -0,0 +1,174 @@
+# sweep.py
+
+import os
+import csv
+import time
+import logging
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from backtest import load_klines, align, simulate_pair
+from spread_stats import rolling_zscore
+from pair_config import PairConfig
+from config import PAIR_CONFIG_CSV, KLINE_DATA_DIR
+
+CONFIG_COLUMNS = ['sym1', 'sym2', 'z_entry', 'z_exit', 'window', 'stop_loss', 'take_profit']
+
+# Worker-side views into the shared price block, set by _attach().
+_shm = None
+_series = {}
+
+
+def _share_prices(aligned):
+    """
+    Copies every pair's aligned (times, p1, p2) into one shared-memory block so workers
+    can map them instead of receiving a pickled copy per job. Returns (block, layout).
+    """
+    total = sum(len(times) for times, _, _ in aligned)
+    shm = shared_memory.SharedMemory(create=True, size=max(total * 3 * 8, 1))
+    layout, offset = [], 0
+    for times, p1, p2 in aligned:
+        n = len(times)
+        for column, values in enumerate((times, p1, p2)):
+            view = np.ndarray(n, dtype=values.dtype, buffer=shm.buf, offset=(column * total + offset) * 8)
+            view[:] = values
+        layout.append((offset, n))
+        offset += n
+    return shm, (total, layout)
+
+
+def _attach(shm_name, shape):
+    global _shm
+    total, layout = shape
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    for index, (offset, n) in enumerate(layout):
+        _series[index] = tuple(
+            np.ndarray(n, dtype=dtype, buffer=_shm.buf, offset=(column * total + offset) * 8)
+            for column, dtype in enumerate((np.int64, np.float64, np.float64)))
+
+
+def _run_job(pair_index, pair, window, combos):
+    """Backtests every (z_entry, z_exit, stop_loss, take_profit) combination for one pair and window."""
+    times, p1, p2 = _series[pair_index]
+    z = rolling_zscore(p1 / p2, window)
+    results = []
+    for z_entry, z_exit, stop_loss, take_profit in combos:
+        params = {'sym1': pair['sym1'], 'sym2': pair['sym2'], 'z_entry': z_entry, 'z_exit': z_exit,
+                  'window': window, 'stop_loss': stop_loss, 'take_profit': take_profit}
+        _, pnls = simulate_pair(params, times, p1, p2, z=z, with_log=False)
+        results.append({**params, 'trades': len(pnls), 'net_pnl': float(sum(pnls)),
+                        'win_rate': sum(1 for p in pnls if p > 0) / len(pnls) if pnls else 0.0})
+    return results
+
+
+def _grid_jobs(pairs, grid):
+    """
+    Splits the grid into (pair index, pair, window, combos) jobs, keeping only the
+    combinations the live bot would accept from live_pairs.csv (PairConfig.from_row).
+    """
+    combos = list(itertools.product(grid['z_entry'], grid['z_exit'], grid['stop_loss'], grid['take_profit']))
+    jobs, rejected = [], 0
+    for i, pair in enumerate(pairs):
+        for window in grid['window']:
+            valid = []
+            for z_entry, z_exit, stop_loss, take_profit in combos:
+                row = {'sym1': pair['sym1'], 'sym2': pair['sym2'], 'z_entry': z_entry, 'z_exit': z_exit,
+                       'window': window, 'stop_loss': stop_loss, 'take_profit': take_profit}
+                try:
+                    PairConfig.from_row({k: str(v) for k, v in row.items()})
+                except ValueError:
+                    rejected += 1
+                    continue
+                valid.append((z_entry, z_exit, stop_loss, take_profit))
+            if valid:
+                jobs.append((i, pair, int(window), valid))
+    if rejected:
+        logging.warning(f"Skipping {rejected:,} grid combinations that are not valid pair configs "
+                        f"(see PairConfig.from_row).")
+    return jobs
+
+
+def run_sweep(pair_configs, grid, data_dir=KLINE_DATA_DIR, workers=None, min_trades=5):
+    """
+    Runs the full grid for every pair on a process pool. Jobs are split per (pair, window)
+    so each worker computes a z-score series once and reuses it for all other parameters.
+    Returns (all results, best config per pair).
+    """
+    cache, pairs, aligned = {}, [], []
+    for pair in pair_configs:
+        try:
+            for sym in (pair['sym1'], pair['sym2']):
+                if sym not in cache:
+                    cache[sym] = load_klines(sym, data_dir)
+        except FileNotFoundError as e:
+            logging.error(f"Skipping {pair['sym1']}/{pair['sym2']}: {e}")
+            continue
+        pairs.append(pair)
+        aligned.append(align(*cache[pair['sym1']], *cache[pair['sym2']]))
+
+    jobs = _grid_jobs(pairs, grid)
+    logging.info(f"Sweeping {sum(len(combos) for *_, combos in jobs):,} combinations over {len(pairs)} pairs "
+                 f"on {workers or os.cpu_count()} workers...")
+
+    shm, shape = _share_prices(aligned)
+    results = []
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(shm.name, shape)) as pool:
+            futures = [pool.submit(_run_job, i, pair, window, combos) for i, pair, window, combos in jobs]
+            for future in as_completed(futures):
+                results.extend(future.result())
+    finally:
+        shm.close()
+        shm.unlink()
+    elapsed = time.perf_counter() - start
+    logging.info(f"Finished {len(results):,} backtests in {elapsed:.1f}s ({len(results) / max(elapsed, 1e-9):,.0f}/s).")
+
+    best = {}
+    for r in results:
+        key = (r['sym1'], r['sym2'])
+        if r['trades'] >= min_trades and (key not in best or r['net_pnl'] > best[key]['net_pnl']):
+            best[key] = r
+    for pair in pairs:
+        if (pair['sym1'], pair['sym2']) not in best:
+            logging.warning(f"No configuration for {pair['sym1']}/{pair['sym2']} made {min_trades}+ trades.")
+    return results, list(best.values())
+
+
+def _floats(text):
+    return [float(v) for v in text.split(',')]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Grid-search pair parameters with the backtester.")
+    parser.add_argument("--pairs", default=PAIR_CONFIG_CSV, help="pairs to tune (live_pairs.csv format)")
+    parser.add_argument("--data", default=KLINE_DATA_DIR, help="kline store, or directory with <SYMBOL>.csv/.parquet klines")
+    parser.add_argument("--z-entry", type=_floats, default=[2.0, 2.5, 3.0, 4.0, 5.0])
+    parser.add_argument("--z-exit", type=_floats, default=[0.0, 0.25, 0.5, 1.0])
+    parser.add_argument("--window", type=_floats, default=[30, 50, 75, 100, 150])
+    parser.add_argument("--stop-loss", type=_floats, default=[0.02, 0.05, 0.1])
+    parser.add_argument("--take-profit", type=_floats, default=[0.02, 0.05, 0.1])
+    parser.add_argument("--min-trades", type=int, default=5, help="ignore configs with fewer closed trades")
+    parser.add_argument("--workers", type=int, default=None, help="processes to use (default: all cores)")
+    parser.add_argument("--out", default="swept_pairs.csv", help="best config per pair, live_pairs.csv format")
+    parser.add_argument("--results", default=None, help="optional CSV with every combination's result")
+    args = parser.parse_args()
+
+    grid = {'z_entry': args.z_entry, 'z_exit': args.z_exit, 'window': args.window,
+            'stop_loss': args.stop_loss, 'take_profit': args.take_profit}
+    results, best = run_sweep(pd.read_csv(args.pairs).to_dict(orient='records'), grid, args.data,
+                              args.workers, args.min_trades)
+    if args.results:
+        pd.DataFrame(results).sort_values('net_pnl', ascending=False).to_csv(args.results, index=False)
+    with open(args.out, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CONFIG_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(best)
+    for r in best:
+        logging.info(f"{r['sym1']}/{r['sym2']}: z_entry={r['z_entry']} z_exit={r['z_exit']} window={r['window']} "
+                     f"sl={r['stop_loss']} tp={r['take_profit']} -> {r['trades']} trades, {r['net_pnl']:+.4f} USDT")
+    logging.info(f"Wrote {len(best)} pair configs to {args.out}.")
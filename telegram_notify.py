@@ -1,43 +1,189 @@
 # telegram_notify.py
 
-import requests
+import time
+import queue
+import atexit
 import logging
-from config import TELEGRAM_TOKEN, TELEGRAM_CHAT_ID
+import threading
+from collections import Counter
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
+from config import TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, TELEGRAM_API_URL, TELEGRAM_MIN_INTERVAL, \
+    TELEGRAM_COALESCE_WINDOW, TELEGRAM_TIMEOUT, TELEGRAM_MAX_RETRIES
+
+# Telegram rejects messages longer than this.
+MAX_MESSAGE_LENGTH = 4096
+
+_updates_session = requests.Session()
 
-def get_updates(offset=None):
-    """Gets updates from the Telegram bot."""
+
+def get_updates(offset=None, timeout=100):
+    """Gets updates from the Telegram bot, long-polling for up to `timeout` seconds."""
     if not TELEGRAM_TOKEN:
         logging.warning("Telegram token is not set. Cannot get updates.")
         return []
 
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/getUpdates"
-    params = {'timeout': 100, 'offset': offset}
+    url = f"{TELEGRAM_API_URL}/bot{TELEGRAM_TOKEN}/getUpdates"
+    params = {'timeout': timeout, 'offset': offset}
     try:
-        response = requests.get(url, params=params)
+        response = _updates_session.get(url, params=params, timeout=(TELEGRAM_TIMEOUT, timeout + TELEGRAM_TIMEOUT))
         response.raise_for_status()
         return response.json().get('result', [])
     except requests.exceptions.RequestException as e:
         logging.error(f"Failed to get Telegram updates: {e}")
         return []
 
+
+def digest(messages):
+    """
+    Folds a burst of messages into as few as possible: identical messages are sent once
+    with a repeat count, and the rest are joined up to Telegram's length limit.
+    """
+    counts = Counter(messages)
+    parts = [m if counts[m] == 1 else f"{m}\n_(×{counts[m]})_" for m in dict.fromkeys(messages)]
+    chunks, current = [], ""
+    for part in parts:
+        part = part[:MAX_MESSAGE_LENGTH]
+        if current and len(current) + 2 + len(part) > MAX_MESSAGE_LENGTH:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{part}" if current else part
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class TelegramNotifier:
+    """
+    Sends Telegram messages from a background thread so callers never wait on the API.
+
+    Messages queued within `coalesce_window` seconds of each other go out as one digest.
+    Sends are spaced at least `min_interval` seconds apart, use one pooled session with
+    timeouts, and are retried with backoff (honouring Telegram's `retry_after` on 429).
+    Point `base_url` at a local HTTP server to test without Telegram.
+    """
+
+    def __init__(self, token=TELEGRAM_TOKEN, chat_id=TELEGRAM_CHAT_ID, base_url=TELEGRAM_API_URL,
+                 min_interval=TELEGRAM_MIN_INTERVAL, coalesce_window=TELEGRAM_COALESCE_WINDOW,
+                 timeout=TELEGRAM_TIMEOUT, max_retries=TELEGRAM_MAX_RETRIES):
+        self.url = f"{base_url}/bot{token}/sendMessage"
+        self.chat_id = chat_id
+        self.min_interval = min_interval
+        self.coalesce_window = coalesce_window
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=1))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=1))
+        self._queue = queue.Queue()
+        self._last_sent = 0.0
+        self._thread = threading.Thread(target=self._worker, name="telegram-notifier", daemon=True)
+        self._thread.start()
+
+    def send(self, message):
+        """Queues a message and returns immediately."""
+        self._queue.put(message)
+
+    def flush(self):
+        """Blocks until everything queued so far has been sent (or given up on)."""
+        self._queue.join()
+
+    def close(self, timeout=10):
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self.session.close()
+
+    def _worker(self):
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            try:
+                deadline = time.monotonic() + self.coalesce_window
+                while batch[-1] is not None and (remaining := deadline - time.monotonic()) > 0:
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                self._send_batch(batch)
+            finally:
+                stop = None in batch
+                for _ in batch:
+                    self._queue.task_done()
+        self._drain()
+
+    def _drain(self):
+        # Anything queued after close() was requested is still worth delivering.
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+                self._queue.task_done()
+            except queue.Empty:
+                break
+        self._send_batch(leftover)
+
+    def _send_batch(self, batch):
+        """Sends a batch as a digest. Never raises: one bad batch must not stop every later alert."""
+        messages = [m for m in batch if m is not None]
+        try:
+            metrics.inc('telegram_messages_total', len(messages))
+            for text in digest(messages):
+                self._post(text)
+        except Exception as e:
+            metrics.inc('telegram_errors_total')
+            logging.error(f"Dropped {len(messages)} Telegram message(s) after an unexpected error: {e}", exc_info=True)
+
+    def _post(self, text):
+        payload = {'chat_id': self.chat_id, 'text': text, 'parse_mode': 'Markdown'}
+        for attempt in range(self.max_retries + 1):
+            wait = self._last_sent + self.min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_sent = time.monotonic()
+            try:
+                with metrics.timer('telegram_send_seconds'):
+                    response = self.session.post(self.url, json=payload, timeout=self.timeout)
+                metrics.inc('telegram_requests_total', status=response.status_code)
+                if response.status_code == 429:
+                    retry_after = response.json().get('parameters', {}).get('retry_after', 2 ** attempt)
+                    logging.warning(f"Telegram rate limit hit. Retrying in {retry_after}s.")
+                    time.sleep(retry_after)
+                    continue
+                if response.status_code == 400 and 'parse_mode' in payload:
+                    # Usually Markdown that does not parse (e.g. an unbalanced "_" in a digest).
+                    payload.pop('parse_mode')
+                    continue
+                response.raise_for_status()
+                return True
+            except requests.exceptions.RequestException as e:
+                metrics.inc('telegram_errors_total')
+                logging.error(f"Failed to send Telegram message (attempt {attempt + 1}): {e}")
+                time.sleep(min(2 ** attempt, 30))
+        logging.error("Giving up on a Telegram message after retries.")
+        return False
+
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+def get_notifier():
+    """The process-wide notifier, started on first use."""
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            _notifier = TelegramNotifier()
+            atexit.register(_notifier.close)
+        return _notifier
+
+
 def send_telegram_message(message):
-    """Sends a message to the configured Telegram chat."""
+    """Queues a message to the configured Telegram chat. Never blocks on the network."""
     if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
         logging.warning("Telegram token or chat ID is not set. Skipping message.")
         return
-
-    url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-    payload = {
-        'chat_id': TELEGRAM_CHAT_ID,
-        'text': message,
-        'parse_mode': 'Markdown'
-    }
-    try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        logging.info("Successfully sent Telegram message.")
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Failed to send Telegram message: {e}")
+    get_notifier().send(message)
 
 
 def format_trade_message(pair, side1, side2, qty1, qty2, price1, price2, reason, pnl=None):
@@ -55,4 +201,4 @@ def format_trade_message(pair, side1, side2, qty1, qty2, price1, price2, reason,
     if pnl is not None:
         pnl_str = f"+${pnl:.4f}" if pnl >= 0 else f"-${abs(pnl):.4f}"
         msg += f"\n*PnL*: `{pnl_str}`"
-    return msg
\ No newline at end of file
+    return msg
@@ -0,0 +1,27 @@
+# tests/conftest.py
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_exchange import FakeExchange
+
+# One exchange for the whole run: binance_api points its client at BINANCE_API_URL when it is
+# first imported, so the URL has to be set before any test imports the bot's modules.
+PRICES = {'AAAUSDT': 10.0, 'BBBUSDT': 2.0, 'CCCUSDT': 50.0}
+EXCHANGE = FakeExchange(PRICES)
+os.environ.update(BINANCE_API_URL=EXCHANGE.start(), BINANCE_API_KEY="test", BINANCE_API_SECRET="test")
+
+
+@pytest.fixture
+def exchange():
+    """The fake exchange, reset to its starting prices with no candles, balances or orders."""
+    EXCHANGE.prices = dict(PRICES)
+    EXCHANGE.klines = {s: [] for s in PRICES}
+    EXCHANGE.balances.clear()
+    EXCHANGE.orders.clear()
+    EXCHANGE.fills.clear()
+    EXCHANGE.partial_fill_rate = EXCHANGE.reject_rate = EXCHANGE.rate_limit_rate = 0.0
+    yield EXCHANGE
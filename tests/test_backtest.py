@@ -0,0 +1,66 @@
+# tests/test_backtest.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from backtest import LOG_COLUMNS, PairReplay, simulate_pair, replay_portfolio
+
+MINUTE = 60_000
+NAN = np.nan
+
+# Bars 3 and 7 cross z_entry = 2; each z-score exit (|z| back under 0.5) follows two bars later.
+Z = np.array([NAN, NAN, 0.5, 2.5, 1.0, 0.2, 0.0, -2.4, -1.0, -0.3])
+TIMES = np.arange(10, dtype=np.int64) * MINUTE
+P2 = np.full(10, 5.0)
+
+
+def pair(sym1='AAA', sym2='BBB', stop_loss=0.5, take_profit=0.5):
+    return {'sym1': sym1, 'sym2': sym2, 'window': 3, 'z_entry': 2.0, 'z_exit': 0.5,
+            'stop_loss': stop_loss, 'take_profit': take_profit}
+
+
+def simulate(p1, **params):
+    return simulate_pair(pair(**params), TIMES, np.array(p1), P2, z=Z, fee_rate=0.001, borrow_rate_hourly=0.01,
+                         capital=100.0)
+
+
+def test_simulate_pair_follows_a_hand_computed_sequence():
+    rows, pnls = simulate([10, 10, 10, 10, 11, 9, 9, 8, 8, 10])
+    log = pd.DataFrame(rows, columns=LOG_COLUMNS)
+    assert list(log['action']) == ['OPEN', 'CLOSE: Z-Score Exit (0.20)', 'OPEN', 'CLOSE: Z-Score Exit (-0.30)']
+    assert list(log['timestamp']) == [pd.Timestamp((k + 1) * MINUTE, unit='ms') for k in (3, 5, 7, 9)]
+    assert list(zip(log['side1'], log['side2'])) == [('SELL', 'BUY'), ('BUY', 'SELL'), ('BUY', 'SELL'), ('SELL', 'BUY')]
+    assert list(log['qty1']) == [10.0, 10.0, 12.5, 12.5]
+
+    # Short 10 AAA at 10, cover at 9; BBB is flat. Long 12.5 AAA at 8, sell at 10.
+    # Fees are 0.1% of each fill's notional; 100 USDT borrowed for 2 minutes at 1%/hour.
+    assert list(log['pnl'].iloc[[1, 3]]) == pytest.approx([10.0, 25.0])
+    assert list(log['fees']) == pytest.approx([0.2, 0.19, 0.2, 0.225])
+    assert list(log['interest'].iloc[[1, 3]]) == pytest.approx([1 / 30, 1 / 30])
+    assert pnls == pytest.approx([10.0 - 0.39 - 1 / 30, 25.0 - 0.425 - 1 / 30])
+
+
+def test_stop_loss_closes_before_the_zscore_exit():
+    rows, pnls = simulate([10, 10, 10, 10, 13, 9, 9, 8, 8, 10], stop_loss=0.1)
+    assert [row[LOG_COLUMNS.index('action')] for row in rows] == \
+        ['OPEN', 'CLOSE: Stop Loss (-10.00%)', 'OPEN', 'CLOSE: Z-Score Exit (-0.30)']
+    assert rows[1][0] == pd.Timestamp(5 * MINUTE, unit='ms')
+    assert pnls[0] == pytest.approx(-30.0 - 0.2 - 0.23 - 100 * 0.01 / 60)
+
+
+def test_portfolio_gives_slots_to_the_strongest_signal_first():
+    flat = np.full(10, 10.0)
+    weak = PairReplay(pair('AAA', 'BBB'), TIMES, flat, P2, z=Z)
+    # Enters on bar 3 (stronger than AAA/BBB), leaves on 4, enters again on 5 and leaves on 7.
+    strong = PairReplay(pair('CCC', 'DDD'), TIMES, flat, P2,
+                        z=np.array([NAN, NAN, 0.0, 3.0, 0.1, 2.2, 2.1, 0.0, 0.0, 0.0]))
+
+    rows, pnls, skipped = replay_portfolio([weak, strong], max_trades=1)
+    # AAA/BBB loses bar 3 to CCC/DDD, and bar 7 to the position CCC/DDD is closing that minute.
+    assert len(pnls['AAA/BBB']) == 0 and len(pnls['CCC/DDD']) == 2
+    assert skipped == 2
+    assert [row[1] for row in rows] == ['CCC'] * 4
+
+    _, pnls, skipped = replay_portfolio([weak, strong], max_trades=2)
+    assert len(pnls['AAA/BBB']) == 2 and len(pnls['CCC/DDD']) == 2
+    assert skipped == 0
@@ -0,0 +1,23 @@
+# tests/test_binance_api.py
+
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_public_data_works_without_api_keys(exchange):
+    # What the shard supervisor does: import the module and read market data, with no keys set.
+    exchange.close_candle(0, {'AAAUSDT': 10.5})
+    script = ("import binance_api\n"
+              "print(len(binance_api.get_closed_klines('AAAUSDT', 5)))\n"
+              "try:\n"
+              "    binance_api.get_margin_loans()\n"
+              "except AssertionError as e:\n"
+              "    print(e)\n")
+    env = dict(os.environ, BINANCE_API_KEY="", BINANCE_API_SECRET="")
+    out = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True,
+                         timeout=60)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.splitlines() == ["1", "BINANCE_API_KEY/BINANCE_API_SECRET is missing!"]
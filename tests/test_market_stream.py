@@ -0,0 +1,130 @@
+# tests/test_market_stream.py
+
+import time
+import pytest
+import market_stream
+from market_stream import MarketStream
+from kline_store import KlineStore
+from fake_exchange import FakeMarketStream, CANDLE_MS
+
+SYMBOL = 'AAAUSDT'
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+class Candles:
+    """Closes candles on the fake exchange at minute offsets from when it was created."""
+
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.now = int(time.time() * 1000) // CANDLE_MS * CANDLE_MS
+
+    def at(self, offset):
+        return self.now + offset * CANDLE_MS
+
+    def close(self, offsets):
+        for offset in offsets:
+            self.exchange.close_candle(self.at(offset), {SYMBOL: self.exchange.prices[SYMBOL] * 1.001})
+        return self.exchange.klines[SYMBOL][-len(offsets):]
+
+
+def open_times(stream):
+    return [t for t, _ in stream.get_candles(SYMBOL, 1000)]
+
+
+@pytest.fixture
+def ws():
+    server = FakeMarketStream()
+    server.url = server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def start_stream(ws, tmp_path, monkeypatch):
+    """Starts a MarketStream on the fake WebSocket, backfilling from the fake exchange."""
+    monkeypatch.setattr(market_stream, 'WS_RECONNECT_DELAY', 0.1)
+    streams = []
+
+    def start(windows, on_quote=None):
+        stream = MarketStream(windows, url=ws.url, store=KlineStore(str(tmp_path / "klines")), on_quote=on_quote)
+        stream.start()
+        streams.append(stream)
+        assert stream.connected.wait(10)
+        return stream
+
+    yield start
+    for stream in streams:
+        stream.stop()
+
+
+def test_backfills_history_on_start(exchange, ws, start_stream):
+    candles = Candles(exchange)
+    candles.close(range(-40, 0))
+    stream = start_stream({SYMBOL: 20})
+    assert open_times(stream) == [candles.at(o) for o in range(-20, 0)]
+    assert ws.paths[0] == f"/stream?streams={SYMBOL.lower()}@kline_1m/{SYMBOL.lower()}@bookTicker"
+
+
+def test_appends_closed_candles_and_ignores_duplicates(exchange, ws, start_stream):
+    candles = Candles(exchange)
+    candles.close(range(-10, -4))
+    stream = start_stream({SYMBOL: 5})
+    stream.wait_for_update(timeout=0)
+
+    kline, = candles.close([-4])
+    ws.send_kline(SYMBOL, kline, closed=False)  # a tick of the forming candle only moves the price
+    ws.send_kline(SYMBOL, kline)
+    ws.send_kline(SYMBOL, kline)
+    assert wait_until(lambda: open_times(stream)[-1] == candles.at(-4))
+    closed, ticked = stream.wait_for_update(timeout=1)
+    assert SYMBOL in closed and SYMBOL in ticked
+    assert open_times(stream)[-2:] == [candles.at(-5), candles.at(-4)]
+    assert stream.get_last_price(SYMBOL) == float(kline[4])
+
+
+def test_recovers_a_gap_over_rest(exchange, ws, start_stream):
+    candles = Candles(exchange)
+    candles.close(range(-10, -4))
+    stream = start_stream({SYMBOL: 8})
+
+    # Three candles close but the stream only delivers the last one.
+    *_, last = candles.close([-4, -3, -2])
+    ws.send_kline(SYMBOL, last)
+    assert wait_until(lambda: open_times(stream)[-1] == candles.at(-2))
+    assert open_times(stream)[-4:] == [candles.at(o) for o in range(-5, -1)]
+    assert stream.store.last_open_time(SYMBOL) == candles.at(-2)
+
+
+def test_reconnects_and_backfills_what_closed_meanwhile(exchange, ws, start_stream):
+    candles = Candles(exchange)
+    candles.close(range(-10, -4))
+    stream = start_stream({SYMBOL: 8})
+
+    ws.drop()
+    assert wait_until(lambda: not stream.connected.is_set())
+    candles.close([-4, -3])
+    assert ws.wait_for_connections(2)
+    assert stream.connected.wait(10)
+    # What closed while disconnected is fetched before the stream reports itself connected.
+    assert open_times(stream)[-2:] == [candles.at(-4), candles.at(-3)]
+
+    kline, = candles.close([-2])
+    ws.send_kline(SYMBOL, kline)
+    assert wait_until(lambda: open_times(stream)[-1] == candles.at(-2))
+
+
+def test_book_updates_reach_on_quote(exchange, ws, start_stream):
+    Candles(exchange).close(range(-10, 0))
+    quotes = []
+    start_stream({SYMBOL: 5}, on_quote=lambda symbol, **prices: quotes.append((symbol, prices)))
+
+    ws.send_book(SYMBOL, 9.99, 10.01)
+    assert wait_until(lambda: (SYMBOL, {'bid': 9.99, 'ask': 10.01}) in quotes)
@@ -0,0 +1,60 @@
+# tests/test_order_executor.py
+
+import pytest
+from order_executor import OrderExecutor
+from state_store import StateStore, reconcile, unwind_client_id
+
+KEY = 'AAAUSDT/BBBUSDT'
+
+
+@pytest.fixture(scope='module')
+def executor():
+    executor = OrderExecutor()
+    yield executor
+    executor.close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return StateStore(str(tmp_path / "open_positions.json"))
+
+
+def open_pair(executor, store, qty2):
+    """SELL SPREAD entry of 1 AAA (~$10) against `qty2` BBB (~$2 each), recorded like open_position() does."""
+    record = store.begin(KEY, 'entry', sym1='AAAUSDT', sym2='BBBUSDT', direction='SELL SPREAD', side1='SELL',
+                         side2='BUY', qty1=1.0, qty2=qty2, price1=10.0, price2=2.0, borrow_sym='AAAUSDT',
+                         borrow_qty=1.0, stop_loss=0.05, take_profit=0.05)
+    result = executor.open_pair('AAAUSDT', 'BBBUSDT', 'SELL SPREAD', 1.0, qty2, 10.0, 2.0,
+                                client_ids=record['client_ids'],
+                                on_step=lambda name, **data: store.step(KEY, name, **data))
+    return record, result
+
+
+def test_entry_fills_both_legs(exchange, executor, store):
+    record, result = open_pair(executor, store, qty2=5.0)
+    assert float(result['leg1']['executedQty']) == 1.0 and float(result['leg2']['executedQty']) == 5.0
+    assert set(record['steps']) == {'borrowed', 'leg1', 'leg2'}
+
+
+def test_failed_leg_is_rolled_back_with_its_own_client_id(exchange, executor, store):
+    record, result = open_pair(executor, store, qty2=1.0)  # $2: below the minimum notional
+    assert result is None
+    assert ('AAAUSDT', unwind_client_id(record['client_ids'][0])) in exchange.orders
+    assert set(record['steps']) == {'borrowed', 'leg1', 'unwound1', 'repaid', 'unwound'}
+    assert exchange.balances['AAA'] == {'free': pytest.approx(0.0), 'borrowed': pytest.approx(0.0)}
+
+
+def test_rollback_without_repay_keeps_the_record(exchange, executor, store, monkeypatch):
+    async def no_repay(*args):
+        return None
+
+    monkeypatch.setattr(executor, '_repay', no_repay)
+    record, result = open_pair(executor, store, qty2=1.0)
+    assert result is None
+    assert 'unwound1' in record['steps'] and 'unwound' not in record['steps']
+
+    # reconcile() finds the unwind already done and only repays the loan.
+    monkeypatch.undo()
+    assert reconcile(store)[0] == [f"Unwound unfinished entry {KEY}."]
+    assert len([cid for s, cid in exchange.orders if s == 'AAAUSDT']) == 2
+    assert exchange.balances['AAA']['borrowed'] == pytest.approx(0.0)
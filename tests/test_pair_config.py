@@ -0,0 +1,99 @@
+# tests/test_pair_config.py
+
+import os
+import time
+import pytest
+from pair_config import PairConfig, PairConfigSource
+
+HEADER = "sym1,sym2,z_entry,z_exit,window,stop_loss,take_profit\n"
+
+
+def row(**values):
+    base = {'sym1': 'ethusdt', 'sym2': 'btcusdt', 'z_entry': '2.0', 'z_exit': '0.5', 'window': '50'}
+    return {**base, **values}
+
+
+def test_from_row_parses_and_fills_defaults():
+    pair = PairConfig.from_row(row())
+    assert pair == PairConfig('ETHUSDT', 'BTCUSDT', 2.0, 0.5, 50, 0.05, 0.05)
+    assert pair.key == 'ETHUSDT/BTCUSDT'
+    assert pair['window'] == 50 and pair.get('stop_loss') == 0.05
+
+
+@pytest.mark.parametrize('values', [
+    {'z_exit': '2.0'},                # z_exit must stay below z_entry
+    {'z_exit': '3.0'},
+    {'z_exit': '-0.1'},               # and not be negative
+    {'window': '1'},                  # a z-score needs at least two spreads
+    {'window': '20.5'},
+    {'window': ''},
+    {'sym2': 'ETHUSDT'},
+    {'stop_loss': '0'},
+    {'take_profit': '-0.05'},
+    {'z_entry': 'abc'},
+])
+def test_from_row_rejects_unusable_rows(values):
+    with pytest.raises(ValueError):
+        PairConfig.from_row(row(**values))
+
+
+@pytest.mark.parametrize('values', [{'z_exit': '0'}, {'window': '2'}, {'window': '30.0'}])
+def test_from_row_accepts_the_boundaries(values):
+    PairConfig.from_row(row(**values))
+
+
+def write(path, text, age=10.0):
+    """Writes the pair CSV with an mtime `age` seconds in the past."""
+    path.write_text(text)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "live_pairs.csv"
+    write(path, HEADER + "ETHUSDT,BTCUSDT,2,0.5,50,,\nSOLUSDT,BTCUSDT,2.5,0.5,100,,\n")
+    return path
+
+
+def test_reload_reports_added_removed_and_changed_pairs(csv_path):
+    source = PairConfigSource(str(csv_path))
+    assert source.reload() == (['ETHUSDT/BTCUSDT', 'SOLUSDT/BTCUSDT'], [], [])
+    assert source.reload() is None  # unchanged
+
+    write(csv_path, HEADER + "ETHUSDT,BTCUSDT,3,0.5,50,,\nBNBUSDT,BTCUSDT,2,0.5,50,,\n")
+    assert source.reload() == (['BNBUSDT/BTCUSDT'], ['SOLUSDT/BTCUSDT'], ['ETHUSDT/BTCUSDT'])
+    assert source.configs['ETHUSDT/BTCUSDT'].z_entry == 3.0
+
+
+def test_touched_file_is_not_a_change(csv_path):
+    source = PairConfigSource(str(csv_path))
+    source.reload()
+    write(csv_path, csv_path.read_text(), age=5.0)
+    assert source.reload() is None
+
+
+def test_edit_is_loaded_once_the_file_has_settled(csv_path):
+    source = PairConfigSource(str(csv_path), settle=2.0)
+    source.reload()
+    write(csv_path, HEADER + "ETHUSDT,BTCUSDT,2,0.5,50,,\n", age=0.0)  # a save that may still be in progress
+    assert source.reload() is None
+    assert len(source) == 2
+
+    os.utime(csv_path, (time.time() - 5, time.time() - 5))
+    assert source.reload() == ([], ['SOLUSDT/BTCUSDT'], [])
+
+
+def test_rejected_edit_keeps_the_configs_and_is_retried(csv_path):
+    source = PairConfigSource(str(csv_path))
+    source.reload()
+    original = csv_path.read_text()
+    write(csv_path, "sym1;sym2\nETHUSDT;BTCUSDT\n")  # broken header: no valid pairs
+    assert source.reload() is None
+    assert source.reload() is None  # read again, still rejected
+    assert len(source) == 2
+
+    write(csv_path, original)  # the loaded version is still the one compared against
+    assert source.reload() is None
+    write(csv_path, HEADER + "ETHUSDT,BTCUSDT,2,0.5,50,,\n")
+    assert source.reload() == ([], ['SOLUSDT/BTCUSDT'], [])
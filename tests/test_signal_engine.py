@@ -0,0 +1,106 @@
+# tests/test_signal_engine.py
+
+import math
+import random
+import pytest
+from signal_engine import SignalEngine
+from test_spread_stats import pandas_zscore
+
+MINUTE = 60_000
+
+
+class Market:
+    """Closed candles per symbol, read the way SignalEngine reads MarketStream."""
+
+    def __init__(self):
+        self.candles = {}
+
+    def close(self, symbol, open_time, close):
+        self.candles.setdefault(symbol, []).append((open_time, close))
+
+    def get_candles(self, symbol, n, since=None):
+        candles = [c for c in self.candles.get(symbol, []) if since is None or c[0] > since]
+        return candles[-n:]
+
+
+def expected_zscores(market, pairs, now):
+    """Per pair, the pandas z-score of its last `window` spreads ending at `now`; NaN if a leg misses one."""
+    expected = {}
+    for p in pairs:
+        closes1, closes2 = dict(market.candles.get(p['sym1'], [])), dict(market.candles.get(p['sym2'], []))
+        times = [now - k * MINUTE for k in reversed(range(p['window']))]
+        if all(t in closes1 and t in closes2 for t in times):
+            expected[f"{p['sym1']}/{p['sym2']}"] = pandas_zscore([closes1[t] / closes2[t] for t in times])
+        else:
+            expected[f"{p['sym1']}/{p['sym2']}"] = math.nan
+    return expected
+
+
+def pair(sym1, sym2, window, z_entry=2.0):
+    return {'sym1': sym1, 'sym2': sym2, 'window': window, 'z_entry': z_entry, 'z_exit': 0.5}
+
+
+@pytest.mark.parametrize('pairs, missing_rate', [
+    # one pair per symbol, equal windows, no gaps
+    ([pair('AAA', 'BBB', 5), pair('CCC', 'DDD', 5)], 0.0),
+    # mixed windows on symbols shared by several pairs
+    ([pair('AAA', 'BBB', 3), pair('AAA', 'CCC', 8), pair('BBB', 'CCC', 20), pair('CCC', 'AAA', 2)], 0.0),
+    # the same, with candles missing here and there
+    ([pair('AAA', 'BBB', 3), pair('AAA', 'CCC', 8), pair('BBB', 'CCC', 20), pair('CCC', 'AAA', 2)], 0.05),
+    ([pair('AAA', 'BBB', 2), pair('BBB', 'CCC', 4), pair('CCC', 'DDD', 6), pair('DDD', 'AAA', 30)], 0.15),
+])
+@pytest.mark.parametrize('seed', range(3))
+def test_zscores_match_pandas_per_pair(pairs, missing_rate, seed):
+    rng = random.Random(seed)
+    symbols = sorted({p[k] for p in pairs for k in ('sym1', 'sym2')})
+    prices = {s: rng.uniform(1.0, 50.0) for s in symbols}
+    market, engine = Market(), SignalEngine(pairs)
+    now = 0
+    for step in range(80):
+        now += MINUTE
+        for symbol in symbols:
+            prices[symbol] *= 1 + rng.gauss(0, 0.01)
+            if rng.random() >= missing_rate:
+                market.close(symbol, now, prices[symbol])
+        if rng.random() < 0.3:
+            continue  # several candles can close between two syncs
+        assert engine.sync(market)
+        expected = expected_zscores(market, pairs, engine.last_time)
+        got = dict(zip(engine.keys, engine.zscores()))
+        for key, z in expected.items():
+            if math.isnan(z):
+                assert math.isnan(got[key]), (step, key)
+            else:
+                assert got[key] == pytest.approx(z, abs=1e-8), (step, key)
+
+
+def test_a_leg_closing_late_is_scored_once_it_arrives():
+    pairs = [pair('AAA', 'BBB', 3)]
+    market, engine = Market(), SignalEngine(pairs)
+    for k, (a, b) in enumerate([(10, 5), (11, 5), (12, 5), (13, 5)], start=1):
+        market.close('AAA', k * MINUTE, a)
+        market.close('BBB', k * MINUTE, b)
+    engine.sync(market)
+    market.close('AAA', 5 * MINUTE, 20)
+    engine.sync(market)
+    assert math.isnan(engine.zscores()[0])  # BBB has not closed minute 5 yet
+
+    market.close('BBB', 5 * MINUTE, 5)
+    engine.sync(market)
+    assert engine.zscores()[0] == pytest.approx(pandas_zscore([12 / 5, 13 / 5, 20 / 5]))
+
+
+def test_evaluate_ranks_entries_and_flags_exits():
+    # A jump on the last of 5 candles scores about 1.79 either way; AAA/BBB is further past its z_entry.
+    pairs = [pair('AAA', 'BBB', 5, z_entry=1.0), pair('CCC', 'DDD', 5, z_entry=1.5)]
+    market, engine = Market(), SignalEngine(pairs)
+    for k in range(1, 6):
+        market.close('AAA', k * MINUTE, 10.0 + (k == 5) * 2.0)  # spread jumps on the last candle
+        market.close('BBB', k * MINUTE, 5.0 + (k % 2) * 0.01)
+        market.close('CCC', k * MINUTE, 10.0 + (k == 5) * 1.0)
+        market.close('DDD', k * MINUTE, 5.0 + (k % 2) * 0.01)
+    engine.sync(market)
+    signals = engine.evaluate({'CCC/DDD': 'BUY SPREAD'})
+    assert [key for key, _, _ in signals['entries']] == ['AAA/BBB', 'CCC/DDD']
+    assert signals['entries'][0][2] == 'SELL SPREAD'
+    assert signals['exits'] == {'CCC/DDD'}
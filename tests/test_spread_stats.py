@@ -0,0 +1,68 @@
+# tests/test_spread_stats.py
+
+import random
+import numpy as np
+import pandas as pd
+import pytest
+from spread_stats import RollingZScore, rolling_zscore
+
+
+def pandas_zscore(values):
+    """The z-score the bot computed with pandas before RollingZScore replaced it."""
+    series = pd.Series(values)
+    std = series.std()
+    if std == 0 or pd.isna(std): return 0
+    return (series.iloc[-1] - series.mean()) / std
+
+
+def random_walk(n, seed):
+    rng = random.Random(seed)
+    values = [rng.uniform(0.5, 5.0)]
+    for _ in range(n - 1):
+        values.append(values[-1] * (1 + rng.gauss(0, 0.001)))
+    return values
+
+
+@pytest.mark.parametrize('window', [2, 5, 50, 500])
+def test_matches_pandas_on_every_tick(window):
+    values = random_walk(3 * window + 7, seed=window)
+    stats = RollingZScore(window)
+    for i, value in enumerate(values):
+        stats.update(value)
+        assert stats.ready == (i + 1 >= window)
+        if stats.ready:
+            assert stats.zscore() == pytest.approx(pandas_zscore(values[i - window + 1:i + 1]), abs=1e-8)
+
+
+def test_flat_window_scores_zero():
+    stats = RollingZScore(4)
+    for value in (1.0, 2.0, 3.0, 1.5, 1.5, 1.5, 1.5):
+        stats.update(value)
+    assert stats.zscore() == 0
+
+
+def test_fill_starts_over_from_the_last_window():
+    values = random_walk(30, seed=1)
+    stats = RollingZScore(10)
+    for value in random_walk(25, seed=2):
+        stats.update(value)
+    stats.fill(values, open_time=123)
+    assert stats.ready and stats.last_time == 123
+    assert stats.values() == values[-10:]
+    assert stats.zscore() == pytest.approx(pandas_zscore(values[-10:]), abs=1e-8)
+
+    stats.fill(values[:3])
+    assert not stats.ready and len(stats) == 3
+    stats.update(values[3])
+    assert stats.values() == values[:4]
+
+
+@pytest.mark.parametrize('window', [2, 20, 300])
+def test_rolling_zscore_matches_the_incremental_one(window):
+    values = random_walk(2 * window + 50, seed=window)
+    stats = RollingZScore(window)
+    expected = []
+    for value in values:
+        stats.update(value)
+        expected.append(stats.zscore() if stats.ready else np.nan)
+    np.testing.assert_allclose(rolling_zscore(values, window, block=64), expected, atol=1e-8)
@@ -0,0 +1,244 @@
+# tests/test_state_store.py
+
+import pytest
+import binance_api
+import trading_bot
+from binance_api import borrow_asset, place_order
+from state_store import StateStore, reconcile, unwind_client_id, remainder_client_id
+from trade_journal import TradeJournal
+
+KEY = 'AAAUSDT/BBBUSDT'
+# SELL SPREAD: borrow and sell 1 AAA (~$10), buy 5 BBB (~$10).
+ENTRY = dict(sym1='AAAUSDT', sym2='BBBUSDT', direction='SELL SPREAD', side1='SELL', side2='BUY',
+             qty1=1.0, qty2=5.0, price1=10.0, price2=2.0, borrow_sym='AAAUSDT', borrow_qty=1.0,
+             stop_loss=0.05, take_profit=0.05)
+EXIT = dict(sym1='AAAUSDT', sym2='BBBUSDT', direction='SELL SPREAD', side1='BUY', side2='SELL',
+            qty1=1.0, qty2=5.0, price1=10.0, price2=2.0)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return StateStore(str(tmp_path / "open_positions.json"))
+
+
+def holding(exchange, asset):
+    """Net amount of `asset` held: free minus borrowed."""
+    balance = exchange.balances.get(asset, {'free': 0.0, 'borrowed': 0.0})
+    return round(balance['free'] - balance['borrowed'], 8)
+
+
+def borrowed(exchange, asset):
+    return round(exchange.balances.get(asset, {}).get('borrowed', 0.0), 8)
+
+
+def orders_for(exchange, symbol):
+    return [cid for s, cid in exchange.orders if s == symbol]
+
+
+def send_leg(record, n, qty=None):
+    """Sends leg `n` of an entry/exit the way the executor does, without recording the step."""
+    return place_order(record[f"sym{n}"], record[f"side{n}"], qty or record[f"qty{n}"],
+                       price=record[f"price{n}"], client_order_id=record['client_ids'][n - 1])
+
+
+def open_position(store, **sizes):
+    """A committed SELL SPREAD position, as after a normal entry. `sizes` overrides qty1/qty2."""
+    record = store.begin(KEY, 'entry', **dict(ENTRY, **sizes, borrow_qty=sizes.get('qty1', ENTRY['qty1'])))
+    borrow_asset('AAAUSDT', record['borrow_qty'])
+    store.step(KEY, 'borrowed', qty=record['borrow_qty'])
+    for n in (1, 2):
+        send_leg(record, n)
+    assert reconcile(store)[0] == [f"Resumed entry {KEY}: both legs had filled."]
+    return store.positions[KEY]
+
+
+# --- interrupted entries ---
+
+def test_entry_crashed_before_sending_anything(exchange, store):
+    store.begin(KEY, 'entry', **ENTRY)
+    assert reconcile(store)[0] == [f"Unwound unfinished entry {KEY}."]
+    assert not store.pending and not store.positions
+    assert not exchange.orders
+
+
+def test_entry_crashed_after_borrowing(exchange, store):
+    store.begin(KEY, 'entry', **ENTRY)
+    borrow_asset('AAAUSDT', 1.0)
+    store.step(KEY, 'borrowed', qty=1.0)
+
+    reconcile(store)
+    assert not store.pending
+    assert borrowed(exchange, 'AAA') == 0
+
+
+def test_entry_crashed_before_recording_the_loan(exchange, store):
+    store.begin(KEY, 'entry', **ENTRY)
+    borrow_asset('AAAUSDT', 1.0)  # the loan went through but the step was never written
+
+    reconcile(store)
+    assert not store.pending
+    assert borrowed(exchange, 'AAA') == 0
+
+
+def test_half_entry_is_unwound_and_repaid(exchange, store):
+    record = store.begin(KEY, 'entry', **ENTRY)
+    borrow_asset('AAAUSDT', 1.0)
+    store.step(KEY, 'borrowed', qty=1.0)
+    send_leg(record, 1)  # leg 1 filled, then the bot died before leg 2
+
+    assert reconcile(store)[0] == [f"Unwound unfinished entry {KEY}."]
+    assert not store.pending and not store.positions
+    assert ('AAAUSDT', unwind_client_id(record['client_ids'][0])) in exchange.orders
+    assert holding(exchange, 'AAA') == 0 and borrowed(exchange, 'AAA') == 0
+
+
+def test_rollback_interrupted_after_an_unwind_is_not_repeated(exchange, store):
+    record = store.begin(KEY, 'entry', **ENTRY)
+    borrow_asset('AAAUSDT', 1.0)
+    store.step(KEY, 'borrowed', qty=1.0)
+    send_leg(record, 1)
+    # The executor's rollback unwound leg 1, then crashed before recording it.
+    place_order('AAAUSDT', 'BUY', 1.0, price=10.0, client_order_id=unwind_client_id(record['client_ids'][0]))
+
+    reconcile(store)
+    assert len(orders_for(exchange, 'AAAUSDT')) == 2
+    assert holding(exchange, 'AAA') == 0 and borrowed(exchange, 'AAA') == 0
+    assert not store.pending
+
+
+def test_entry_with_both_legs_filled_is_resumed(exchange, store):
+    pos = open_position(store)
+    assert not store.pending
+    assert pos['qty1'] == 1.0 and pos['qty2'] == 5.0
+    assert pos['price1'] == pytest.approx(10.0, rel=1e-3) and pos['price2'] == pytest.approx(2.0, rel=1e-3)
+
+
+def test_entry_with_a_partly_filled_leg_is_unwound(exchange, store):
+    record = store.begin(KEY, 'entry', **dict(ENTRY, qty1=1.5, borrow_qty=1.5))
+    borrow_asset('AAAUSDT', 1.5)
+    store.step(KEY, 'borrowed', qty=1.5)
+    send_leg(record, 1, qty=0.6)  # only 0.6 of 1.5 filled: $9 short of a balanced hedge
+    send_leg(record, 2)
+
+    assert reconcile(store)[0] == [f"Unwound unfinished entry {KEY}."]
+    assert not store.positions
+    assert holding(exchange, 'AAA') == 0 and borrowed(exchange, 'AAA') == 0
+    assert holding(exchange, 'BBB') == 0
+
+
+# --- interrupted exits ---
+
+def test_exit_crashed_after_one_leg_is_finished(exchange, store):
+    open_position(store)
+    record = store.begin(KEY, 'exit', **EXIT)
+    send_leg(record, 1)  # bought back, then the bot died
+
+    assert reconcile(store)[0] == [f"Finished unfinished exit {KEY}."]
+    assert not store.pending and not store.positions
+    assert len(orders_for(exchange, 'AAAUSDT')) == 2  # the buy-back was found, not sent again
+    assert holding(exchange, 'AAA') == 0 and borrowed(exchange, 'AAA') == 0
+    assert holding(exchange, 'BBB') == 0
+
+
+def test_exit_with_a_partly_filled_leg_sends_the_remainder(exchange, store):
+    open_position(store, qty2=10.0)
+    record = store.begin(KEY, 'exit', **dict(EXIT, qty2=10.0))
+    send_leg(record, 1)
+    send_leg(record, 2, qty=4.0)  # $8 of $20 sold; the executor recorded the partial fill
+    store.step(KEY, 'leg2', qty=4.0, price=2.0)
+
+    reconcile(store)
+    assert ('BBBUSDT', remainder_client_id(record['client_ids'][1])) in exchange.orders
+    assert holding(exchange, 'BBB') == 0
+    assert not store.positions
+
+
+def test_exit_stays_pending_until_the_loan_is_repaid(exchange, store, monkeypatch):
+    open_position(store)
+    record = store.begin(KEY, 'exit', **EXIT)
+    for n in (1, 2):
+        order = send_leg(record, n)
+        store.step(KEY, f"leg{n}", qty=float(order['executedQty']), price=record[f"price{n}"])
+
+    monkeypatch.setattr(binance_api, 'repay_asset', lambda *args, **kwargs: None)
+    findings, _ = reconcile(store)
+    assert findings[0].startswith("⚠️ Closed")
+    assert KEY in store.pending and KEY in store.positions
+
+    monkeypatch.undo()
+    assert reconcile(store)[0] == [f"Finished unfinished exit {KEY}."]
+    assert not store.pending and not store.positions
+    assert borrowed(exchange, 'AAA') == 0
+
+
+# --- journal rows of settled operations ---
+
+def test_resumed_entry_returns_its_open_row(exchange, store):
+    record = store.begin(KEY, 'entry', **ENTRY)
+    borrow_asset('AAAUSDT', 1.0)
+    store.step(KEY, 'borrowed', qty=1.0)
+    orders = [send_leg(record, n) for n in (1, 2)]
+
+    _, trades = reconcile(store)
+    assert len(trades) == 1
+    trade = trades[0]
+    assert (trade['action'], trade['side1'], trade['side2']) == ("OPEN", "SELL", "BUY")
+    assert (trade['qty1'], trade['qty2']) == (1.0, 5.0)
+    assert [trade['result'][leg]['orderId'] for leg in ('leg1', 'leg2')] == [o['orderId'] for o in orders]
+
+
+def test_settled_partial_exit_is_journaled(exchange, store, tmp_path, monkeypatch):
+    journal = TradeJournal(str(tmp_path / "journal.db"))
+    monkeypatch.setattr(trading_bot, 'store', store)
+    monkeypatch.setattr(trading_bot, 'journal', journal)
+    sent = []
+    monkeypatch.setattr(trading_bot, 'send_telegram_message', sent.append)
+    open_position(store, qty2=10.0)
+    exchange.set_prices({'AAAUSDT': 9.0})
+    # The bot's exit sold only 4 of 10 BBB, so it journaled nothing and left the record pending.
+    record = store.begin(KEY, 'exit', **dict(EXIT, qty2=10.0, price1=9.0), reason="Take Profit (5.00%)")
+    send_leg(record, 1)
+    send_leg(record, 2, qty=4.0)
+    store.step(KEY, 'leg2', qty=4.0, price=2.0)
+
+    trading_bot.settle_pending(KEY)
+    journal.flush()
+    rows = journal.trades()
+    journal.close()
+    assert sent == [f"🔁 Finished unfinished exit {KEY}."]
+    assert not store.pending and not store.positions
+    assert len(rows) == 1
+    row = rows[0]
+    assert (row['action'], row['side1'], row['side2']) == ("CLOSE: Take Profit (5.00%)", "BUY", "SELL")
+    assert row['qty1'] == 1.0 and row['qty2'] == pytest.approx(10.0)
+    assert row['pnl'] == pytest.approx(1.0, abs=0.05)  # AAA shorted at 10, bought back at 9
+    assert row['order_id1'] and row['order_id2']
+    assert row['fill_ids2'].count(',') == 1  # the partial fill and its remainder
+    assert row['fees_usdt'] == pytest.approx(0.001 * (9.0 + 20.0), rel=0.01)
+
+
+def test_exit_journaled_by_the_bot_is_not_journaled_again(exchange, store):
+    open_position(store)
+    record = store.begin(KEY, 'exit', **EXIT)
+    for n in (1, 2):
+        order = send_leg(record, n)
+        store.step(KEY, f"leg{n}", qty=float(order['executedQty']), price=record[f"price{n}"])
+    store.step(KEY, 'journaled')  # both legs closed, only the loan was left to repay
+
+    assert reconcile(store) == ([f"Finished unfinished exit {KEY}."], [])
+
+
+# --- loans against positions ---
+
+def test_unexplained_loan_is_reported(exchange, store):
+    borrow_asset('CCCUSDT', 0.5)
+    assert reconcile(store)[0] == ["⚠️ 0.5 CCC is borrowed but no open position uses it."]
+
+
+def test_position_without_its_loan_is_reported(exchange, store):
+    open_position(store)
+    # Closed by hand on the exchange: short leg bought back and its loan repaid.
+    place_order('AAAUSDT', 'BUY', 1.0, price=10.0)
+    binance_api.repay_asset('AAAUSDT', 1.0)
+    findings, _ = reconcile(store)
+    assert len(findings) == 1 and "Was a position closed manually?" in findings[0]
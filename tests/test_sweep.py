@@ -0,0 +1,13 @@
+# tests/test_sweep.py
+
+from sweep import _grid_jobs
+
+
+def test_grid_keeps_only_valid_pair_configs():
+    pairs = [{'sym1': 'AAA', 'sym2': 'BBB'}]
+    grid = {'z_entry': [1.0, 2.0], 'z_exit': [0.0, 1.0, -0.5], 'window': [1, 20, 30.5],
+            'stop_loss': [0.05, 0.0], 'take_profit': [0.05]}
+    jobs = _grid_jobs(pairs, grid)
+    # window 1 and 30.5, negative z_exit, z_exit >= z_entry and a zero stop loss are all rejected.
+    assert [(i, window) for i, _, window, _ in jobs] == [(0, 20)]
+    assert jobs[0][3] == [(1.0, 0.0, 0.05, 0.05), (2.0, 0.0, 0.05, 0.05), (2.0, 1.0, 0.05, 0.05)]
@@ -0,0 +1,115 @@
+# tests/test_telegram_notify.py
+
+import time
+import threading
+import pytest
+from fake_exchange import FakeTelegram
+from telegram_notify import TelegramNotifier
+
+
+@pytest.fixture
+def telegram():
+    fake = FakeTelegram()
+    url = fake.start()
+    fake.url = url
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def notifier(telegram):
+    """Returns a factory for notifiers pointed at the stand-in; each one is closed after the test."""
+    notifiers = []
+
+    def make(**kwargs):
+        kwargs = {'min_interval': 0.0, 'coalesce_window': 0.0, 'timeout': 5, 'max_retries': 3, **kwargs}
+        n = TelegramNotifier(token="test", chat_id=1, base_url=telegram.url, **kwargs)
+        notifiers.append(n)
+        return n
+
+    yield make
+    for n in notifiers:
+        n.close()
+
+
+def test_burst_is_coalesced_into_one_digest(telegram, notifier):
+    n = notifier(coalesce_window=0.3)
+    for text in ("a", "b", "a"):
+        n.send(text)
+    n.flush()
+    assert telegram.messages == ["a\n_(×2)_\n\nb"]
+
+
+def test_sends_are_spaced_by_min_interval(telegram, notifier):
+    telegram.min_interval = 0.2  # anything closer gets a 429
+    n = notifier(min_interval=0.25)
+    start = time.monotonic()
+    for text in ("one", "two", "three"):
+        n.send(text)
+        n.flush()
+    assert telegram.messages == ["one", "two", "three"]
+    assert telegram.rate_limited == 0
+    assert time.monotonic() - start >= 0.5
+
+
+def test_rate_limit_waits_for_retry_after(telegram, notifier):
+    telegram.min_interval = 0.5
+    n = notifier()
+    n.send("one")
+    n.flush()
+    start = time.monotonic()
+    n.send("two")
+    n.flush()
+    assert telegram.messages == ["one", "two"]
+    assert telegram.rate_limited == 1
+    assert time.monotonic() - start >= 1.0  # the stand-in answers retry_after = 1
+
+
+def test_markdown_that_does_not_parse_is_sent_as_plain_text(telegram, notifier):
+    n = notifier()
+    n.send("order_id 42")
+    n.flush()
+    assert telegram.bad_requests == 1
+    assert telegram.messages == ["order_id 42"]
+
+
+def test_unexpected_error_drops_the_batch_and_keeps_the_worker_alive(telegram, notifier, monkeypatch):
+    n = notifier()
+    post = n._post
+
+    def broken_once(text):
+        monkeypatch.setattr(n, '_post', post)
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(n, '_post', broken_once)
+    n.send("lost")
+    n.flush()
+    n.send("delivered")
+    n.flush()
+    assert telegram.messages == ["delivered"]
+
+
+def test_close_delivers_everything_queued(telegram, notifier):
+    n = notifier(coalesce_window=5.0)
+    n.send("before close")
+    start = time.monotonic()
+    n.close()
+    assert time.monotonic() - start < 2.0  # close() does not wait out the coalescing window
+    assert telegram.messages == ["before close"]
+
+
+def test_messages_queued_behind_close_are_drained(telegram, notifier, monkeypatch):
+    n = notifier()
+    post, sending = n._post, threading.Event()
+
+    def slow_post(text):
+        sending.wait(5)
+        return post(text)
+
+    monkeypatch.setattr(n, '_post', slow_post)
+    n.send("first")
+    n._queue.put(None)  # close() requested while the worker was busy and more messages were queued
+    n.send("late")
+    sending.set()
+    n.close()
+    assert telegram.messages == ["first", "late"]
@@ -0,0 +1,211 @@
+# trade_journal.py
+
+import csv
+import time
+import queue
+import sqlite3
+import logging
+import argparse
+import threading
+from config import JOURNAL_FILE, JOURNAL_FLUSH_INTERVAL
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    pair TEXT NOT NULL,
+    sym1 TEXT NOT NULL,
+    sym2 TEXT NOT NULL,
+    action TEXT NOT NULL,
+    side1 TEXT, side2 TEXT,
+    price1 REAL, price2 REAL,
+    qty1 REAL, qty2 REAL,
+    pnl REAL,
+    order_id1 INTEGER, order_id2 INTEGER,
+    fill_ids1 TEXT, fill_ids2 TEXT,
+    fee1 REAL, fee_asset1 TEXT,
+    fee2 REAL, fee_asset2 TEXT,
+    fees_usdt REAL,
+    leg1_ms REAL, leg2_ms REAL, gap_ms REAL
+);
+CREATE INDEX IF NOT EXISTS trades_pair_ts ON trades (pair, ts);
+CREATE INDEX IF NOT EXISTS trades_ts ON trades (ts);
+"""
+COLUMNS = ['ts', 'pair', 'sym1', 'sym2', 'action', 'side1', 'side2', 'price1', 'price2', 'qty1', 'qty2', 'pnl',
+           'order_id1', 'order_id2', 'fill_ids1', 'fill_ids2', 'fee1', 'fee_asset1', 'fee2', 'fee_asset2',
+           'fees_usdt', 'leg1_ms', 'leg2_ms', 'gap_ms']
+INSERT = f"INSERT INTO trades ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+
+def order_fills(symbol, order):
+    """
+    Summarizes a Binance order response: (order id, comma-separated fill trade ids,
+    commission, commission asset, commission in USDT or None if it was paid in a third
+    asset such as BNB).
+    """
+    if not order:
+        return None, None, None, None, None
+    fills = order.get('fills') or []
+    fee = sum(float(f['commission']) for f in fills)
+    assets = {f['commissionAsset'] for f in fills}
+    asset = assets.pop() if len(assets) == 1 else None
+    if asset == 'USDT':
+        fee_usdt = fee
+    elif asset == symbol.replace("USDT", ""):
+        fee_usdt = sum(float(f['commission']) * float(f['price']) for f in fills)
+    else:
+        fee_usdt = 0.0 if not fills else None
+    fill_ids = ','.join(str(f['tradeId']) for f in fills if 'tradeId' in f)
+    return order.get('orderId'), fill_ids or None, fee, asset, fee_usdt
+
+
+class TradeJournal:
+    """
+    Append-only trade journal in SQLite (WAL mode).
+
+    record() only puts the row on a queue and returns; a background thread writes the
+    queued rows in batches, one transaction per batch. Queries open their own read
+    connection, which WAL lets run alongside the writer.
+    """
+
+    def __init__(self, path=JOURNAL_FILE, flush_interval=JOURNAL_FLUSH_INTERVAL, batch_size=500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        self._thread = threading.Thread(target=self._writer, name="trade-journal", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # --- writing ---
+
+    def record(self, sym1, sym2, action, side1, side2, price1, price2, qty1, qty2, pnl=None, result=None):
+        """
+        Queues one trade row. `result` is what OrderExecutor returned for the trade
+        ({'leg1', 'leg2', 'latency'}); fill ids, fees and per-leg latency come from it.
+        """
+        result = result or {}
+        order_id1, fill_ids1, fee1, fee_asset1, fee_usdt1 = order_fills(sym1, result.get('leg1'))
+        order_id2, fill_ids2, fee2, fee_asset2, fee_usdt2 = order_fills(sym2, result.get('leg2'))
+        fees_usdt = None if None in (fee_usdt1, fee_usdt2) else fee_usdt1 + fee_usdt2
+        latency = result.get('latency') or {}
+        self._queue.put((time.time(), f"{sym1}/{sym2}", sym1, sym2, action, side1, side2, price1, price2,
+                         qty1, qty2, pnl, order_id1, order_id2, fill_ids1, fill_ids2, fee1, fee_asset1, fee2,
+                         fee_asset2, fees_usdt, latency.get('leg1_ms'), latency.get('leg2_ms'),
+                         latency.get('between_legs_ms')))
+
+    def _writer(self):
+        conn = self._connect()
+        stop = False
+        while not stop:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [row for row in batch if row is not None]
+            stop = len(rows) < len(batch)
+            try:
+                with conn:
+                    conn.executemany(INSERT, rows)
+            except sqlite3.Error as e:
+                logging.error(f"Writing {len(rows)} trade journal rows failed: {e}")
+            for _ in batch:
+                self._queue.task_done()
+        conn.close()
+
+    def flush(self):
+        """Blocks until every queued row has been written."""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+
+    # --- queries ---
+
+    def _query(self, sql, params=()):
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _where(pair=None, since=None, until=None):
+        clauses, params = [], []
+        if pair is not None:
+            clauses.append("pair = ?")
+            params.append(pair)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def trades(self, pair=None, since=None, until=None, limit=None):
+        """Journal rows as dicts, oldest first. `since`/`until` are Unix timestamps."""
+        where, params = self._where(pair, since, until)
+        sql = f"SELECT * FROM trades{where} ORDER BY ts"
+        if limit is not None:
+            sql = f"SELECT * FROM (SELECT * FROM trades{where} ORDER BY ts DESC LIMIT ?) ORDER BY ts"
+            params.append(int(limit))
+        return self._query(sql, params)
+
+    def pnl_summary(self, since=None, until=None):
+        """
+        Per-pair totals over closed trades: {'pair', 'trades', 'wins', 'pnl', 'fees', 'net_pnl'},
+        best pair first. Fees include the opening fills. Fees paid in a third asset count as 0.
+        """
+        where, params = self._where(since=since, until=until)
+        return self._query(f"""
+            SELECT pair,
+                   SUM(action LIKE 'CLOSE%') AS trades,
+                   SUM(action LIKE 'CLOSE%' AND pnl > 0) AS wins,
+                   COALESCE(SUM(pnl), 0) AS pnl,
+                   COALESCE(SUM(fees_usdt), 0) AS fees,
+                   COALESCE(SUM(pnl), 0) - COALESCE(SUM(fees_usdt), 0) AS net_pnl
+            FROM trades{where} GROUP BY pair ORDER BY net_pnl DESC""", params)
+
+    def total_pnl(self, since=None, until=None):
+        """Net PnL in USDT across all pairs (realized PnL minus fees)."""
+        return sum(row['net_pnl'] for row in self.pnl_summary(since, until))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Summarize or export the trade journal.")
+    parser.add_argument("--journal", default=JOURNAL_FILE, help="journal database")
+    parser.add_argument("--days", type=float, default=None, help="only the last N days")
+    parser.add_argument("--csv", default=None, help="export the selected rows to this CSV file")
+    args = parser.parse_args()
+
+    journal = TradeJournal(args.journal)
+    since = time.time() - args.days * 86400 if args.days else None
+    for row in journal.pnl_summary(since):
+        win_rate = f", win rate {row['wins'] / row['trades']:.0%}" if row['trades'] else ""
+        logging.info(f"{row['pair']}: {row['trades']} trades, PnL {row['pnl']:+.4f}, fees {row['fees']:.4f}, "
+                     f"net {row['net_pnl']:+.4f} USDT{win_rate}")
+    logging.info(f"Total net PnL: {journal.total_pnl(since):+.4f} USDT")
+    if args.csv:
+        rows = journal.trades(since=since)
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['id'] + COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        logging.info(f"Exported {len(rows)} rows to {args.csv}.")
+    journal.close()
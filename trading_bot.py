@@ -1,22 +1,48 @@
 # trading_bot.py
 
 import time
-import pandas as pd
+import signal
 import logging
 import threading
-import json
-from binance_api import get_pair_price, place_order, get_historical_prices, borrow_asset, repay_asset
+from concurrent.futures import ThreadPoolExecutor, wait
+from binance_api import get_pair_price, load_symbol_filters, update_quote
+from market_stream import MarketStream
+from market_board import SharedMarketFeed
+from signal_engine import SignalEngine
+from order_executor import OrderExecutor
+from trade_journal import TradeJournal
+from state_store import StateStore, reconcile, reconcile_pending
+from pair_config import PairConfigSource
+import metrics
+from strategy import position_pnl, exit_reason, entry_sides, closing_sides
 from telegram_notify import send_telegram_message, format_trade_message, get_updates
-from config import PAIR_CONFIG_CSV, TRADE_CAPITAL_PER_PAIR, UPDATE_INTERVAL, LOG_FILE, STATE_FILE, USE_ISOLATED_MARGIN, \
-    MAX_CONCURRENT_TRADES, TELEGRAM_CHAT_ID
+from config import PAIR_CONFIG_CSV, TRADE_CAPITAL_PER_PAIR, UPDATE_INTERVAL, USE_ISOLATED_MARGIN, \
+    MAX_CONCURRENT_TRADES, TELEGRAM_CHAT_ID, PAIR_WORKERS, PAIR_TASK_TIMEOUT, PRICE_CHECK_INTERVAL, SIGNAL_DEBOUNCE, \
+    API_WEIGHT_LIMIT, API_WEIGHT_BACKOFF, ENTRY_WEIGHT, MARKET_FEED, SHARD_NAME
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logging.getLogger("binance").setLevel(logging.WARNING)
 
-open_positions = {}
+# Open positions plus write-ahead records of entries/exits in flight; open_positions is store.positions.
+store = StateStore()
+open_positions = store.positions
 abort_flag = threading.Event()
 last_update_id = 0
+market = None
+engine = None
+executor = None
+journal = None
+pair_source = PairConfigSource(PAIR_CONFIG_CSV)
+
+# Guards open_positions and the per-pair task bookkeeping below.
+state_lock = threading.RLock()
+busy_pairs = set()
+pending_entries = 0
+# Request weight held by entries in flight; the exchange only reports it once their responses arrive.
+reserved_weight = 0
+# Last alert sent for each operation that settle_pending() could not finish, so it is sent once.
+settle_alerts = {}
 
 
 def clear_pending_updates():
@@ -71,11 +97,13 @@ def handle_telegram_commands():
                     if message.get('text'):
                         text = message['text'].strip()
                         if text == '/status':
-                            if not open_positions:
+                            with state_lock:
+                                positions = dict(open_positions)
+                            if not positions:
                                 status_msg = "Bot is running. No open positions."
                             else:
                                 status_msg = "Bot is running. Open positions:\n\n"
-                                for key, pos in open_positions.items():
+                                for key, pos in positions.items():
                                     status_msg += (
                                         f"*Pair*: `{key}`\n"
                                         f"  - *Direction*: {pos['direction']}\n"
@@ -97,180 +125,354 @@ def handle_telegram_commands():
             time.sleep(10)  # Wait longer after an error
 
 
-def load_pair_configs():
-    try:
-        return pd.read_csv(PAIR_CONFIG_CSV).to_dict(orient='records')
-    except FileNotFoundError:
-        logging.error(f"{PAIR_CONFIG_CSV} not found.");
-        return []
-
-
-def zscore(series):
-    std = series.std()
-    if std == 0 or pd.isna(std): return 0
-    return (series.iloc[-1] - series.mean()) / std
+def reload_pair_configs():
+    """Picks up edits to the pair CSV and resizes the market data buffers to match."""
+    change = pair_source.reload()
+    if change is None:
+        return
+    added, removed, changed = change
+    with state_lock:
+        orphaned = [key for key in removed if key in open_positions]
+    for key in orphaned:
+        logging.warning(f"Pair {key} was removed from {PAIR_CONFIG_CSV} but has an open position. "
+                        f"It stays under stop-loss/take-profit until it closes.")
+        send_telegram_message(f"⚠️ `{key}` was removed from the pair config while a position is open. "
+                              f"It is managed by stop-loss/take-profit only until it closes.")
+    if market is not None:
+        market.set_windows(stream_windows(pair_source))
 
 
-def log_trade(sym1, sym2, side1, side2, price1, price2, qty1, qty2, action, pnl=None):
-    now = pd.Timestamp.now()
-    log_row = pd.DataFrame(
-        [{'timestamp': now, 'sym1': sym1, 'sym2': sym2, 'side1': side1, 'side2': side2,
-          'price1': price1, 'price2': price2, 'qty1': qty1, 'qty2': qty2, 'action': action, 'pnl': pnl}])
+def load_state():
+    """Loads the state file and settles anything a crash left half-done against the exchange."""
+    store.load()
     try:
-        log_row.to_csv(LOG_FILE, mode='a', header=not pd.io.common.file_exists(LOG_FILE), index=False)
+        findings, trades = reconcile(store, isolated=USE_ISOLATED_MARGIN)
     except Exception as e:
-        logging.error(f"Logging failed: {e}")
+        logging.error(f"Reconciliation with the exchange failed: {e}", exc_info=True)
+        findings, trades = [f"⚠️ Reconciliation with the exchange failed: {e}"], []
+    for trade in trades:
+        journal.record(**trade)
+    if findings:
+        send_telegram_message("🔁 *State reconciliation*\n\n" + "\n".join(findings))
+
+
+def stream_windows(pair_configs):
+    """Maps every symbol used by a configured pair or an open position to the longest window it needs."""
+    windows = {}
+    for p in pair_configs:
+        for sym in (p['sym1'], p['sym2']):
+            windows[sym] = max(windows.get(sym, 0), int(p['window']))
+    for pos in open_positions.values():
+        for sym in (pos['sym1'], pos['sym2']):
+            windows.setdefault(sym, max(windows.values(), default=1))
+    return windows
+
+
+def record_fill_latency(result, decided_at):
+    """Decision-to-fill latency of each leg, measured from when the signal was evaluated."""
+    latency = result.get('latency') or {}
+    if 'sent_at' in latency:
+        for leg in ('leg1', 'leg2'):
+            metrics.observe('decision_to_fill_seconds', latency['sent_at'] - decided_at + latency[f'{leg}_ms'] / 1000,
+                            leg=leg)
+
+
+def manage_position(key, z, is_exit_signal, decided_at):
+    """Checks one open position against its exit rules and closes it if one is met."""
+    pos = open_positions.get(key)
+    if not pos or key in store.pending: return  # an unfinished exit is retried by settle_pending()
+
+    sym1, sym2, direction = pos['sym1'], pos['sym2'], pos['direction']
+    price1, price2 = get_pair_price(sym1), get_pair_price(sym2)
+    if price1 is None or price2 is None: return
+
+    # Without a z-score (pair removed from the config, or its window not filled yet) only SL/TP apply.
+    logging.info(f"✅ Managing position {key}, " + (f"z = {z:.3f}" if z is not None else "no z-score"))
+
+    entry_p1, entry_p2, qty1, qty2 = map(float, [pos['price1'], pos['price2'], pos['qty1'], pos['qty2']])
+    current_pnl, pnl_pct = position_pnl(direction, entry_p1, entry_p2, qty1, qty2, price1, price2)
+    logging.info(f"Position PnL: {current_pnl:.4f} USD ({pnl_pct:+.2%})")
+
+    stop_loss, take_profit = map(float, [pos['stop_loss'], pos['take_profit']])
+    reason = exit_reason(is_exit_signal, z, pnl_pct, stop_loss, take_profit)
+
+    if reason:
+        logging.info(f"Exit condition '{reason}' met for {key}. Closing position.")
+        side1_close, side2_close = closing_sides(direction)
+        record = store.begin(key, 'exit', sym1=sym1, sym2=sym2, direction=direction, side1=side1_close,
+                             side2=side2_close, qty1=qty1, qty2=qty2, price1=price1, price2=price2, reason=reason)
+        with metrics.stage('close_pair'):
+            result = executor.close_pair(sym1, sym2, direction, qty1, qty2, price1, price2,
+                                         isolated=USE_ISOLATED_MARGIN, client_ids=record['client_ids'],
+                                         on_step=lambda name, **data: store.step(key, name, **data))
+        record_fill_latency(result, decided_at)
+        if not (result['leg1'] and result['leg2']):
+            logging.error(f"Exit for {key} did not complete. It is retried on the next cycle.")
+            send_telegram_message(f"🚨 Exit for `{key}` did not complete. It is retried on the next cycle.")
+            return
+        msg = format_trade_message(key, side1_close, side2_close, qty1, qty2, price1, price2,
+                                   f"CLOSE: {reason}", current_pnl)
+        send_telegram_message(msg)
+        journal.record(sym1, sym2, f"CLOSE: {reason}", side1_close, side2_close, price1, price2, qty1, qty2,
+                       current_pnl, result)
+        if 'repaid' not in record['steps']:
+            # Both legs are closed; the position stays pending until settle_pending() repays the loan.
+            store.step(key, 'journaled')
+            logging.error(f"Closed {key} but the loan was not repaid. It is retried on the next cycle.")
+            send_telegram_message(f"🚨 Closed `{key}` but its loan was not repaid. It is retried on the next cycle.")
+            return
+        with state_lock:
+            store.commit_exit(key)
+
+
+def open_position(key, pair, z, direction, decided_at):
+    """Opens a position for an entry signal. The caller has already reserved a trade slot for it."""
+    sym1, sym2 = pair['sym1'], pair['sym2']
+    price1, price2 = get_pair_price(sym1), get_pair_price(sym2)
+    if price1 is None or price2 is None: return
+
+    logging.info(f"🔍 Entry signal for {key}, z = {z:.3f}. Direction: {direction}.")
+    qty1, qty2 = TRADE_CAPITAL_PER_PAIR / price1, TRADE_CAPITAL_PER_PAIR / price2
+    side1, side2 = entry_sides(direction)
+    borrow_sym, borrow_qty = (sym1, qty1) if direction == 'SELL SPREAD' else (sym2, qty2)
+    record = store.begin(key, 'entry', sym1=sym1, sym2=sym2, direction=direction, side1=side1, side2=side2,
+                         qty1=qty1, qty2=qty2, price1=price1, price2=price2,
+                         borrow_sym=borrow_sym, borrow_qty=borrow_qty,
+                         stop_loss=pair.get('stop_loss', 0.05), take_profit=pair.get('take_profit', 0.05))
+    with metrics.stage('open_pair'):
+        result = executor.open_pair(sym1, sym2, direction, qty1, qty2, price1, price2,
+                                    isolated=USE_ISOLATED_MARGIN, client_ids=record['client_ids'],
+                                    on_step=lambda name, **data: store.step(key, name, **data))
+    if not result:
+        if 'borrowed' not in record['steps'] or 'unwound' in record['steps']:
+            store.finish(key)
+        else:
+            # A leg is still open or the loan unpaid; keep the record so nothing is forgotten.
+            logging.error(f"Entry for {key} failed and was not fully undone (steps: {list(record['steps'])}).")
+            send_telegram_message(f"🚨 Entry for `{key}` failed and could not be fully unwound "
+                                  f"(legs unwound or loan repaid). It is retried on the next cycle.")
+        return
+    record_fill_latency(result, decided_at)
+
+    # What actually filled, over every fill (and remainder order) of each leg.
+    res1, res2 = result['leg1'], result['leg2']
+    qty1, price1 = float(res1['executedQty']), float(res1['cummulativeQuoteQty']) / float(res1['executedQty'])
+    qty2, price2 = float(res2['executedQty']), float(res2['cummulativeQuoteQty']) / float(res2['executedQty'])
+    with state_lock:
+        store.commit_entry(key, {'sym1': sym1, 'sym2': sym2, 'qty1': qty1, 'price1': price1, 'qty2': qty2,
+                                 'price2': price2, 'direction': direction,
+                                 'stop_loss': pair.get('stop_loss', 0.05),
+                                 'take_profit': pair.get('take_profit', 0.05)})
+    msg = format_trade_message(key, side1, side2, qty1, qty2, price1, price2, "OPEN")
+    send_telegram_message(msg)
+    journal.record(sym1, sym2, "OPEN", side1, side2, price1, price2, qty1, qty2, result=result)
+    logging.info(f"✅ Successfully opened position for {key}.")
+
+
+def settle_pending(key):
+    """
+    Retries an entry or exit that failed part-way in this run (a leg that did not fill, a
+    loan not repaid) the way reconcile() settles one after a crash.
+    """
+    finding, trade = reconcile_pending(store, key, isolated=USE_ISOLATED_MARGIN)
+    if finding is None:
+        return
+    if trade:
+        journal.record(**trade)
+    if finding.startswith("⚠️"):
+        logging.warning(finding)
+        if settle_alerts.get(key) != finding:
+            settle_alerts[key] = finding
+            send_telegram_message(finding)
+    else:
+        logging.info(finding)
+        settle_alerts.pop(key, None)
+        send_telegram_message(f"🔁 {finding}")
+
+
+def submit_pair_task(pool, key, fn, *args, reserved_slot=False):
+    """
+    Runs `fn` for one pair on the worker pool unless a task for that pair is still in
+    flight (e.g. a slow close from an earlier cycle). Returns the future or None.
+    With `reserved_slot`, the entry slot and request weight reserved by the caller are
+    released when the task ends.
+    """
+    with state_lock:
+        if key in busy_pairs:
+            return None
+        busy_pairs.add(key)
 
+    def task():
+        global pending_entries, reserved_weight
+        try:
+            fn(key, *args)
+        except Exception as e:
+            logging.error(f"Error while handling {key}: {e}", exc_info=True)
+        finally:
+            with state_lock:
+                busy_pairs.discard(key)
+                if reserved_slot:
+                    pending_entries -= 1
+                    reserved_weight -= ENTRY_WEIGHT
 
-def save_state():
-    with open(STATE_FILE, 'w') as f: json.dump(open_positions, f, indent=4)
+    return pool.submit(task)
 
 
-def load_state():
-    global open_positions
-    try:
-        with open(STATE_FILE, 'r') as f:
-            open_positions = json.load(f)
-        logging.info(f"Loaded {len(open_positions)} positions from state.")
-    except FileNotFoundError:
-        open_positions = {};
-        logging.info("No state file found, starting fresh.")
+def evaluate_signals(pool, allow_entries=True):
+    """
+    Scores every pair on the latest closed candles in one pass, then submits a settle
+    task for each operation that failed part-way, a manage task for each open position
+    and entry tasks for the strongest new signals.
+    Returns (signals, futures).
+    """
+    global engine, pending_entries, reserved_weight
+    configs_by_key = pair_source.configs
+    if engine is None or engine.pair_configs != list(configs_by_key.values()):
+        engine = SignalEngine(list(configs_by_key.values()))
+    with metrics.stage('signals'):
+        engine.sync(market)
+        with state_lock:
+            positions = {k: pos['direction'] for k, pos in open_positions.items()}
+        signals = engine.evaluate(positions)
+    decided_at = time.monotonic()
+    metrics.set_gauge('open_positions', len(positions))
+
+    # --- RETRY OPERATIONS THAT FAILED PART-WAY; one still in flight keeps its pair busy ---
+    # Retries wait while the request weight is near the limit: sent into a 429 they only
+    # spend more of it, and keep the orders that would free it from going through.
+    budget = API_WEIGHT_BACKOFF * API_WEIGHT_LIMIT
+    with state_lock:
+        unfinished = list(store.pending) if metrics.used_weight() + reserved_weight < budget else []
+    futures = [submit_pair_task(pool, key, settle_pending) for key in unfinished]
+
+    # --- MANAGE ALL OPEN POSITIONS (one task per pair) ---
+    for key in positions:
+        futures.append(submit_pair_task(pool, key, manage_position, signals['zscores'].get(key),
+                                        key in signals['exits'], decided_at))
+
+    # --- LOOK FOR NEW TRADES IF BELOW THE CONCURRENT LIMIT ---
+    # Candidates arrive strongest signal first. A slot is reserved before the task is
+    # submitted, so concurrent entries can never exceed MAX_CONCURRENT_TRADES. So is the
+    # request weight, so one candle close cannot submit more entries than the budget allows.
+    for key, z, direction in signals['entries'] if allow_entries else ():
+        with state_lock:
+            if len(open_positions) + pending_entries >= MAX_CONCURRENT_TRADES: break
+            if key in open_positions or key in busy_pairs or key in store.pending: continue
+            if metrics.used_weight() + reserved_weight + ENTRY_WEIGHT > budget:
+                logging.warning(f"API weight {metrics.used_weight()} (+{reserved_weight} reserved) is near "
+                                f"{API_WEIGHT_LIMIT}: holding back the remaining entries this cycle.")
+                break
+            pending_entries += 1
+            reserved_weight += ENTRY_WEIGHT
+        futures.append(submit_pair_task(pool, key, open_position, configs_by_key[key], z, direction,
+                                        decided_at, reserved_slot=True))
+    return signals, futures
+
+
+def check_prices(pool, symbols, signals):
+    """Re-checks stop-loss/take-profit for the open positions with a new price on either leg."""
+    decided_at = time.monotonic()
+    with state_lock:
+        keys = [k for k, pos in open_positions.items() if pos['sym1'] in symbols or pos['sym2'] in symbols]
+    return [submit_pair_task(pool, key, manage_position, signals['zscores'].get(key), key in signals['exits'],
+                             decided_at) for key in keys]
 
 
 def run_bot():
+    global market, executor, journal
     logging.info("🚀 Live Trading Bot Started")
     send_telegram_message("🚀 *Bot started successfully!*")
+    journal = TradeJournal()  # before load_state(), which journals what reconciliation settles
     load_state()
 
-    # CRITICAL: Clear any old commands before starting the handler
-    clear_pending_updates()
-
-    command_thread = threading.Thread(target=handle_telegram_commands, daemon=True)
-    command_thread.start()
-
+    reload_pair_configs()
+    windows = stream_windows(pair_source)
+    # Warm the exchange filter cache once so order placement needs no exchangeInfo round trips.
+    load_symbol_filters(windows)
+
+    # Market data arrives over one WebSocket; REST is only used for backfill and gap recovery.
+    # A shard worker reads the supervisor's shared market board instead (see shard_runner.py).
+    if MARKET_FEED:
+        market = SharedMarketFeed(MARKET_FEED, windows, on_quote=update_quote)
+    else:
+        market = MarketStream(windows, on_quote=update_quote)
+    market.start()
+    executor = OrderExecutor()
+    pool = ThreadPoolExecutor(max_workers=PAIR_WORKERS, thread_name_prefix="pair")
+    metrics.start()
+
+    # Shard workers leave Telegram commands to the supervisor.
+    if not SHARD_NAME:
+        # CRITICAL: Clear any old commands before starting the handler
+        clear_pending_updates()
+
+        command_thread = threading.Thread(target=handle_telegram_commands, daemon=True)
+        command_thread.start()
+
+    # Wake up on market data instead of a fixed sleep: pairs are scored when a candle
+    # closes, and positions are checked against stop-loss/take-profit on price ticks.
+    signals, ticked, next_price_check, throttled = None, set(), 0.0, False
     while not abort_flag.is_set():
         try:
-            pair_configs = load_pair_configs()
-            if not pair_configs:
-                time.sleep(60)
+            if not market.connected.is_set():
+                logging.warning("Market stream is not connected. Skipping this cycle.")
+                time.sleep(UPDATE_INTERVAL)
+                continue
+
+            closed, new_ticks = market.wait_for_update(timeout=UPDATE_INTERVAL)
+            ticked |= new_ticks
+
+            weight = metrics.used_weight()
+            if (weight >= API_WEIGHT_BACKOFF * API_WEIGHT_LIMIT) != throttled:
+                throttled = not throttled
+                logging.warning(f"API weight {weight}/{API_WEIGHT_LIMIT}: "
+                                + ("pausing entries and slowing price checks." if throttled else "back to normal."))
+
+            if closed or signals is None:
+                # Every symbol's candle closes within a moment of the others; score them together.
+                time.sleep(SIGNAL_DEBOUNCE)
+                ticked |= market.wait_for_update(timeout=0)[1]
+                loop_start = time.perf_counter()
+                with metrics.stage('load_configs'):
+                    reload_pair_configs()
+                # With no pairs configured this only manages the open positions (stop-loss/take-profit).
+                signals, futures = evaluate_signals(pool, allow_entries=not throttled)
+                ticked.clear()  # every open position was just checked
+            elif ticked and time.monotonic() >= next_price_check:
+                loop_start = time.perf_counter()
+                futures = check_prices(pool, ticked, signals)
+                ticked.clear()
+                next_price_check = time.monotonic() + PRICE_CHECK_INTERVAL * (4 if throttled else 1)
+            else:
                 continue
+            # 'loop' is the time to decide and submit; waiting on the pair tasks is the 'pair_tasks' stage.
+            decide_time = time.perf_counter() - loop_start
+            metrics.observe('stage_seconds', decide_time, stage='loop')
+
+            futures = [f for f in futures if f is not None]
+            with metrics.stage('pair_tasks'):
+                _, not_done = wait(futures, timeout=PAIR_TASK_TIMEOUT)
+            if not_done:
+                logging.warning(f"{len(not_done)} pair task(s) exceeded {PAIR_TASK_TIMEOUT}s. "
+                                f"They keep running; their pairs are skipped until they finish.")
 
-            # --- MANAGE ALL OPEN POSITIONS ---
-            for key in list(open_positions.keys()):
-                # ... (rest of the trading logic is unchanged)
-                pos = open_positions.get(key)
-                if not pos: continue
-
-                sym1, sym2, direction = pos['sym1'], pos['sym2'], pos['direction']
-                pair_config = next((p for p in pair_configs if f"{p['sym1']}/{p['sym2']}" == key), None)
-                if not pair_config:
-                    logging.error(f"Config for open position {key} not found. Cannot manage.");
-                    continue
-
-                prices1 = get_historical_prices(sym1, int(pair_config['window']))
-                prices2 = get_historical_prices(sym2, int(pair_config['window']))
-                if not prices1 or not prices2: continue
-
-                price1, price2 = prices1[-1], prices2[-1]
-                spread_series = pd.Series([p1 / p2 for p1, p2 in zip(prices1, prices2)])
-                z = zscore(spread_series)
-
-                logging.info(f"✅ Managing position {key}, z = {z:.3f}")
-
-                entry_p1, entry_p2, qty1, qty2 = map(float, [pos['price1'], pos['price2'], pos['qty1'], pos['qty2']])
-                pnl1 = (price1 - entry_p1) * qty1 if direction == 'BUY SPREAD' else (entry_p1 - price1) * qty1
-                pnl2 = (entry_p2 - price2) * qty2 if direction == 'BUY SPREAD' else (price2 - entry_p2) * qty2
-                current_pnl = pnl1 + pnl2
-                entry_value = (entry_p1 * qty1) + (entry_p2 * qty2)
-                pnl_pct = current_pnl / entry_value if entry_value != 0 else 0
-                logging.info(f"Position PnL: {current_pnl:.4f} USD ({pnl_pct:+.2%})")
-
-                exit_condition, reason = False, ""
-                z_exit, stop_loss, take_profit = map(float,
-                                                     [pair_config['z_exit'], pos['stop_loss'], pos['take_profit']])
-
-                if (direction == 'SELL SPREAD' and z < z_exit) or (direction == 'BUY SPREAD' and z > -z_exit):
-                    exit_condition, reason = True, f"Z-Score Exit ({z:.2f})"
-                elif pnl_pct <= -stop_loss:
-                    exit_condition, reason = True, f"Stop Loss ({-stop_loss:.2%})"
-                elif pnl_pct >= take_profit:
-                    exit_condition, reason = True, f"Take Profit ({take_profit:.2%})"
-
-                if exit_condition:
-                    logging.info(f"Exit condition '{reason}' met for {key}. Closing position.")
-                    side1_close = "BUY" if direction == "SELL SPREAD" else "SELL"
-                    side2_close = "SELL" if direction == "SELL SPREAD" else "BUY"
-                    res1 = place_order(sym1, side1_close, qty1, isolated=USE_ISOLATED_MARGIN)
-                    res2 = place_order(sym2, side2_close, qty2, isolated=USE_ISOLATED_MARGIN)
-                    if direction == "SELL SPREAD" and res1:
-                        repay_qty = float(res1['fills'][0]['qty']);
-                        repay_asset(sym1, repay_qty, isolated=USE_ISOLATED_MARGIN)
-                    if direction == "BUY SPREAD" and res2:
-                        repay_qty = float(res2['fills'][0]['qty']);
-                        repay_asset(sym2, repay_qty, isolated=USE_ISOLATED_MARGIN)
-                    msg = format_trade_message(key, side1_close, side2_close, qty1, qty2, price1, price2,
-                                               f"CLOSE: {reason}", current_pnl)
-                    send_telegram_message(msg)
-                    log_trade(sym1, sym2, side1_close, side2_close, price1, price2, qty1, qty2, f"CLOSE: {reason}",
-                              current_pnl)
-                    del open_positions[key]
-                    save_state()
-
-            # --- LOOK FOR NEW TRADES IF BELOW THE CONCURRENT LIMIT ---
-            if len(open_positions) < MAX_CONCURRENT_TRADES:
-                for pair in pair_configs:
-                    if len(open_positions) >= MAX_CONCURRENT_TRADES: break
-                    sym1, sym2 = pair['sym1'], pair['sym2']
-                    key = f"{sym1}/{sym2}"
-                    if key in open_positions: continue
-                    prices1 = get_historical_prices(sym1, int(pair['window']))
-                    prices2 = get_historical_prices(sym2, int(pair['window']))
-                    if not prices1 or not prices2: continue
-                    price1, price2 = prices1[-1], prices2[-1]
-                    spread_series = pd.Series([p1 / p2 for p1, p2 in zip(prices1, prices2)])
-                    z = zscore(spread_series)
-                    logging.info(f"🔍 Checking pair {key}, z = {z:.3f}")
-                    if abs(z) > float(pair['z_entry']):
-                        direction = 'SELL SPREAD' if z > 0 else 'BUY SPREAD'
-                        logging.info(f"Entry signal for {key}. Direction: {direction}.")
-                        qty1, qty2 = TRADE_CAPITAL_PER_PAIR / price1, TRADE_CAPITAL_PER_PAIR / price2
-                        if direction == 'SELL SPREAD':
-                            if not (borrow_asset(sym1, qty1, isolated=USE_ISOLATED_MARGIN)): continue
-                            if not (res1 := place_order(sym1, "SELL", qty1, isolated=USE_ISOLATED_MARGIN)): repay_asset(
-                                sym1, qty1, isolated=USE_ISOLATED_MARGIN); continue
-                            if not (res2 := place_order(sym2, "BUY", qty2, isolated=USE_ISOLATED_MARGIN)): place_order(
-                                sym1, "BUY", qty1, isolated=USE_ISOLATED_MARGIN); repay_asset(sym1, qty1,
-                                                                                              isolated=USE_ISOLATED_MARGIN); continue
-                        else:
-                            if not (borrow_asset(sym2, qty2, isolated=USE_ISOLATED_MARGIN)): continue
-                            if not (res1 := place_order(sym1, "BUY", qty1, isolated=USE_ISOLATED_MARGIN)): repay_asset(
-                                sym2, qty2, isolated=USE_ISOLATED_MARGIN); continue
-                            if not (res2 := place_order(sym2, "SELL", qty2, isolated=USE_ISOLATED_MARGIN)): place_order(
-                                sym1, "SELL", qty1, isolated=USE_ISOLATED_MARGIN); repay_asset(sym2, qty2,
-                                                                                               isolated=USE_ISOLATED_MARGIN); continue
-                        qty1, price1 = float(res1['fills'][0]['qty']), float(res1['fills'][0]['price'])
-                        qty2, price2 = float(res2['fills'][0]['qty']), float(res2['fills'][0]['price'])
-                        open_positions[key] = {'sym1': sym1, 'sym2': sym2, 'qty1': qty1, 'price1': price1, 'qty2': qty2,
-                                               'price2': price2, 'direction': direction,
-                                               'stop_loss': pair.get('stop_loss', 0.05),
-                                               'take_profit': pair.get('take_profit', 0.05)}
-                        save_state()
-                        msg = format_trade_message(key, direction.split()[0], direction.split()[1], qty1, qty2, price1,
-                                                   price2, "OPEN")
-                        send_telegram_message(msg)
-                        log_trade(sym1, sym2, direction.split()[0], direction.split()[1], price1, price2, qty1, qty2,
-                                  "OPEN")
-                        logging.info(f"✅ Successfully opened position for {key}.")
+            if time.perf_counter() - loop_start > UPDATE_INTERVAL:
+                metrics.inc('loop_overruns_total')
 
         except Exception as e:
             logging.error(f"An unexpected error occurred in the main loop: {e}", exc_info=True)
             send_telegram_message(f"🚨 An unexpected error occurred: {e}. The bot is still running.")
+            time.sleep(UPDATE_INTERVAL)
 
-        time.sleep(UPDATE_INTERVAL)
-
+    pool.shutdown(wait=True)
+    market.stop()
+    executor.close()
+    journal.close()
     logging.info("Bot has been shut down.")
     send_telegram_message("😴 *Bot has been shut down.*")
 
 
 if __name__ == "__main__":
-    run_bot()
\ No newline at end of file
+    # SIGTERM (e.g. from the shard supervisor) shuts down like /abort.
+    signal.signal(signal.SIGTERM, lambda *_: abort_flag.set())
+    run_bot()